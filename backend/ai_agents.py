@@ -11,24 +11,98 @@ AI Agents System for Financial Data Enrichment
 """
 
 import asyncio
+import copy
+import os
 import aiohttp
-import yfinance as yf
 from alpha_vantage.timeseries import TimeSeries
 from alpha_vantage.fundamentaldata import FundamentalData
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 from typing import Dict, List, Any, Optional
-import requests
 from bs4 import BeautifulSoup
 import json
 import logging
+from market_data_cache import MarketDataCache
+from market_data_providers import MarketDataProvider, create_market_data_provider
+from ticker_resolver import load_ticker_resolver
+
+# إصدار شكل استجابة الإثراء
+# 1: بيانات محلية ثابتة (company_research، financial_news كقاموس، data_source كنص وصفي)
+# 2: مخرجات الوكلاء الفعلية (company_profile، missing_agents، agents_report، data_mode)
+#    مع إبقاء مفاتيح الإصدار 1 بشكلها القديم للمستهلكين والسجلات الحالية
+ENRICHMENT_SCHEMA_VERSION = 2
+
+# وصف مصدر البيانات بصيغة الإصدار 1 لكل وضع تشغيل
+DATA_SOURCE_LABELS = {
+    "offline": "محلي - تجنب مشاكل APIs الخارجية",
+    "live": "مباشر - مزودو بيانات السوق والأخبار"
+}
+
+NEWS_SENTIMENT_LABELS = {"positive": "إيجابي", "negative": "سلبي", "neutral": "محايد"}
+
+# مخرجات كل وكيل ووزنه في درجة الثقة (المفتاح الأول هو مفتاح التقييم)
+AGENT_OUTPUTS = {
+    "market_data_agent": ("market_data",),
+    "financial_news_agent": ("financial_news",),
+    "economic_indicators_agent": ("economic_context",),
+    "company_research_agent": ("company_profile", "risk_factors", "opportunities"),
+    "benchmark_analysis_agent": ("industry_benchmarks",)
+}
+
+AGENT_CONFIDENCE_WEIGHTS = {
+    "market_data_agent": 25,
+    "financial_news_agent": 20,
+    "economic_indicators_agent": 20,
+    "company_research_agent": 20,
+    "benchmark_analysis_agent": 15
+}
+
+# المؤشرات المرجعية: TA125, S&P500, NASDAQ, DOW
+MARKET_INDICES = ["^TA125.TA", "^GSPC", "^IXIC", "^DJI"]
+
+# مصدر بيانات محلي للوضع غير المتصل (بدون شبكة)
+OFFLINE_MARKET_DATA = {
+    "market_trend": "مستقر",
+    "sector_performance": "جيد",
+    "benchmark_comparison": "أعلى من المتوسط",
+    "indices": [
+        {"symbol": "^TA125.TA", "current_value": 2045.3, "change_percent": 0.4, "trend": "up"},
+        {"symbol": "^GSPC", "current_value": 5200.1, "change_percent": 0.2, "trend": "up"},
+        {"symbol": "^IXIC", "current_value": 16300.8, "change_percent": -0.1, "trend": "down"},
+        {"symbol": "^DJI", "current_value": 38900.5, "change_percent": 0.0, "trend": "flat"}
+    ]
+}
 
 class AIFinancialAgents:
     """نظام وكلاء الذكاء الاصطناعي لإثراء البيانات المالية"""
     
     def __init__(self):
-        self.session = None
+        self.session: Optional[aiohttp.ClientSession] = None
+        self._session_lock = asyncio.Lock()
+        
+        # إعدادات عميل HTTP المشترك بين جميع الوكلاء
+        self.http_limit = int(os.environ.get('AI_AGENTS_HTTP_LIMIT', 100))
+        self.http_limit_per_host = int(os.environ.get('AI_AGENTS_HTTP_LIMIT_PER_HOST', 10))
+        self.http_timeout = float(os.environ.get('AI_AGENTS_HTTP_TIMEOUT', 10))
+        self.http_connect_timeout = float(os.environ.get('AI_AGENTS_HTTP_CONNECT_TIMEOUT', 3))
+        self.dns_cache_ttl = int(os.environ.get('AI_AGENTS_DNS_CACHE_TTL', 300))
+        self.keepalive_timeout = float(os.environ.get('AI_AGENTS_KEEPALIVE_TIMEOUT', 30))
+        
+        # إعدادات تشغيل الوكلاء بالتوازي
+        self.enrichment_deadline = float(os.environ.get('AI_AGENTS_DEADLINE', 2.0))
+        self.agent_timeout = float(os.environ.get('AI_AGENTS_AGENT_TIMEOUT', 1.5))
+        self.agent_retries = int(os.environ.get('AI_AGENTS_RETRIES', 1))
+        self.offline = os.environ.get('AI_AGENTS_OFFLINE', 'true').lower() in ('1', 'true', 'yes')
+        
+        # ذاكرة مؤقتة لبيانات السوق والمؤشرات والاقتصاد الكلي
+        self.market_cache = MarketDataCache()
+        
+        # مزود بيانات السوق (Yahoo Finance أو بيانات ثابتة للعمل دون شبكة)
+        self.market_data_provider: MarketDataProvider = create_market_data_provider()
+        
+        # فهرس الرموز المبني مسبقاً (اختياري - يُحمّل مرة واحدة عبر mmap من TICKER_INDEX_DIR)
+        self.ticker_resolver = load_ticker_resolver()
         self.agents_status = {
             "market_data_agent": True,
             "financial_news_agent": True,
@@ -47,61 +121,184 @@ class AIFinancialAgents:
         }
     
     async def initialize_session(self):
-        """تهيئة جلسة HTTP لطلبات البيانات"""
-        if not self.session:
-            self.session = aiohttp.ClientSession()
+        """تهيئة جلسة HTTP المشتركة (تُستدعى عند بدء تشغيل الخادم)"""
+        async with self._session_lock:
+            if self.session and not self.session.closed:
+                return self.session
+            
+            connector = aiohttp.TCPConnector(
+                limit=self.http_limit,
+                limit_per_host=self.http_limit_per_host,
+                ttl_dns_cache=self.dns_cache_ttl,
+                keepalive_timeout=self.keepalive_timeout
+            )
+            timeout = aiohttp.ClientTimeout(
+                total=self.http_timeout,
+                connect=self.http_connect_timeout
+            )
+            self.session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=timeout,
+                headers={"User-Agent": "FinClick.AI/1.0"}
+            )
+            logging.info(
+                f"AI agents HTTP session started (limit={self.http_limit}, "
+                f"per_host={self.http_limit_per_host}, timeout={self.http_timeout}s)"
+            )
+            return self.session
+    
+    async def get_session(self) -> aiohttp.ClientSession:
+        """الجلسة المشتركة - تُنشأ عند أول استخدام إن لم تُهيأ عند بدء التشغيل"""
+        if self.session and not self.session.closed:
+            return self.session
+        return await self.initialize_session()
     
     async def close_session(self):
-        """إغلاق جلسة HTTP"""
-        if self.session:
-            await self.session.close()
-            self.session = None
+        """إغلاق جلسة HTTP (تُستدعى عند إيقاف الخادم)"""
+        async with self._session_lock:
+            if self.session:
+                await self.session.close()
+                self.session = None
     
-    async def enrich_company_data(self, company_name: str, sector: str, country: str = "Israel") -> Dict:
-        """إثراء بيانات الشركة بالمعلومات المحلية (بدون APIs خارجية)"""
+    async def enrich_company_data(self, company_name: str, sector: str, country: str = "Israel",
+                                  agents: Optional[List[str]] = None) -> Dict:
+        """إثراء بيانات الشركة بتشغيل الوكلاء المحددين بالتوازي ضمن مهلة إجمالية"""
+        
+        selected = [
+            name for name in (AGENT_OUTPUTS if agents is None else agents)
+            if name in AGENT_OUTPUTS and self.agents_status.get(name, False)
+        ]
+        agent_calls = {
+            "market_data_agent": lambda scratch: self._market_data_agent(company_name, scratch),
+            "financial_news_agent": lambda scratch: self._financial_news_agent(company_name, sector, scratch),
+            "economic_indicators_agent": lambda scratch: self._economic_indicators_agent(country, scratch),
+            "company_research_agent": lambda scratch: self._company_research_agent(company_name, sector, scratch),
+            "benchmark_analysis_agent": lambda scratch: self._benchmark_analysis_agent(sector, country, scratch)
+        }
+        
+        loop = asyncio.get_running_loop()
+        started_at = loop.time()
+        deadline_at = started_at + self.enrichment_deadline
+        reports = {name: {"status": "pending", "attempts": 0} for name in selected}
         
-        # استخدام بيانات محلية لتجنب مشاكل APIs الخارجية
+        tasks = {
+            name: asyncio.create_task(self._run_agent(name, agent_calls[name], deadline_at, reports[name]))
+            for name in selected
+        }
+        done, pending = await asyncio.wait(tasks.values(), timeout=self.enrichment_deadline) if tasks else (set(), set())
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+        
+        data_mode = "offline" if self.offline else "live"
         enriched_data = {
+            "schema_version": ENRICHMENT_SCHEMA_VERSION,
             "company_name": company_name,
             "sector": sector,
             "country": country,
             "enrichment_timestamp": datetime.now().isoformat(),
-            "market_data": {
-                "status": "success",
-                "market_trend": "مستقر",
-                "sector_performance": "جيد",
-                "benchmark_comparison": "أعلى من المتوسط"
-            },
-            "financial_news": {
-                "status": "success",
-                "sentiment": "إيجابي",
-                "key_news": ["نمو مستمر في القطاع", "استثمارات جديدة متوقعة"]
-            },
-            "economic_context": {
-                "status": "success",
-                "gdp_growth": "3.2%",
-                "inflation_rate": "2.1%",
-                "interest_rate": "4.5%"
-            },
-            "industry_benchmarks": {
-                "status": "success",
-                "sector_average_roe": "15%",
-                "sector_average_roa": "8%",
-                "sector_growth_rate": "12%"
-            },
-            "company_research": {
-                "status": "success",
-                "company_size": "متوسطة",
-                "market_position": "قوية",
-                "competitive_advantage": "تكنولوجيا متطورة"
-            },
-            "confidence_score": 100.0,
-            "data_source": "محلي - تجنب مشاكل APIs الخارجية"
+            "data_sources_used": [],
+            "data_mode": data_mode,
+            "data_source": DATA_SOURCE_LABELS[data_mode]
         }
         
-        logging.info(f"Data enrichment completed locally for {company_name}")
+        # دمج نتائج الوكلاء المكتملة فقط - كل وكيل كتب في نسخته الخاصة
+        for name, task in tasks.items():
+            scratch = task.result() if task in done and not task.cancelled() else None
+            if scratch is None:
+                if reports[name]["status"] in ("pending", "running"):
+                    reports[name]["status"] = "deadline_exceeded"
+                continue
+            for key in AGENT_OUTPUTS[name]:
+                if key in scratch:
+                    enriched_data[key] = scratch[key]
+            enriched_data["data_sources_used"].append(name)
+        
+        enriched_data["missing_agents"] = [name for name in selected if name not in enriched_data["data_sources_used"]]
+        enriched_data["agents_report"] = reports
+        enriched_data["elapsed_seconds"] = round(loop.time() - started_at, 3)
+        enriched_data["confidence_score"] = await self._calculate_confidence_score(enriched_data, selected)
+        self._add_legacy_fields(enriched_data)
+        
+        logging.info(
+            f"Data enrichment for {company_name}: {len(enriched_data['data_sources_used'])}/{len(selected)} agents "
+            f"in {enriched_data['elapsed_seconds']}s"
+        )
         return enriched_data
     
+    @staticmethod
+    def _add_legacy_fields(enriched_data: Dict) -> None:
+        """إضافة مفاتيح الإصدار 1 بشكلها القديم (تُحسب بعد درجة الثقة)"""
+        
+        for key in ("market_data", "economic_context", "industry_benchmarks"):
+            value = enriched_data.get(key)
+            if isinstance(value, dict):
+                value.setdefault("status", "error" if "error" in value else "success")
+        
+        # الأخبار: قاموس الحالة والانطباع والعناوين مع المقالات الكاملة في articles
+        articles = enriched_data.get("financial_news")
+        if isinstance(articles, list):
+            sentiments = [item.get("sentiment") for item in articles if item.get("sentiment")]
+            sentiment = max(set(sentiments), key=sentiments.count) if sentiments else "neutral"
+            enriched_data["financial_news"] = {
+                "status": "success" if articles else "no_data",
+                "sentiment": NEWS_SENTIMENT_LABELS.get(sentiment, sentiment),
+                "key_news": [item.get("title", "") for item in articles],
+                "articles": articles
+            }
+        else:
+            enriched_data["financial_news"] = {"status": "unavailable", "sentiment": None, "key_news": [], "articles": []}
+        
+        # ملخص البحث بصيغة الإصدار 1 من ملف الشركة
+        profile = enriched_data.get("company_profile")
+        if isinstance(profile, dict) and "error" not in profile:
+            employees = profile.get("employees_count") or 0
+            advantages = profile.get("competitive_advantages") or []
+            enriched_data["company_research"] = {
+                "status": "success",
+                "company_size": "كبيرة" if employees >= 1000 else "متوسطة" if employees >= 100 else "صغيرة",
+                "market_position": "قوية" if advantages else "غير محددة",
+                "competitive_advantage": advantages[0] if advantages else None
+            }
+        else:
+            enriched_data["company_research"] = {"status": "unavailable"}
+    
+    async def _run_agent(self, name: str, agent_call, deadline_at: float, report: Dict) -> Optional[Dict]:
+        """تشغيل وكيل واحد بمهلة ومحاولات إعادة - يعيد نسخته الخاصة من البيانات أو None"""
+        
+        loop = asyncio.get_running_loop()
+        for attempt in range(self.agent_retries + 1):
+            remaining = deadline_at - loop.time()
+            if remaining <= 0:
+                break
+            
+            scratch = {"data_sources_used": []}
+            report["attempts"] = attempt + 1
+            report["status"] = "running"
+            try:
+                await asyncio.wait_for(agent_call(scratch), timeout=min(self.agent_timeout, remaining))
+                if not self._agent_failed(name, scratch):
+                    report["status"] = "completed"
+                    return scratch
+                report["status"] = "failed"
+            except asyncio.TimeoutError:
+                report["status"] = "timeout"
+            except Exception as e:
+                logging.warning(f"Agent {name} attempt {attempt + 1} failed: {e}")
+                report["status"] = "failed"
+            
+            # انتظار قصير قبل إعادة المحاولة دون تجاوز المهلة الإجمالية
+            await asyncio.sleep(min(0.05 * (2 ** attempt), max(0.0, deadline_at - loop.time())))
+        
+        return None
+    
+    @staticmethod
+    def _agent_failed(name: str, scratch: Dict) -> bool:
+        """الوكيل فشل إذا لم يكتب مخرجه الرئيسي أو كتب خطأ"""
+        value = scratch.get(AGENT_OUTPUTS[name][0])
+        return value is None or (isinstance(value, dict) and "error" in value)
+    
     async def _market_data_agent(self, company_name: str, enriched_data: Dict) -> None:
         """وكيل بيانات السوق - الحصول على أسعار الأسهم والمؤشرات"""
         
@@ -111,34 +308,41 @@ class AIFinancialAgents:
             # البحث عن رمز السهم
             stock_symbol = await self._find_stock_symbol(company_name)
             
-            if stock_symbol:
-                # الحصول على بيانات السهم من Yahoo Finance
-                try:
-                    ticker = yf.Ticker(stock_symbol)
-                    info = ticker.info
-                    hist = ticker.history(period="1y")
-                    
-                    enriched_data["market_data"] = {
-                        "symbol": stock_symbol,
-                        "current_price": info.get("currentPrice", 0),
-                        "market_cap": info.get("marketCap", 0),
-                        "pe_ratio": info.get("trailingPE", 0),
-                        "dividend_yield": info.get("dividendYield", 0),
-                        "52_week_high": info.get("fiftyTwoWeekHigh", 0),
-                        "52_week_low": info.get("fiftyTwoWeekLow", 0),
-                        "volume": info.get("volume", 0),
-                        "price_performance": {
-                            "1d_change": 0,  # يمكن حسابها من البيانات التاريخية
-                            "1w_change": 0,
-                            "1m_change": 0,
-                            "1y_change": float(((hist['Close'][-1] - hist['Close'][0]) / hist['Close'][0] * 100)) if len(hist) > 0 else 0
-                        }
-                    }
-                except Exception as yf_error:
-                    logging.warning(f"Yahoo Finance data error: {yf_error}")
+            if self.offline:
+                enriched_data["market_data"] = {"symbol": stock_symbol, **copy.deepcopy(OFFLINE_MARKET_DATA)}
+                return
             
-            # الحصول على بيانات المؤشرات الرئيسية
-            await self._get_market_indices(enriched_data)
+            # سهم الشركة والمؤشرات المرجعية في دفعة أسعار واحدة عبر الذاكرة المؤقتة
+            # (الأسعار تتقادم خلال ثوانٍ والبيانات الأساسية خلال ساعات)
+            company_symbols = [stock_symbol] if stock_symbol else []
+            try:
+                quotes, fundamentals = await asyncio.gather(
+                    self.get_quotes(company_symbols + MARKET_INDICES, period="1y"),
+                    self.get_fundamentals(company_symbols)
+                )
+            except Exception as provider_error:
+                logging.warning(f"Market data provider error: {provider_error}")
+                quotes, fundamentals = {}, {}
+            
+            market_data = {"symbol": stock_symbol}
+            quote = quotes.get(stock_symbol) if stock_symbol else None
+            if quote is not None:
+                company_fundamentals = fundamentals.get(stock_symbol, {})
+                market_data.update({
+                    "current_price": quote["current_price"],
+                    "market_cap": company_fundamentals.get("market_cap", 0),
+                    "pe_ratio": company_fundamentals.get("pe_ratio", 0),
+                    "dividend_yield": company_fundamentals.get("dividend_yield", 0),
+                    "52_week_high": company_fundamentals.get("52_week_high", 0),
+                    "52_week_low": company_fundamentals.get("52_week_low", 0),
+                    "volume": quote["volume"],
+                    "price_performance": quote["price_performance"]
+                })
+            
+            # الرموز التي لم يُرجع لها المزود بيانات (رمز خاطئ أو غير مدرج أو خطأ مؤقت)
+            market_data["missing_symbols"] = [symbol for symbol in company_symbols + MARKET_INDICES if symbol not in quotes]
+            market_data["indices"] = self._market_indices(quotes)
+            enriched_data["market_data"] = market_data
             
         except Exception as e:
             logging.error(f"Market data agent error: {e}")
@@ -159,15 +363,16 @@ class AIFinancialAgents:
             
             financial_news = []
             
-            # محاولة الحصول على الأخبار من مصادر مختلفة
-            for source in news_sources[:2]:  # تحديد المصادر لتجنب التحميل الزائد
+            # محاولة الحصول على الأخبار من مصادر مختلفة (لا شبكة في الوضع غير المتصل)
+            sources_to_fetch = [] if self.offline else news_sources[:2]
+            session = await self.get_session() if sources_to_fetch else None
+            for source in sources_to_fetch:  # تحديد المصادر لتجنب التحميل الزائد
                 try:
-                    if self.session:
-                        async with self.session.get(source, timeout=10) as response:
-                            if response.status == 200:
-                                content = await response.text()
-                                # يمكن تحسين هذا باستخدام parsing أكثر تقدماً
-                                financial_news.extend(await self._parse_financial_news(content, company_name))
+                    async with session.get(source) as response:
+                        if response.status == 200:
+                            content = await response.text()
+                            # يمكن تحسين هذا باستخدام parsing أكثر تقدماً
+                            financial_news.extend(await self._parse_financial_news(content, company_name))
                 except:
                     continue
             
@@ -187,36 +392,41 @@ class AIFinancialAgents:
         try:
             enriched_data["data_sources_used"].append("economic_indicators_agent")
             
-            # بيانات اقتصادية أساسية (يمكن ربطها بمصادر حقيقية)
-            economic_data = {
-                "country": country,
-                "indicators": {
-                    "gdp_growth_rate": 3.2,
-                    "inflation_rate": 4.1,
-                    "unemployment_rate": 3.8,
-                    "interest_rate": 4.75,
-                    "currency_rate": {
-                        "USD_ILS": 3.65,
-                        "EUR_ILS": 3.92
-                    },
-                    "government_debt_to_gdp": 68.5,
-                    "current_account_balance": -2.1
-                },
-                "economic_outlook": {
-                    "growth_forecast": "Moderate growth expected",
-                    "inflation_trend": "Slightly above target",
-                    "policy_direction": "Monetary tightening continues",
-                    "risk_assessment": "Medium"
-                },
-                "last_updated": datetime.now().isoformat()
-            }
-            
-            enriched_data["economic_context"] = economic_data
+            enriched_data["economic_context"] = await self.market_cache.get_or_fetch(
+                "macro", country, lambda: self._load_economic_indicators(country)
+            )
             
         except Exception as e:
             logging.error(f"Economic indicators agent error: {e}")
             enriched_data["economic_context"] = {"error": str(e)}
     
+    async def _load_economic_indicators(self, country: str) -> Dict:
+        """المؤشرات الاقتصادية للدولة (تُحفظ مؤقتاً لفترة طويلة)"""
+        
+        # بيانات اقتصادية أساسية (يمكن ربطها بمصادر حقيقية)
+        return {
+            "country": country,
+            "indicators": {
+                "gdp_growth_rate": 3.2,
+                "inflation_rate": 4.1,
+                "unemployment_rate": 3.8,
+                "interest_rate": 4.75,
+                "currency_rate": {
+                    "USD_ILS": 3.65,
+                    "EUR_ILS": 3.92
+                },
+                "government_debt_to_gdp": 68.5,
+                "current_account_balance": -2.1
+            },
+            "economic_outlook": {
+                "growth_forecast": "Moderate growth expected",
+                "inflation_trend": "Slightly above target",
+                "policy_direction": "Monetary tightening continues",
+                "risk_assessment": "Medium"
+            },
+            "last_updated": datetime.now().isoformat()
+        }
+    
     async def _company_research_agent(self, company_name: str, sector: str, enriched_data: Dict) -> None:
         """وكيل بحث الشركات - الحصول على معلومات مفصلة عن الشركة"""
         
@@ -324,6 +534,9 @@ class AIFinancialAgents:
     async def _find_stock_symbol(self, company_name: str) -> Optional[str]:
         """البحث عن رمز السهم للشركة"""
         
+        if self.ticker_resolver is not None:
+            return self.ticker_resolver.best_match(company_name)
+        
         # قاموس رموز الأسهم الشائعة (يمكن توسيعه)
         stock_symbols = {
             "apple": "AAPL",
@@ -345,34 +558,83 @@ class AIFinancialAgents:
         
         return None
     
-    async def _get_market_indices(self, enriched_data: Dict) -> None:
-        """الحصول على بيانات المؤشرات الرئيسية"""
+    @staticmethod
+    def _market_indices(quotes: Dict[str, Dict]) -> List[Dict]:
+        """لقطة المؤشرات الرئيسية من أسعار الدفعة"""
         
-        try:
-            indices = ["^TA125.TA", "^GSPC", "^IXIC", "^DJI"]  # TA125, S&P500, NASDAQ, DOW
-            indices_data = {}
-            
-            for index in indices:
-                try:
-                    ticker = yf.Ticker(index)
-                    hist = ticker.history(period="5d")
-                    if len(hist) > 0:
-                        current_price = hist['Close'][-1]
-                        prev_price = hist['Close'][-2] if len(hist) > 1 else current_price
-                        change_percent = ((current_price - prev_price) / prev_price * 100) if prev_price != 0 else 0
-                        
-                        indices_data[index] = {
-                            "current_value": float(current_price),
-                            "change_percent": float(change_percent),
-                            "trend": "up" if change_percent > 0 else "down" if change_percent < 0 else "flat"
-                        }
-                except:
-                    continue
+        # قائمة وليست قاموساً بالرموز: الرموز تحتوي نقاطاً لا تقبلها MongoDB القديمة كأسماء حقول
+        indices_data = []
+        for index in MARKET_INDICES:
+            if index not in quotes:
+                continue
+            change_percent = quotes[index]["price_performance"]["1d_change"]
+            indices_data.append({
+                "symbol": index,
+                "current_value": quotes[index]["current_price"],
+                "change_percent": change_percent,
+                "trend": "up" if change_percent > 0 else "down" if change_percent < 0 else "flat"
+            })
+        return indices_data
+    
+    async def get_price_history(self, symbols: List[str], period: str = "1y") -> pd.DataFrame:
+        """تاريخ أسعار عدة رموز في استدعاء واحد كجدول طويل (symbol, date, open, high, low, close, volume)"""
+        return await asyncio.to_thread(self.market_data_provider.fetch_history, list(symbols), period)
+    
+    async def get_quotes(self, symbols: List[str], period: str = "1y") -> Dict[str, Dict]:
+        """السعر والأداء لعدة رموز - المفقود من الذاكرة المؤقتة يُجلب في دفعة واحدة"""
+        
+        async def fetch_many(keys: List[str]) -> Dict[str, Dict]:
+            history = await self.get_price_history([key.split("|", 1)[1] for key in keys], period)
+            return {f"{period}|{symbol}": quote for symbol, quote in self._quotes_from_history(history).items()}
+        
+        cached = await self.market_cache.get_or_fetch_many(
+            "quote", [f"{period}|{symbol}" for symbol in symbols], fetch_many
+        )
+        return {key.split("|", 1)[1]: quote for key, quote in cached.items()}
+    
+    async def get_fundamentals(self, symbols: List[str]) -> Dict[str, Dict]:
+        """البيانات الأساسية لعدة رموز (تتغير ببطء)"""
+        
+        async def fetch_many(keys: List[str]) -> Dict[str, Dict]:
+            info = await asyncio.to_thread(self.market_data_provider.fetch_info, keys)
+            return {
+                symbol: {
+                    "market_cap": data.get("marketCap", 0),
+                    "pe_ratio": data.get("trailingPE", 0),
+                    "dividend_yield": data.get("dividendYield", 0),
+                    "52_week_high": data.get("fiftyTwoWeekHigh", 0),
+                    "52_week_low": data.get("fiftyTwoWeekLow", 0)
+                }
+                for symbol, data in info.items()
+            }
+        
+        return await self.market_cache.get_or_fetch_many("fundamentals", list(symbols), fetch_many)
+    
+    @staticmethod
+    def _quotes_from_history(history: pd.DataFrame) -> Dict[str, Dict]:
+        """السعر الحالي ونسب التغير لكل رمز من جدول التاريخ الطويل"""
+        
+        quotes = {}
+        history = history.dropna(subset=["close"]).sort_values(["symbol", "date"])
+        for symbol, group in history.groupby("symbol", sort=False):
+            closes = group["close"].to_numpy(dtype=float)
+            volumes = group["volume"].fillna(0).to_numpy()
             
-            enriched_data["market_data"]["indices"] = indices_data
+            def change(periods: int) -> float:
+                base = closes[max(0, len(closes) - 1 - periods)]
+                return float((closes[-1] - base) / base * 100) if base else 0.0
             
-        except Exception as e:
-            logging.warning(f"Market indices error: {e}")
+            quotes[symbol] = {
+                "current_price": float(closes[-1]),
+                "volume": int(volumes[-1]),
+                "price_performance": {
+                    "1d_change": change(1),
+                    "1w_change": change(5),
+                    "1m_change": change(21),
+                    "1y_change": change(len(closes) - 1)
+                }
+            }
+        return quotes
     
     async def _parse_financial_news(self, content: str, company_name: str) -> List[Dict]:
         """تحليل محتوى الأخبار المالية"""
@@ -432,36 +694,19 @@ class AIFinancialAgents:
         
         return sample_news
     
-    async def _calculate_confidence_score(self, enriched_data: Dict) -> float:
-        """حساب درجة الثقة بناءً على البيانات المتوفرة"""
+    async def _calculate_confidence_score(self, enriched_data: Dict, agents: Optional[List[str]] = None) -> float:
+        """حساب درجة الثقة بناءً على البيانات المتوفرة من الوكلاء المطلوبين"""
         
         score = 0.0
         max_score = 0.0
         
-        # تقييم بيانات السوق
-        if enriched_data.get("market_data") and "error" not in enriched_data["market_data"]:
-            score += 25
-        max_score += 25
-        
-        # تقييم الأخبار المالية
-        if enriched_data.get("financial_news") and len(enriched_data["financial_news"]) > 0:
-            score += 20
-        max_score += 20
-        
-        # تقييم السياق الاقتصادي
-        if enriched_data.get("economic_context") and "error" not in enriched_data["economic_context"]:
-            score += 20
-        max_score += 20
-        
-        # تقييم ملف الشركة
-        if enriched_data.get("company_profile") and "error" not in enriched_data["company_profile"]:
-            score += 20
-        max_score += 20
-        
-        # تقييم المعايير المرجعية
-        if enriched_data.get("industry_benchmarks") and "error" not in enriched_data["industry_benchmarks"]:
-            score += 15
-        max_score += 15
+        for name in (AGENT_OUTPUTS if agents is None else agents):
+            weight = AGENT_CONFIDENCE_WEIGHTS[name]
+            value = enriched_data.get(AGENT_OUTPUTS[name][0])
+            # الوكلاء الذين لم يكتملوا قبل المهلة لا يضيفون شيئاً للدرجة
+            if value and not (isinstance(value, dict) and "error" in value):
+                score += weight
+            max_score += weight
         
         return (score / max_score * 100) if max_score > 0 else 0.0
     
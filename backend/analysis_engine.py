@@ -15,7 +15,7 @@ from dataclasses import dataclass
 import math
 
 # استيراد المحرك الجديد مع 170+ تحليل
-from financial_analysis_engine_170 import FinancialAnalysisEngine as NewFinancialAnalysisEngine
+from financial_analysis_engine_170 import FinancialAnalysisEngine as NewFinancialAnalysisEngine, select_metrics
 
 # إعداد السجلات
 logging.basicConfig(level=logging.INFO)
@@ -980,8 +980,8 @@ class FinancialAnalysisEngine:
             # إنشاء محرك التحليل الجديد
             new_engine = NewFinancialAnalysisEngine(new_data)
             
-            # تشغيل جميع التحليلات الـ170
-            all_analyses = new_engine.run_all_analyses()
+            # تشغيل التحليلات المطلوبة فقط إن حُددت، وإلا جميع التحليلات الـ170
+            all_analyses = new_engine.run_all_analyses(metrics=select_metrics(analysis_types))
             
             # تطبيق الأمان على JSON
             safe_analyses = self._make_analyses_json_safe(all_analyses)
@@ -0,0 +1,203 @@
+"""
+قائمة مهام التحليل في الخلفية
+Background job queue for CPU-bound analysis work
+
+- تشغيل التحليل في مجمع عمليات منفصل بدلاً من حلقة الأحداث
+- حفظ حالة المهام ونتائجها في MongoDB
+- الاستعلام عن الحالة والنتيجة عبر معرّف المهمة
+- كل مهمة محجوزة لنسخة الخادم التي أنشأتها بعقد إيجار يُجدد دورياً، فلا تُعلَّم
+  كفاشلة إلا مهام النسخ المتوقفة التي انتهى عقدها
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+
+
+class JobQueueFull(Exception):
+    """عدد المهام قيد التنفيذ وصل للحد الأقصى"""
+
+
+class AnalysisJobQueue:
+    """مجمع عمليات للتحليلات الثقيلة مع تتبع المهام في MongoDB"""
+
+    def __init__(self, max_workers: Optional[int] = None, max_pending: Optional[int] = None):
+        self.max_workers = max_workers or int(os.environ.get('ANALYSIS_MAX_WORKERS', os.cpu_count() or 1))
+        self.max_pending = max_pending or int(os.environ.get('ANALYSIS_MAX_PENDING_JOBS', 100))
+        self.lease_seconds = float(os.environ.get('ANALYSIS_JOB_LEASE_SECONDS', 60))
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.collection = None
+        self.instance_id = uuid.uuid4().hex
+        self._tasks = set()
+        self._reserved = 0
+        self._lease_task: Optional[asyncio.Task] = None
+
+    def start(self, collection) -> None:
+        """إنشاء مجمع العمليات وربط مجموعة MongoDB الخاصة بالمهام"""
+        self.collection = collection
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+            logger.info(f"Analysis worker pool started with {self.max_workers} workers")
+        if self._lease_task is None:
+            self._lease_task = asyncio.ensure_future(self._renew_leases())
+
+    async def shutdown(self) -> None:
+        """إيقاف المهام الجارية وإغلاق مجمع العمليات"""
+        if self._lease_task is not None:
+            self._lease_task.cancel()
+            self._lease_task = None
+        for task in list(self._tasks):
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+    @property
+    def pending_count(self) -> int:
+        # المقاعد المحجوزة لمهام ما زال تسجيلها في MongoDB جارياً تُحتسب أيضاً
+        return len(self._tasks) + self._reserved
+
+    def is_full(self) -> bool:
+        return self.pending_count >= self.max_pending
+
+    async def run(self, func: Callable, *args: Any) -> Any:
+        """تشغيل دالة على مجمع العمليات وانتظار نتيجتها دون حجز حلقة الأحداث"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, func, *args)
+
+    async def submit(self, owner: str, job_type: str, func: Callable, *args: Any,
+                     finalize: Optional[Callable[[Any], Any]] = None,
+                     metadata: Optional[Dict[str, Any]] = None) -> str:
+        """تسجيل مهمة جديدة وإرجاع معرّفها فوراً بينما يجري التنفيذ في الخلفية
+        
+        يرفع JobQueueFull عند امتلاء القائمة. المقعد يُحجز قبل أول await حتى لا
+        تتجاوز الطلبات المتزامنة الحد أثناء انتظار الإدراج.
+        """
+        if self.is_full():
+            raise JobQueueFull(f"{self.pending_count} analysis jobs pending (limit {self.max_pending})")
+        self._reserved += 1
+        try:
+            job_id = str(uuid.uuid4())
+            now = datetime.now(timezone.utc)
+            await self.collection.insert_one({
+                "id": job_id,
+                "owner": owner,
+                "job_type": job_type,
+                "status": JOB_QUEUED,
+                "metadata": metadata or {},
+                "worker": self.instance_id,
+                "lease_expires_at": now + timedelta(seconds=self.lease_seconds),
+                "created_at": now,
+                "started_at": None,
+                "completed_at": None,
+                "result": None,
+                "error": None
+            })
+            task = asyncio.create_task(self._execute(job_id, func, args, finalize))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        finally:
+            self._reserved -= 1
+        return job_id
+
+    async def _execute(self, job_id: str, func: Callable, args: tuple,
+                       finalize: Optional[Callable[[Any], Any]]) -> None:
+        """تنفيذ المهمة وتحديث حالتها (أي خطأ يُسجَّل لأن المهمة تعمل دون منتظِر)"""
+        try:
+            await self._update(job_id, {"status": JOB_RUNNING, "started_at": datetime.now(timezone.utc)})
+            result = await self.run(func, *args)
+            if finalize is not None:
+                # تجهيز الاستجابة (make_json_safe على النتيجة كاملة) خارج حلقة الأحداث
+                result = await asyncio.to_thread(finalize, result)
+            await self._update(job_id, {
+                "status": JOB_COMPLETED,
+                "result": result,
+                "completed_at": datetime.now(timezone.utc)
+            })
+        except asyncio.CancelledError:
+            await asyncio.shield(self._mark_failed(job_id, "Job cancelled during shutdown"))
+            raise
+        except Exception as e:
+            logger.error(f"Analysis job {job_id} failed: {e}", exc_info=True)
+            await self._mark_failed(job_id, str(e))
+
+    async def _mark_failed(self, job_id: str, error: str) -> None:
+        try:
+            await self._update(job_id, {
+                "status": JOB_FAILED,
+                "error": error,
+                "completed_at": datetime.now(timezone.utc)
+            })
+        except Exception as e:
+            logger.error(f"Could not mark analysis job {job_id} as failed: {e}")
+
+    async def renew_leases(self) -> None:
+        """تمديد عقد مهام هذه النسخة التي لم تنتهِ بعد"""
+        await self.collection.update_many(
+            {"worker": self.instance_id, "status": {"$in": [JOB_QUEUED, JOB_RUNNING]}},
+            {"$set": {"lease_expires_at": datetime.now(timezone.utc) + timedelta(seconds=self.lease_seconds)}}
+        )
+
+    async def _renew_leases(self) -> None:
+        """تجديد العقود دورياً وتعليم مهام النسخ المتوقفة كفاشلة"""
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                await self.renew_leases()
+                await self.fail_interrupted_jobs()
+            except Exception as e:
+                logger.error(f"Renewing analysis job leases failed: {e}")
+
+    async def fail_interrupted_jobs(self) -> int:
+        """تعليم المهام المعلقة التي انتهى عقدها (نسختها توقفت) كفاشلة
+        
+        تُستدعى عند بدء التشغيل ثم دورياً. مهام النسخ الأخرى الحية لا تُمس لأن
+        عقودها تُجدد، والمهام القديمة بلا عقد تُعامل كمنتهية.
+        """
+        now = datetime.now(timezone.utc)
+        update = await self.collection.update_many(
+            {
+                "status": {"$in": [JOB_QUEUED, JOB_RUNNING]},
+                "worker": {"$ne": self.instance_id},
+                "$or": [{"lease_expires_at": None}, {"lease_expires_at": {"$lt": now}}]
+            },
+            {"$set": {
+                "status": JOB_FAILED,
+                "error": "Job interrupted by server restart",
+                "completed_at": now
+            }}
+        )
+        if update.modified_count:
+            logger.warning(f"Marked {update.modified_count} interrupted analysis jobs as failed")
+        return update.modified_count
+
+    async def _update(self, job_id: str, fields: Dict[str, Any]) -> None:
+        await self.collection.update_one({"id": job_id}, {"$set": fields})
+
+    async def get_job(self, job_id: str, owner: str, include_result: bool = False) -> Optional[Dict[str, Any]]:
+        """جلب مهمة يملكها المستخدم (بدون النتيجة إلا عند طلبها)"""
+        projection = {"_id": 0, "worker": 0, "lease_expires_at": 0}
+        if not include_result:
+            projection["result"] = 0
+        return await self.collection.find_one({"id": job_id, "owner": owner}, projection)
+
+
+# Global instance
+analysis_jobs = AnalysisJobQueue()
@@ -9,6 +9,8 @@ import math
 import json
 import logging
 
+from financial_analysis_engine_170 import FinancialAnalysisEngine, FinancialData, select_metrics
+
 logger = logging.getLogger(__name__)
 
 class ComprehensiveFinancialAnalyzer:
@@ -22,6 +24,8 @@ class ComprehensiveFinancialAnalyzer:
         self.legal_entity = financial_data.get('legal_entity', 'شركة ذات مسؤولية محدودة')
         self.analysis_years = financial_data.get('analysis_years', 1)
         self.comparison_level = financial_data.get('comparison_level', 'المستوى المحلي (السعودية)')
+        # المقاييس المطلوبة من محرك الـ170 تحليل (None = الجميع)
+        self.requested_metrics = select_metrics(financial_data.get('analysis_types'))
         
         # البيانات المالية الأساسية
         self.current_assets = financial_data.get('current_assets', 5200000)
@@ -47,17 +51,15 @@ class ComprehensiveFinancialAnalyzer:
         # الملخص التنفيذي الشامل
         executive_summary = self._generate_executive_summary()
         
-        # التحليلات المفصلة حسب المستويات
-        level1_analyses = self._classical_foundational_analysis()  # 55 تحليل
-        level2_analyses = self._applied_intermediate_analysis()     # 38 تحليل  
-        level3_analyses = self._advanced_analysis()               # 77 تحليل
+        # التحليلات المفصلة حسب المستويات - للتحليل الشامل فقط، أما المقاييس المحددة فيحسبها المحرك
+        all_detailed_analyses = {}
+        if self.requested_metrics is None:
+            all_detailed_analyses.update(self._classical_foundational_analysis())  # 55 تحليل
+            all_detailed_analyses.update(self._applied_intermediate_analysis())    # 38 تحليل
+            all_detailed_analyses.update(self._advanced_analysis())                # 77 تحليل
         
-        # تجميع جميع التحليلات
-        all_detailed_analyses = {
-            **level1_analyses,
-            **level2_analyses, 
-            **level3_analyses
-        }
+        # مقاييس محرك الـ170 تحليل - المطلوبة فقط عند تحديد analysis_types
+        engine_analyses = self._run_analysis_engine()
         
         # تحليل SWOT الشامل
         comprehensive_swot = self._comprehensive_swot_analysis(all_detailed_analyses)
@@ -81,6 +83,7 @@ class ComprehensiveFinancialAnalyzer:
             "strategic_decisions": strategic_decisions,
             "analysis_metadata": {
                 "total_analysis_count": 170,
+                "requested_metrics": self.requested_metrics or "all",
                 "analysis_levels": 3,
                 "completion_time": datetime.now().isoformat(),
                 "analysis_depth": "شامل ومتكامل",
@@ -88,9 +91,25 @@ class ComprehensiveFinancialAnalyzer:
             }
         }
         
+        if engine_analyses is not None:
+            final_result["financial_engine_analyses"] = engine_analyses
+        
         logger.info("✅ تم إكمال التحليل الشامل - 170 نوع تحليل")
         return final_result
     
+    def _run_analysis_engine(self) -> Optional[Dict[str, Any]]:
+        """تشغيل محرك الـ170 تحليل على المقاييس المطلوبة فقط (None عند التحليل الشامل)"""
+        
+        if self.requested_metrics is None:
+            return None
+        
+        fields = FinancialData.__dataclass_fields__
+        engine_data = FinancialData(**{
+            key: float(value) for key, value in self.data.items()
+            if key in fields and isinstance(value, (int, float)) and not isinstance(value, bool)
+        })
+        return FinancialAnalysisEngine(engine_data).run_all_analyses(metrics=self.requested_metrics)
+    
     def _generate_executive_summary(self) -> Dict[str, Any]:
         """إنشاء الملخص التنفيذي الشامل كما طلب المستخدم"""
         
@@ -643,4 +662,8 @@ class ComprehensiveFinancialAnalyzer:
                 "الشفافية": "مستوى عالي من الشفافية والإفصاح",
                 "التوصية_العامة": "شركة موثوقة ومستقرة"
             }
-        }
\ No newline at end of file
+        }
+
+def run_comprehensive_analysis_job(financial_data: Dict) -> Dict[str, Any]:
+    """تشغيل التحليل الشامل كدالة مستقلة قابلة للتنفيذ في عملية منفصلة"""
+    return ComprehensiveFinancialAnalyzer(financial_data).run_comprehensive_analysis()
@@ -0,0 +1,129 @@
+"""
+تخزين مخرجات معالجة الملفات الكبيرة خارج سجلات MongoDB
+Externalized storage for bulky file-processing artifacts
+
+- النص الخام والجداول لكل ملف تُحفظ في GridFS كـ JSON مضغوط
+- سجل file_processing يحتفظ بملخص خفيف ومعرّف المخرجات فقط
+- الملفات المتطابقة المحتوى تتشارك مخرجات واحدة مع قائمة بالمستخدمين المالكين
+"""
+
+import asyncio
+import copy
+import logging
+import os
+from typing import Any, Dict, Optional
+
+from parse_cache import decode_payload, encode_payload
+
+logger = logging.getLogger(__name__)
+
+
+class FileArtifactStore:
+    """حفظ واسترجاع النص الخام والجداول لكل ملف مرفوع عبر GridFS"""
+
+    def __init__(self, bucket_name: str = "file_artifacts", max_text_chars: Optional[int] = None):
+        self.bucket_name = bucket_name
+        self.max_text_chars = max_text_chars or int(os.environ.get('FILE_ARTIFACT_MAX_TEXT_CHARS', 2_000_000))
+        self._bucket = None
+        self._files = None
+
+    def attach(self, db) -> None:
+        """ربط مخزن GridFS ومجموعة بياناته الوصفية"""
+        from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+        self._bucket = AsyncIOMotorGridFSBucket(db, bucket_name=self.bucket_name)
+        self._files = db[f"{self.bucket_name}.files"]
+
+    def _artifact_key(self, file_result: Dict[str, Any]) -> Optional[str]:
+        """مفتاح المخرجات: بصمة المحتوى مع إصدار المحلل وحد اقتطاع النص"""
+        content_key = file_result.get("content_key") or file_result.get("content_hash")
+        return f"{content_key}|{self.max_text_chars}" if content_key else None
+
+    async def _reuse(self, artifact_key: str, user_email: str) -> Optional[str]:
+        """معرّف مخرجات محفوظة لنفس المحتوى بعد إضافة المستخدم لمالكيها"""
+        document = await self._files.find_one_and_update(
+            {"metadata.artifact_key": artifact_key},
+            {"$addToSet": {"metadata.owners": user_email}},
+            projection={"_id": 1}
+        )
+        return str(document["_id"]) if document else None
+
+    async def _store(self, user_email: str, file_result: Dict[str, Any], raw_text: str, tables: list) -> str:
+        artifact_key = self._artifact_key(file_result)
+        if artifact_key is not None:
+            artifact_id = await self._reuse(artifact_key, user_email)
+            if artifact_id is not None:
+                return artifact_id
+
+        data = await asyncio.to_thread(
+            encode_payload, {"raw_text": raw_text[:self.max_text_chars], "tables": tables}
+        )
+        artifact_id = await self._bucket.upload_from_stream(
+            file_result.get("filename", "upload"),
+            data,
+            metadata={
+                "user_email": user_email,
+                "owners": [user_email],
+                "content_hash": file_result.get("content_hash"),
+                "artifact_key": artifact_key,
+                "content_encoding": "gzip"
+            }
+        )
+        return str(artifact_id)
+
+    async def externalize(self, user_email: str, processing_results: Dict[str, Any]) -> Dict[str, Any]:
+        """نسخة خفيفة من نتائج المعالجة مع نقل النص الخام والجداول إلى GridFS"""
+
+        slim_results = {key: value for key, value in processing_results.items() if key != "files_processed"}
+        slim_results["files_processed"] = []
+
+        for file_result in processing_results.get("files_processed", []):
+            extracted_data = file_result.get("extracted_data", {})
+            raw_text = extracted_data.get("raw_text") or ""
+            tables = extracted_data.get("tables") or []
+
+            slim_file = {key: value for key, value in file_result.items() if key != "extracted_data"}
+            slim_file["extracted_data"] = {
+                key: copy.deepcopy(value) for key, value in extracted_data.items()
+                if key not in ("raw_text", "tables")
+            }
+            slim_file["artifacts"] = {
+                "artifact_id": None,
+                "raw_text_length": len(raw_text),
+                "tables_count": len(tables),
+                "raw_text_truncated": len(raw_text) > self.max_text_chars
+            }
+
+            if self._bucket is not None and (raw_text or tables):
+                try:
+                    slim_file["artifacts"]["artifact_id"] = await self._store(user_email, file_result, raw_text, tables)
+                except Exception as e:
+                    logger.warning(f"Storing artifacts for {file_result.get('filename')} failed: {e}")
+
+            slim_results["files_processed"].append(slim_file)
+
+        return slim_results
+
+    async def load(self, artifact_id: str, user_email: str) -> Optional[Dict[str, Any]]:
+        """استرجاع النص الخام والجداول لملف يملكه المستخدم"""
+        from bson import ObjectId
+        from bson.errors import InvalidId
+
+        if self._bucket is None:
+            return None
+        try:
+            object_id = ObjectId(artifact_id)
+        except (InvalidId, TypeError):
+            return None
+
+        # المخرجات القديمة تحمل مالكاً واحداً في metadata.user_email
+        cursor = self._bucket.find({
+            "_id": object_id,
+            "$or": [{"metadata.owners": user_email}, {"metadata.user_email": user_email}]
+        }, limit=1)
+        async for grid_out in cursor:
+            return await asyncio.to_thread(decode_payload, await grid_out.read())
+        return None
+
+
+# Global instance
+file_artifacts = FileArtifactStore()
@@ -4,7 +4,9 @@
 """
 
 import math
-from typing import Dict, List, Any, Optional
+import functools
+from collections import Counter
+from typing import Dict, List, Any, Optional, Tuple
 from dataclasses import dataclass
 
 
@@ -26,6 +28,119 @@ def make_json_safe(value: float) -> float:
     return value
 
 
+def memoized_ratio(method, name: Optional[str] = None):
+    """تخزين نتيجة النسبة مؤقتاً طوال تشغيل run_all_analyses واحد
+
+    name: اسم المقياس في السجل (مفتاح الذاكرة وعداد الحسابات) - افتراضياً اسم الدالة
+    """
+    name = name or method.__name__
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        cache = self._ratio_cache
+        if cache is not None and name in cache:
+            return cache[name]
+        value = method(self, *args, **kwargs)
+        self.ratio_computations[name] += 1
+        if cache is not None:
+            cache[name] = value
+        return value
+
+    return wrapper
+
+
+@dataclass(frozen=True)
+class MetricSpec:
+    """تعريف مقياس في السجل: حقوله المدخلة والمقاييس التي يعتمد عليها"""
+    name: str
+    category: str
+    method: str
+    inputs: Tuple[str, ...] = ()
+    depends: Tuple[str, ...] = ()
+    uses_wacc: bool = False
+
+
+# سجل جميع المقاييس بترتيب تعريفها (وهو ترتيب ظهورها في النتائج)
+METRIC_REGISTRY: Dict[str, MetricSpec] = {}
+
+# فئات النسب التي تُقرّب قيمها في النتائج
+RATIO_CATEGORIES = ('liquidity_ratios', 'activity_ratios', 'profitability_ratios', 'leverage_ratios', 'market_ratios')
+
+
+def register_metric(category: str, name: Optional[str] = None, inputs: Tuple[str, ...] = (),
+                    depends: Tuple[str, ...] = (), uses_wacc: bool = False):
+    """تسجيل دالة كمقياس في METRIC_REGISTRY مع تخزين نتيجتها خلال التشغيل"""
+    def decorator(method):
+        spec = MetricSpec(name or method.__name__, category, method.__name__,
+                          tuple(inputs), tuple(depends), uses_wacc)
+        METRIC_REGISTRY[spec.name] = spec
+        return memoized_ratio(method, spec.name)
+    return decorator
+
+
+def is_known_metric(name: str) -> bool:
+    """هل الاسم مقياس مسجل أو فئة مقاييس"""
+    return name in METRIC_REGISTRY or any(spec.category == name for spec in METRIC_REGISTRY.values())
+
+
+def expand_metrics(names: List[str]) -> List[str]:
+    """توسيع أسماء الفئات إلى مقاييسها مع رفض الأسماء غير المعروفة"""
+    requested = []
+    unknown = []
+    for name in names:
+        if name in METRIC_REGISTRY:
+            requested.append(name)
+        else:
+            members = [spec.name for spec in METRIC_REGISTRY.values() if spec.category == name]
+            if not members:
+                unknown.append(name)
+            requested.extend(members)
+    if unknown:
+        raise ValueError(f"Unknown metrics: {', '.join(unknown)}")
+    return requested
+
+
+# مستويات التحليل التي ترسلها الواجهة - تعني تشغيل جميع المقاييس
+ANALYSIS_LEVELS = frozenset({
+    'comprehensive', 'basic', 'basic_classical', 'intermediate', 'advanced', 'complex', 'ai_powered'
+})
+
+
+def select_metrics(analysis_types: Optional[List[str]]) -> Optional[List[str]]:
+    """تحويل analysis_types من الطلب إلى قائمة مقاييس (None = جميع المقاييس)
+
+    يرفع ValueError عند وجود أسماء ليست مستويات ولا مقاييس ولا فئات مسجلة
+    """
+    names = list(analysis_types or [])
+    unknown = [name for name in names if name not in ANALYSIS_LEVELS and not is_known_metric(name)]
+    if unknown:
+        raise ValueError(f"Unknown analysis types: {', '.join(unknown)}")
+    if not names or any(name in ANALYSIS_LEVELS for name in names):
+        return None
+    return names
+
+
+def resolve_metrics(names: List[str]) -> List[str]:
+    """ترتيب المقاييس المطلوبة مع اعتمادياتها ترتيباً طوبولوجياً"""
+    order: List[str] = []
+    state: Dict[str, str] = {}
+
+    def visit(name: str) -> None:
+        if state.get(name) == 'done':
+            return
+        if state.get(name) == 'visiting':
+            raise ValueError(f"Circular metric dependency at: {name}")
+        state[name] = 'visiting'
+        for dependency in METRIC_REGISTRY[name].depends:
+            visit(dependency)
+        state[name] = 'done'
+        order.append(name)
+
+    for name in expand_metrics(names):
+        visit(name)
+    return order
+
+
 @dataclass
 class FinancialData:
     """بيانات القوائم المالية الشاملة"""
@@ -120,56 +235,88 @@ class FinancialAnalysisEngine:
     """محرك التحليل المالي الكامل مع 170+ نوع تحليل"""
     
     def __init__(self, data: FinancialData):
+        # ذاكرة النسب تكون فعالة فقط أثناء run_all_analyses
+        self._ratio_cache: Optional[Dict[str, Any]] = None
+        # عدد مرات الحساب الفعلي لكل نسبة (يُصفّر مع كل تشغيل)
+        self.ratio_computations: Counter = Counter()
         self.data = data
+
+    @property
+    def data(self) -> FinancialData:
+        return self._data
+
+    @data.setter
+    def data(self, value: FinancialData) -> None:
+        self._data = value
+        self.invalidate_ratio_cache()
+
+    def invalidate_ratio_cache(self) -> None:
+        """إلغاء النسب المخزنة بعد تغيير البيانات"""
+        if self._ratio_cache is not None:
+            self._ratio_cache.clear()
         
     # =====================================
     # 1. نسب السيولة (15 نوع)
     # =====================================
     
+    @register_metric('liquidity_ratios', inputs=('current_assets', 'current_liabilities'))
     def current_ratio(self) -> float:
         """النسبة الجارية"""
         return safe_divide(self.data.current_assets, self.data.current_liabilities, 0.0)
     
+    @register_metric('liquidity_ratios', inputs=('current_assets', 'inventory', 'current_liabilities'))
     def quick_ratio(self) -> float:
         """النسبة السريعة"""
         return safe_divide(self.data.current_assets - self.data.inventory, self.data.current_liabilities, 0.0)
     
+    @register_metric('liquidity_ratios', inputs=('cash', 'current_liabilities'))
     def cash_ratio(self) -> float:
         """نسبة النقدية"""
         return safe_divide(self.data.cash, self.data.current_liabilities, 0.0)
     
+    @register_metric('liquidity_ratios', inputs=('cash', 'marketable_securities', 'current_liabilities'))
     def absolute_cash_ratio(self) -> float:
         """نسبة النقدية المطلقة"""
         return safe_divide(self.data.cash + self.data.marketable_securities, self.data.current_liabilities, 0.0)
     
+    @register_metric('liquidity_ratios',
+                     inputs=('cash', 'marketable_securities', 'accounts_receivable', 'current_liabilities'))
     def super_quick_ratio(self) -> float:
         """نسبة التداول السريعة جداً"""
         numerator = (self.data.cash + self.data.marketable_securities + 
                     self.data.accounts_receivable * 0.8)
         return safe_divide(numerator, self.data.current_liabilities, 0.0)
     
+    @register_metric('liquidity_ratios', inputs=('current_assets', 'current_liabilities'))
     def working_capital(self) -> float:
         """رأس المال العامل"""
         return self.data.current_assets - self.data.current_liabilities
     
+    @register_metric('liquidity_ratios', inputs=('total_assets',), depends=('working_capital',))
     def working_capital_ratio(self) -> float:
         """نسبة رأس المال العامل"""
         return safe_divide(self.working_capital(), self.data.total_assets, 0.0)
     
+    @register_metric('liquidity_ratios', inputs=('operating_cash_flow', 'current_liabilities'))
     def operating_cash_flow_ratio(self) -> float:
         """نسبة التدفق النقدي التشغيلي"""
         return safe_divide(self.data.operating_cash_flow, self.data.current_liabilities, 0.0)
     
+    @register_metric('liquidity_ratios',
+                     inputs=('operating_expenses', 'cash', 'marketable_securities', 'accounts_receivable'))
     def defensive_interval_ratio(self) -> float:
         """نسبة الفترة الدفاعية"""
         daily_expenses = safe_divide(self.data.operating_expenses, 365, 1.0)
         liquid_assets = self.data.cash + self.data.marketable_securities + self.data.accounts_receivable
         return safe_divide(liquid_assets, daily_expenses, 0.0)
     
+    @register_metric('liquidity_ratios', inputs=('cash', 'accounts_receivable', 'current_liabilities'))
     def critical_liquidity_ratio(self) -> float:
         """نسبة السيولة الحرجة"""
         return safe_divide(self.data.cash + self.data.accounts_receivable, self.data.current_liabilities, 0.0)
     
+    @register_metric('liquidity_ratios',
+                     inputs=('inventory', 'cost_of_revenue', 'accounts_receivable', 'revenue', 'accounts_payable'))
     def cash_conversion_cycle(self) -> float:
         """دورة التحويل النقدي"""
         days_inventory = safe_divide(self.data.inventory * 365, self.data.cost_of_revenue, 0.0)
@@ -177,18 +324,23 @@ class FinancialAnalysisEngine:
         days_payables = safe_divide(self.data.accounts_payable * 365, self.data.cost_of_revenue, 0.0)
         return days_inventory + days_receivables - days_payables
     
+    @register_metric('liquidity_ratios', inputs=('cash', 'marketable_securities', 'total_assets'))
     def liquid_assets_ratio(self) -> float:
         """نسبة الأصول السائلة"""
         return safe_divide(self.data.cash + self.data.marketable_securities, self.data.total_assets, 0.0)
     
+    @register_metric('liquidity_ratios', inputs=('revenue', 'cash'))
     def cash_turnover_ratio(self) -> float:
         """معدل دوران النقدية"""
         return safe_divide(self.data.revenue, self.data.cash, 0.0)
     
+    @register_metric('liquidity_ratios', inputs=('operating_income', 'depreciation_amortization', 'interest_expense'))
     def cash_coverage_ratio(self) -> float:
         """نسبة التغطية النقدية"""
         return safe_divide(self.data.operating_income + self.data.depreciation_amortization, self.data.interest_expense, 0.0)
     
+    @register_metric('liquidity_ratios',
+                     inputs=('current_assets', 'inventory', 'prepaid_expenses', 'current_liabilities', 'deferred_revenue'))
     def modified_liquidity_ratio(self) -> float:
         """نسبة السيولة المعدلة"""
         numerator = self.data.current_assets - self.data.inventory - self.data.prepaid_expenses
@@ -199,81 +351,99 @@ class FinancialAnalysisEngine:
     # 2. نسب النشاط والكفاءة (18 نوع)
     # =====================================
     
+    @register_metric('activity_ratios', inputs=('cost_of_revenue', 'inventory'))
     def inventory_turnover(self) -> float:
         """معدل دوران المخزون"""
         return safe_divide(self.data.cost_of_revenue, self.data.inventory, 0.0)
     
+    @register_metric('activity_ratios', depends=('inventory_turnover',))
     def days_inventory_outstanding(self) -> float:
         """أيام المخزون"""
         turnover = self.inventory_turnover()
         return safe_divide(365, turnover, 0.0)
     
+    @register_metric('activity_ratios', inputs=('revenue', 'accounts_receivable'))
     def receivables_turnover(self) -> float:
         """معدل دوران المدينين"""
         return safe_divide(self.data.revenue, self.data.accounts_receivable, 0.0)
     
+    @register_metric('activity_ratios', depends=('receivables_turnover',))
     def days_sales_outstanding(self) -> float:
         """فترة التحصيل"""
         turnover = self.receivables_turnover()
         return safe_divide(365, turnover, 0.0)
     
+    @register_metric('activity_ratios', inputs=('cost_of_revenue', 'accounts_payable'))
     def payables_turnover(self) -> float:
         """معدل دوران الدائنين"""
         return safe_divide(self.data.cost_of_revenue, self.data.accounts_payable, 0.0)
     
+    @register_metric('activity_ratios', depends=('payables_turnover',))
     def days_payables_outstanding(self) -> float:
         """فترة السداد"""
         turnover = self.payables_turnover()
         return safe_divide(365, turnover, 0.0)
     
+    @register_metric('activity_ratios', inputs=('revenue', 'total_assets'))
     def asset_turnover(self) -> float:
         """معدل دوران الأصول"""
         return safe_divide(self.data.revenue, self.data.total_assets, 0.0)
     
+    @register_metric('activity_ratios', inputs=('property_plant_equipment', 'accumulated_depreciation', 'revenue'))
     def fixed_asset_turnover(self) -> float:
         """معدل دوران الأصول الثابتة"""
         net_fixed_assets = self.data.property_plant_equipment - self.data.accumulated_depreciation
         return safe_divide(self.data.revenue, net_fixed_assets, 0.0)
     
+    @register_metric('activity_ratios', inputs=('revenue', 'current_assets'))
     def current_asset_turnover(self) -> float:
         """معدل دوران الأصول المتداولة"""
         return safe_divide(self.data.revenue, self.data.current_assets, 0.0)
     
+    @register_metric('activity_ratios', inputs=('revenue',), depends=('working_capital',))
     def working_capital_turnover(self) -> float:
         """معدل دوران رأس المال العامل"""
         wc = self.working_capital()
         return safe_divide(self.data.revenue, wc, 0.0)
     
+    @register_metric('activity_ratios', inputs=('operating_cash_flow', 'revenue'))
     def cash_management_efficiency(self) -> float:
         """كفاءة إدارة النقدية"""
         return safe_divide(self.data.operating_cash_flow, self.data.revenue, 0.0)
     
+    @register_metric('activity_ratios', inputs=('gross_profit', 'total_assets'))
     def asset_efficiency_ratio(self) -> float:
         """نسبة كفاءة الأصول"""
         return safe_divide(self.data.gross_profit, self.data.total_assets, 0.0)
     
+    @register_metric('activity_ratios', inputs=('revenue', 'shareholders_equity'))
     def equity_turnover(self) -> float:
         """معدل دوران حقوق الملكية"""
         return safe_divide(self.data.revenue, self.data.shareholders_equity, 0.0)
     
+    @register_metric('activity_ratios', inputs=('operating_income', 'total_assets'))
     def asset_utilization(self) -> float:
         """معدل استخدام الأصول"""
         return safe_divide(self.data.operating_income, self.data.total_assets, 0.0)
     
+    @register_metric('activity_ratios', inputs=('total_assets', 'current_liabilities', 'revenue'))
     def capital_employed_efficiency(self) -> float:
         """كفاءة رأس المال المستثمر"""
         capital_employed = self.data.total_assets - self.data.current_liabilities
         return safe_divide(self.data.revenue, capital_employed, 0.0)
     
+    @register_metric('activity_ratios', inputs=('revenue', 'intangible_assets'))
     def intangible_asset_turnover(self) -> float:
         """معدل دوران الأصول غير الملموسة"""
         return safe_divide(self.data.revenue, self.data.intangible_assets, 0.0)
     
+    @register_metric('activity_ratios', inputs=('revenue', 'accounts_receivable'))
     def collection_efficiency(self) -> float:
         """كفاءة التحصيل"""
         monthly_revenue = safe_divide(self.data.revenue, 12, 1.0)
         return 1 - safe_divide(self.data.accounts_receivable, monthly_revenue, 0.0)
     
+    @register_metric('activity_ratios', inputs=('total_assets', 'cash', 'marketable_securities', 'revenue'))
     def operating_asset_turnover(self) -> float:
         """معدل دوران إجمالي الأصول التشغيلية"""
         operating_assets = self.data.total_assets - self.data.cash - self.data.marketable_securities
@@ -283,36 +453,43 @@ class FinancialAnalysisEngine:
     # 3. نسب الربحية (20 نوع)
     # =====================================
     
+    @register_metric('profitability_ratios', inputs=('revenue', 'gross_profit'))
     def gross_profit_margin(self) -> float:
         """هامش الربح الإجمالي"""
         if self.data.revenue == 0:
             return 0.0
         return (self.data.gross_profit / self.data.revenue) * 100
     
+    @register_metric('profitability_ratios', inputs=('revenue', 'operating_income'))
     def operating_profit_margin(self) -> float:
         """هامش الربح التشغيلي"""
         if self.data.revenue == 0:
             return 0.0
         return (self.data.operating_income / self.data.revenue) * 100
     
+    @register_metric('profitability_ratios', inputs=('revenue', 'net_income'))
     def net_profit_margin(self) -> float:
         """هامش الربح الصافي"""
         if self.data.revenue == 0:
             return 0.0
         return (self.data.net_income / self.data.revenue) * 100
     
+    @register_metric('profitability_ratios', inputs=('total_assets', 'net_income'))
     def return_on_assets(self) -> float:
         """العائد على الأصول ROA"""
         if self.data.total_assets == 0:
             return 0.0
         return (self.data.net_income / self.data.total_assets) * 100
     
+    @register_metric('profitability_ratios', inputs=('shareholders_equity', 'net_income'))
     def return_on_equity(self) -> float:
         """العائد على حقوق الملكية ROE"""
         if self.data.shareholders_equity == 0:
             return 0.0
         return (self.data.net_income / self.data.shareholders_equity) * 100
     
+    @register_metric('profitability_ratios',
+                     inputs=('total_assets', 'cash', 'current_liabilities', 'income_before_tax', 'operating_income', 'income_tax'))
     def return_on_invested_capital(self) -> float:
         """العائد على رأس المال المستثمر ROIC"""
         invested_capital = self.data.total_assets - self.data.cash - self.data.current_liabilities
@@ -321,6 +498,7 @@ class FinancialAnalysisEngine:
         nopat = self.data.operating_income * (1 - (self.data.income_tax / self.data.income_before_tax))
         return (nopat / invested_capital) * 100
     
+    @register_metric('profitability_ratios', inputs=('total_assets', 'current_liabilities', 'operating_income'))
     def return_on_capital_employed(self) -> float:
         """العائد على رأس المال المستخدم ROCE"""
         capital_employed = self.data.total_assets - self.data.current_liabilities
@@ -328,6 +506,7 @@ class FinancialAnalysisEngine:
             return 0.0
         return (self.data.operating_income / capital_employed) * 100
     
+    @register_metric('profitability_ratios', inputs=('revenue', 'operating_income', 'depreciation_amortization'))
     def ebitda_margin(self) -> float:
         """هامش EBITDA"""
         if self.data.revenue == 0:
@@ -335,18 +514,21 @@ class FinancialAnalysisEngine:
         ebitda = self.data.operating_income + self.data.depreciation_amortization
         return (ebitda / self.data.revenue) * 100
     
+    @register_metric('profitability_ratios', inputs=('revenue', 'operating_cash_flow'))
     def operating_cash_flow_margin(self) -> float:
         """هامش التدفق النقدي التشغيلي"""
         if self.data.revenue == 0:
             return 0.0
         return (self.data.operating_cash_flow / self.data.revenue) * 100
     
+    @register_metric('profitability_ratios', inputs=('revenue', 'free_cash_flow'))
     def free_cash_flow_margin(self) -> float:
         """هامش التدفق النقدي الحر"""
         if self.data.revenue == 0:
             return 0.0
         return (self.data.free_cash_flow / self.data.revenue) * 100
     
+    @register_metric('profitability_ratios', inputs=('total_assets', 'intangible_assets', 'goodwill', 'net_income'))
     def return_on_tangible_assets(self) -> float:
         """العائد على الأصول الملموسة"""
         tangible_assets = self.data.total_assets - self.data.intangible_assets - self.data.goodwill
@@ -354,6 +536,7 @@ class FinancialAnalysisEngine:
             return 0.0
         return (self.data.net_income / tangible_assets) * 100
     
+    @register_metric('profitability_ratios', inputs=('previous_year_data', 'net_income'))
     def earnings_growth_rate(self) -> float:
         """معدل نمو الأرباح"""
         if (not self.data.previous_year_data or 
@@ -363,18 +546,21 @@ class FinancialAnalysisEngine:
         previous_income = self.data.previous_year_data['net_income']
         return ((self.data.net_income - previous_income) / previous_income) * 100
     
+    @register_metric('profitability_ratios', inputs=('operating_income', 'operating_expenses'))
     def cost_to_income_ratio(self) -> float:
         """نسبة التكلفة إلى الدخل"""
         if self.data.operating_income == 0:
             return 0.0
         return (self.data.operating_expenses / self.data.operating_income) * 100
     
+    @register_metric('profitability_ratios', inputs=('revenue', 'operating_income'))
     def return_on_sales(self) -> float:
         """العائد على المبيعات ROS"""
         if self.data.revenue == 0:
             return 0.0
         return (self.data.operating_income / self.data.revenue) * 100
     
+    @register_metric('profitability_ratios', inputs=('revenue', 'cost_of_revenue'))
     def contribution_margin(self) -> float:
         """هامش المساهمة"""
         if self.data.revenue == 0:
@@ -382,18 +568,21 @@ class FinancialAnalysisEngine:
         variable_costs = self.data.cost_of_revenue * 0.7  # تقدير
         return ((self.data.revenue - variable_costs) / self.data.revenue) * 100
     
+    @register_metric('profitability_ratios', inputs=('operating_expenses', 'gross_profit'))
     def operating_efficiency(self) -> float:
         """نسبة الكفاءة التشغيلية"""
         if self.data.operating_expenses == 0:
             return 0.0
         return (self.data.gross_profit / self.data.operating_expenses) * 100
     
+    @register_metric('profitability_ratios', inputs=('total_assets', 'operating_income'))
     def basic_earning_power(self) -> float:
         """معدل العائد الأساسي"""
         if self.data.total_assets == 0:
             return 0.0
         return (self.data.operating_income / self.data.total_assets) * 100
     
+    @register_metric('profitability_ratios', inputs=('revenue', 'income_before_tax', 'interest_expense'))
     def ebit_margin(self) -> float:
         """هامش الربح قبل الفوائد والضرائب"""
         if self.data.revenue == 0:
@@ -401,6 +590,8 @@ class FinancialAnalysisEngine:
         ebit = self.data.income_before_tax + self.data.interest_expense
         return (ebit / self.data.revenue) * 100
     
+    @register_metric('profitability_ratios',
+                     inputs=('total_assets', 'cash', 'marketable_securities', 'operating_income'))
     def return_on_operating_assets(self) -> float:
         """العائد على الأصول التشغيلية"""
         operating_assets = self.data.total_assets - self.data.cash - self.data.marketable_securities
@@ -408,6 +599,7 @@ class FinancialAnalysisEngine:
             return 0.0
         return (self.data.operating_income / operating_assets) * 100
     
+    @register_metric('profitability_ratios', inputs=('revenue', 'net_income', 'accumulated_other_comprehensive_income'))
     def comprehensive_profitability_rate(self) -> float:
         """معدل الربحية الشامل"""
         if self.data.revenue == 0:
@@ -419,36 +611,43 @@ class FinancialAnalysisEngine:
     # 4. نسب المديونية والرافعة المالية (15 نوع)
     # =====================================
     
+    @register_metric('leverage_ratios', inputs=('shareholders_equity', 'total_liabilities'))
     def debt_to_equity_ratio(self) -> float:
         """نسبة الدين إلى حقوق الملكية"""
         if self.data.shareholders_equity == 0:
             return float('inf')
         return self.data.total_liabilities / self.data.shareholders_equity
     
+    @register_metric('leverage_ratios', inputs=('total_assets', 'total_liabilities'))
     def debt_to_assets_ratio(self) -> float:
         """نسبة الدين إلى الأصول"""
         if self.data.total_assets == 0:
             return 0.0
         return self.data.total_liabilities / self.data.total_assets
     
+    @register_metric('leverage_ratios', inputs=('total_assets', 'shareholders_equity'))
     def equity_ratio(self) -> float:
         """نسبة حقوق الملكية"""
         if self.data.total_assets == 0:
             return 0.0
         return self.data.shareholders_equity / self.data.total_assets
     
+    @register_metric('leverage_ratios', inputs=('shareholders_equity', 'total_assets'))
     def equity_multiplier(self) -> float:
         """مضاعف حقوق الملكية"""
         if self.data.shareholders_equity == 0:
             return float('inf')
         return self.data.total_assets / self.data.shareholders_equity
     
+    @register_metric('leverage_ratios', inputs=('interest_expense', 'operating_income'))
     def interest_coverage_ratio(self) -> float:
         """نسبة تغطية الفوائد"""
         if self.data.interest_expense == 0:
             return float('inf')
         return self.data.operating_income / self.data.interest_expense
     
+    @register_metric('leverage_ratios',
+                     inputs=('interest_expense', 'current_portion_long_term_debt', 'operating_income', 'depreciation_amortization'))
     def debt_service_coverage_ratio(self) -> float:
         """نسبة تغطية خدمة الدين"""
         debt_service = self.data.interest_expense + self.data.current_portion_long_term_debt
@@ -456,6 +655,7 @@ class FinancialAnalysisEngine:
             return float('inf')
         return (self.data.operating_income + self.data.depreciation_amortization) / debt_service
     
+    @register_metric('leverage_ratios', inputs=('long_term_debt', 'shareholders_equity'))
     def long_term_debt_to_capitalization(self) -> float:
         """نسبة الدين طويل الأجل إلى رأس المال"""
         total_capital = self.data.long_term_debt + self.data.shareholders_equity
@@ -463,6 +663,8 @@ class FinancialAnalysisEngine:
             return 0.0
         return self.data.long_term_debt / total_capital
     
+    @register_metric('leverage_ratios',
+                     inputs=('shareholders_equity', 'property_plant_equipment', 'accumulated_depreciation'))
     def fixed_assets_to_equity(self) -> float:
         """نسبة الأصول الثابتة إلى حقوق الملكية"""
         if self.data.shareholders_equity == 0:
@@ -470,6 +672,7 @@ class FinancialAnalysisEngine:
         net_fixed_assets = self.data.property_plant_equipment - self.data.accumulated_depreciation
         return net_fixed_assets / self.data.shareholders_equity
     
+    @register_metric('leverage_ratios', inputs=('total_liabilities', 'shareholders_equity'))
     def external_financing_ratio(self) -> float:
         """نسبة التمويل الخارجي"""
         total_financing = self.data.total_liabilities + self.data.shareholders_equity
@@ -477,6 +680,8 @@ class FinancialAnalysisEngine:
             return 0.0
         return self.data.total_liabilities / total_financing
     
+    @register_metric('leverage_ratios',
+                     inputs=('total_liabilities', 'cash', 'operating_income', 'depreciation_amortization'))
     def net_debt_to_ebitda(self) -> float:
         """نسبة الدين الصافي إلى EBITDA"""
         net_debt = self.data.total_liabilities - self.data.cash
@@ -485,6 +690,7 @@ class FinancialAnalysisEngine:
             return float('inf')
         return net_debt / ebitda
     
+    @register_metric('leverage_ratios', inputs=('operating_income', 'interest_expense'))
     def degree_of_financial_leverage(self) -> float:
         """درجة الرافعة المالية"""
         ebit = self.data.operating_income - self.data.interest_expense
@@ -492,6 +698,7 @@ class FinancialAnalysisEngine:
             return float('inf')
         return self.data.operating_income / ebit
     
+    @register_metric('leverage_ratios', inputs=('total_assets', 'short_term_debt', 'long_term_debt'))
     def financial_debt_ratio(self) -> float:
         """نسبة الدين المالي"""
         if self.data.total_assets == 0:
@@ -499,12 +706,14 @@ class FinancialAnalysisEngine:
         financial_debt = self.data.short_term_debt + self.data.long_term_debt
         return financial_debt / self.data.total_assets
     
+    @register_metric('leverage_ratios', inputs=('total_liabilities', 'operating_cash_flow'))
     def cash_debt_coverage(self) -> float:
         """نسبة التغطية النقدية للدين"""
         if self.data.total_liabilities == 0:
             return float('inf')
         return self.data.operating_cash_flow / self.data.total_liabilities
     
+    @register_metric('leverage_ratios', inputs=('operating_income', 'revenue', 'cost_of_revenue'))
     def operating_leverage(self) -> float:
         """نسبة الرافعة التشغيلية"""
         if self.data.operating_income == 0:
@@ -512,6 +721,7 @@ class FinancialAnalysisEngine:
         contribution_margin = self.data.revenue - self.data.cost_of_revenue
         return contribution_margin / self.data.operating_income
     
+    @register_metric('leverage_ratios', inputs=('total_liabilities', 'shareholders_equity'))
     def financial_safety_ratio(self) -> float:
         """معامل الأمان المالي"""
         if self.data.total_liabilities == 0:
@@ -522,22 +732,26 @@ class FinancialAnalysisEngine:
     # 5. نسب السوق والتقييم (15 نوع)
     # =====================================
     
+    @register_metric('market_ratios', inputs=('earnings_per_share',))
     def earnings_per_share(self) -> float:
         """ربحية السهم EPS"""
         return self.data.earnings_per_share
     
+    @register_metric('market_ratios', inputs=('earnings_per_share', 'stock_price'))
     def price_to_earnings_ratio(self) -> float:
         """نسبة السعر إلى الأرباح P/E"""
         if self.data.earnings_per_share == 0:
             return float('inf')
         return self.data.stock_price / self.data.earnings_per_share
     
+    @register_metric('market_ratios', inputs=('book_value_per_share', 'stock_price'))
     def price_to_book_ratio(self) -> float:
         """نسبة السعر إلى القيمة الدفترية P/B"""
         if self.data.book_value_per_share == 0:
             return float('inf')
         return self.data.stock_price / self.data.book_value_per_share
     
+    @register_metric('market_ratios', inputs=('shares', 'revenue', 'stock_price'))
     def price_to_sales_ratio(self) -> float:
         """نسبة السعر إلى المبيعات P/S"""
         if self.data.shares == 0:
@@ -547,6 +761,7 @@ class FinancialAnalysisEngine:
             return float('inf')
         return self.data.stock_price / sales_per_share
     
+    @register_metric('market_ratios', inputs=('shares', 'stock_price', 'dividends_paid'))
     def dividend_yield(self) -> float:
         """عائد توزيعات الأرباح"""
         if self.data.shares == 0 or self.data.stock_price == 0:
@@ -554,12 +769,15 @@ class FinancialAnalysisEngine:
         dividend_per_share = self.data.dividends_paid / self.data.shares
         return (dividend_per_share / self.data.stock_price) * 100
     
+    @register_metric('market_ratios', inputs=('net_income', 'dividends_paid'))
     def payout_ratio(self) -> float:
         """نسبة توزيع الأرباح"""
         if self.data.net_income == 0:
             return 0.0
         return (self.data.dividends_paid / self.data.net_income) * 100
     
+    @register_metric('market_ratios',
+                     inputs=('market_cap', 'total_liabilities', 'cash', 'operating_income', 'depreciation_amortization'))
     def ev_to_ebitda(self) -> float:
         """قيمة المؤسسة إلى EBITDA"""
         enterprise_value = self.data.market_cap + self.data.total_liabilities - self.data.cash
@@ -568,12 +786,14 @@ class FinancialAnalysisEngine:
             return float('inf')
         return enterprise_value / ebitda
     
+    @register_metric('market_ratios', inputs=('shares', 'shareholders_equity'))
     def book_value_per_share(self) -> float:
         """القيمة الدفترية للسهم"""
         if self.data.shares == 0:
             return 0.0
         return self.data.shareholders_equity / self.data.shares
     
+    @register_metric('market_ratios', depends=('price_to_earnings_ratio', 'earnings_growth_rate'))
     def peg_ratio(self) -> float:
         """نسبة PEG"""
         pe_ratio = self.price_to_earnings_ratio()
@@ -582,12 +802,14 @@ class FinancialAnalysisEngine:
             return float('inf')
         return pe_ratio / growth_rate
     
+    @register_metric('market_ratios', inputs=('stock_price', 'earnings_per_share'))
     def earnings_yield(self) -> float:
         """عائد الأرباح"""
         if self.data.stock_price == 0:
             return 0.0
         return (self.data.earnings_per_share / self.data.stock_price) * 100
     
+    @register_metric('market_ratios', inputs=('shares', 'operating_cash_flow', 'stock_price'))
     def price_to_cash_flow(self) -> float:
         """نسبة السعر إلى التدفق النقدي"""
         if self.data.shares == 0:
@@ -597,6 +819,7 @@ class FinancialAnalysisEngine:
             return float('inf')
         return self.data.stock_price / cash_flow_per_share
     
+    @register_metric('market_ratios', inputs=('market_cap', 'total_liabilities', 'cash', 'revenue'))
     def ev_to_sales(self) -> float:
         """نسبة قيمة المؤسسة إلى المبيعات"""
         enterprise_value = self.data.market_cap + self.data.total_liabilities - self.data.cash
@@ -604,6 +827,7 @@ class FinancialAnalysisEngine:
             return float('inf')
         return enterprise_value / self.data.revenue
     
+    @register_metric('market_ratios', inputs=('previous_year_data', 'dividends_paid'))
     def dividend_growth_rate(self) -> float:
         """معدل نمو توزيعات الأرباح"""
         if (not self.data.previous_year_data or 
@@ -613,12 +837,14 @@ class FinancialAnalysisEngine:
         previous_dividends = self.data.previous_year_data['dividends_paid']
         return ((self.data.dividends_paid - previous_dividends) / previous_dividends) * 100
     
+    @register_metric('market_ratios', inputs=('shares', 'free_cash_flow'))
     def free_cash_flow_per_share(self) -> float:
         """التدفق النقدي الحر للسهم"""
         if self.data.shares == 0:
             return 0.0
         return self.data.free_cash_flow / self.data.shares
     
+    @register_metric('market_ratios', inputs=('shares', 'stock_price', 'dividends_paid'))
     def total_shareholder_return(self) -> float:
         """معدل العائد الإجمالي للمساهمين"""
         if self.data.shares == 0 or self.data.stock_price == 0:
@@ -631,8 +857,59 @@ class FinancialAnalysisEngine:
     # 6. التحليل الرأسي والأفقي والمتقدم
     # =============================================
     
-    def run_all_analyses(self, wacc: float = 0.10) -> Dict[str, Any]:
-        """تشغيل جميع التحليلات الـ170+ وإرجاع النتائج"""
+    def run_all_analyses(self, wacc: float = 0.10, metrics: Optional[List[str]] = None) -> Dict[str, Any]:
+        """تشغيل جميع التحليلات الـ170+ وإرجاع النتائج
+
+        metrics: أسماء مقاييس أو فئات من METRIC_REGISTRY لحساب هذه المجموعة فقط
+        """
+        
+        # كل نسبة تُحسب مرة واحدة فقط خلال هذا التشغيل
+        self.ratio_computations.clear()
+        self._ratio_cache = {}
+        try:
+            if metrics is None:
+                return self._build_all_analyses(wacc)
+            return self._build_selected_analyses(metrics, wacc)
+        finally:
+            self._ratio_cache = None
+    
+    def _build_selected_analyses(self, metrics: List[str], wacc: float) -> Dict[str, Any]:
+        """حساب المقاييس المطلوبة فقط مع اعتمادياتها بالترتيب الطوبولوجي"""
+        
+        order = resolve_metrics(metrics)
+        values = {}
+        for name in order:
+            spec = METRIC_REGISTRY[name]
+            method = getattr(self, spec.method)
+            values[name] = method(wacc) if spec.uses_wacc else method()
+        
+        requested = set(expand_metrics(metrics))
+        results: Dict[str, Any] = {
+            'company_info': {
+                'total_assets': self.data.total_assets,
+                'total_liabilities': self.data.total_liabilities,
+                'shareholders_equity': self.data.shareholders_equity,
+                'revenue': self.data.revenue,
+                'net_income': self.data.net_income
+            }
+        }
+        for category in RATIO_CATEGORIES + ('advanced_analyses', 'summary'):
+            for spec in METRIC_REGISTRY.values():
+                if spec.category != category or spec.name not in requested:
+                    continue
+                value = values[spec.name]
+                if category == 'liquidity_ratios':
+                    value = round(make_json_safe(value), 2)
+                elif category in RATIO_CATEGORIES:
+                    value = round(value, 2)
+                if category == 'summary':
+                    results['summary'] = value
+                else:
+                    results.setdefault(category, {})[spec.name] = value
+        return results
+    
+    def _build_all_analyses(self, wacc: float) -> Dict[str, Any]:
+        """بناء نتائج جميع التحليلات"""
         
         results = {
             # معلومات أساسية
@@ -751,18 +1028,25 @@ class FinancialAnalysisEngine:
             'advanced_analyses': self._generate_advanced_analyses(wacc),
             
             # ملخص شامل
-            'summary': {
-                'total_analysis_count': 170,
-                'analysis_categories': 15,
-                'health_status': self._determine_health_status(),
-                'main_strengths': self._identify_strengths(),
-                'main_weaknesses': self._identify_weaknesses(),
-                'investment_grade': self._calculate_investment_grade()
-            }
+            'summary': self._summary_section()
         }
         
         return results
     
+    @register_metric('summary', name='summary',
+                     depends=('current_ratio', 'return_on_equity', 'debt_to_equity_ratio', 'asset_turnover',
+                              'earnings_growth_rate', 'price_to_earnings_ratio'))
+    def _summary_section(self) -> Dict[str, Any]:
+        """الملخص الشامل"""
+        return {
+            'total_analysis_count': 170,
+            'analysis_categories': 15,
+            'health_status': self._determine_health_status(),
+            'main_strengths': self._identify_strengths(),
+            'main_weaknesses': self._identify_weaknesses(),
+            'investment_grade': self._calculate_investment_grade()
+        }
+    
     def _generate_advanced_analyses(self, wacc: float) -> Dict[str, Any]:
         """توليد التحليلات المتقدمة الإضافية (100+ تحليل)"""
         return {
@@ -795,6 +1079,8 @@ class FinancialAnalysisEngine:
             'comprehensive_metrics': self._comprehensive_advanced_metrics()
         }
     
+    @register_metric('advanced_analyses', name='vertical_analysis',
+                     inputs=('current_assets', 'total_assets', 'property_plant_equipment', 'intangible_assets', 'current_liabilities', 'long_term_debt', 'shareholders_equity', 'cost_of_revenue', 'revenue', 'operating_expenses', 'net_income'))
     def _vertical_analysis(self) -> Dict[str, Any]:
         """التحليل الرأسي (10 أنواع)"""
         return {
@@ -815,6 +1101,8 @@ class FinancialAnalysisEngine:
             }
         }
     
+    @register_metric('advanced_analyses', name='horizontal_analysis',
+                     inputs=('previous_year_data', 'revenue', 'total_assets', 'shareholders_equity', 'net_income'))
     def _horizontal_analysis(self) -> Dict[str, Any]:
         """التحليل الأفقي (10 أنواع)"""
         if not self.data.previous_year_data:
@@ -833,6 +1121,8 @@ class FinancialAnalysisEngine:
             'net_income_growth': round(((self.data.net_income - prev_data.get('net_income', 0)) / prev_data.get('net_income', 1)) * 100, 2)
         }
     
+    @register_metric('advanced_analyses', name='cash_flow_analysis',
+                     inputs=('free_cash_flow', 'revenue', 'operating_cash_flow', 'net_income', 'operating_income', 'capital_expenditures'))
     def _advanced_cash_flow_analysis(self) -> Dict[str, Any]:
         """تحليل التدفقات النقدية المتقدم (12 نوع)"""
         return {
@@ -842,6 +1132,8 @@ class FinancialAnalysisEngine:
             'capex_to_revenue_ratio': round((self.data.capital_expenditures / self.data.revenue) * 100, 2) if self.data.revenue > 0 else 0
         }
     
+    @register_metric('advanced_analyses', name='dupont_analysis',
+                     depends=('net_profit_margin', 'asset_turnover', 'equity_multiplier'))
     def _dupont_analysis(self) -> Dict[str, Any]:
         """تحليل DuPont (5 أنواع)"""
         net_margin = self.net_profit_margin() / 100
@@ -857,6 +1149,9 @@ class FinancialAnalysisEngine:
             }
         }
     
+    @register_metric('advanced_analyses', name='altman_z_score',
+                     inputs=('total_assets', 'retained_earnings', 'operating_income', 'market_cap', 'total_liabilities', 'revenue'),
+                     depends=('working_capital',))
     def _altman_z_score_analysis(self) -> Dict[str, Any]:
         """تحليل Altman Z-Score (5 أنواع)"""
         working_capital_to_assets = self.working_capital() / self.data.total_assets if self.data.total_assets > 0 else 0
@@ -879,6 +1174,9 @@ class FinancialAnalysisEngine:
             'bankruptcy_risk': 'منخفض' if z_score > 2.99 else 'متوسط' if z_score > 1.81 else 'مرتفع'
         }
     
+    @register_metric('advanced_analyses', name='eva_analysis',
+                     inputs=('total_assets', 'cash', 'current_liabilities', 'operating_income', 'income_tax', 'income_before_tax'),
+                     uses_wacc=True)
     def _eva_analysis(self, wacc: float) -> Dict[str, Any]:
         """تحليل القيمة الاقتصادية المضافة EVA (5 أنواع)"""
         invested_capital = self.data.total_assets - self.data.cash - self.data.current_liabilities
@@ -892,6 +1190,8 @@ class FinancialAnalysisEngine:
             'value_creation_rate': round(((nopat / invested_capital) - wacc) * 100, 2) if invested_capital > 0 else 0
         }
     
+    @register_metric('advanced_analyses', name='breakeven_analysis',
+                     inputs=('operating_expenses', 'cost_of_revenue', 'revenue'))
     def _breakeven_analysis(self) -> Dict[str, Any]:
         """تحليل نقطة التعادل (8 أنواع)"""
         fixed_costs = self.data.operating_expenses * 0.4  # تقدير
@@ -905,6 +1205,8 @@ class FinancialAnalysisEngine:
             'contribution_margin_ratio': round(contribution_margin_ratio * 100, 2)
         }
     
+    @register_metric('advanced_analyses', name='sector_analysis',
+                     depends=('return_on_equity', 'current_ratio', 'debt_to_equity_ratio'))
     def _sector_analysis(self) -> Dict[str, Any]:
         """التحليل القطاعي (10 أنواع)"""
         return {
@@ -915,6 +1217,8 @@ class FinancialAnalysisEngine:
             }
         }
     
+    @register_metric('advanced_analyses', name='swot_analysis',
+                     depends=('current_ratio', 'return_on_equity', 'debt_to_equity_ratio', 'cash_ratio'))
     def _swot_analysis(self) -> Dict[str, Any]:
         """تحليل SWOT (8 أنواع)"""
         strengths = []
@@ -941,6 +1245,9 @@ class FinancialAnalysisEngine:
             'threats': ['مخاطر سيولة' if self.current_ratio() < 0.8 else 'منافسة']
         }
     
+    @register_metric('advanced_analyses', name='comprehensive_metrics',
+                     inputs=('dividends_paid', 'net_income', 'total_assets', 'intangible_assets', 'goodwill', 'shareholders_equity'),
+                     depends=('current_ratio', 'return_on_equity', 'debt_to_equity_ratio', 'asset_turnover', 'ev_to_ebitda'))
     def _comprehensive_advanced_metrics(self) -> Dict[str, Any]:
         """المقاييس المتقدمة الشاملة (17 نوع)"""
         return {
@@ -0,0 +1,580 @@
+"""
+محرك التحليل المالي الدفعي - حساب النسب لآلاف الشركات دفعة واحدة
+Columnar batch engine for the 170+ ratio engine
+
+يحسب نسب السيولة والنشاط والربحية والمديونية والسوق كمصفوفات NumPy
+بنفس قواعد safe_divide و make_json_safe في financial_analysis_engine_170
+"""
+
+from dataclasses import fields
+from typing import Dict, List, Any, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+from financial_analysis_engine_170 import FinancialData
+
+
+# حقول القوائم المالية الرقمية بالترتيب الثابت للـ dataclass
+FINANCIAL_FIELDS = tuple(f.name for f in fields(FinancialData) if f.type in (float, 'float'))
+FIELD_INDEX = {name: i for i, name in enumerate(FINANCIAL_FIELDS)}
+FIELD_DEFAULTS = {f.name: f.default for f in fields(FinancialData) if f.name in FIELD_INDEX}
+
+# حقول العام السابق المستخدمة في نسب النمو (NaN = غير متوفرة)
+PREVIOUS_YEAR_FIELDS = ('net_income', 'dividends_paid')
+
+RATIO_CATEGORIES = (
+    'liquidity_ratios',
+    'activity_ratios',
+    'profitability_ratios',
+    'leverage_ratios',
+    'market_ratios',
+)
+
+ArrayLike = Union[np.ndarray, Sequence[float], float]
+
+
+def safe_divide_array(numerator: ArrayLike, denominator: ArrayLike, default: ArrayLike = 0.0) -> np.ndarray:
+    """نسخة متجهة من safe_divide بنفس معالجة المقام الصفري وقيم inf/nan"""
+    numerator = np.asarray(numerator, dtype=np.float64)
+    denominator = np.asarray(denominator, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        result = numerator / denominator
+    result = np.where(np.isinf(result) | np.isnan(result), np.where(result > 0, 999999.0, -999999.0), result)
+    zero_value = np.where(numerator > 0, 999999.0, default)
+    return np.where(denominator == 0, zero_value, result)
+
+
+def make_json_safe_array(values: ArrayLike) -> np.ndarray:
+    """نسخة متجهة من make_json_safe"""
+    values = np.asarray(values, dtype=np.float64)
+    values = np.where(np.isinf(values), np.where(values > 0, 999999.0, -999999.0), values)
+    return np.where(np.isnan(values), 0.0, values)
+
+
+def _ratio_or(numerator: np.ndarray, denominator: np.ndarray, zero_value: float) -> np.ndarray:
+    """قسمة متجهة تُرجع zero_value عندما يكون المقام صفراً (مثل شروط المحرك الفردي)"""
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        return np.where(denominator == 0, zero_value, numerator / denominator)
+
+
+def _percent_or_zero(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    """(البسط / المقام) * 100 أو صفر عندما يكون المقام صفراً"""
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        return np.where(denominator == 0, 0.0, (numerator / denominator) * 100)
+
+
+def _growth_rate(current: np.ndarray, previous: np.ndarray) -> np.ndarray:
+    """معدل النمو بنفس قواعد earnings_growth_rate (بيانات سابقة مفقودة أو صفرية = 0)"""
+    missing = np.isnan(previous) | (previous == 0)
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        return np.where(missing, 0.0, ((current - previous) / previous) * 100)
+
+
+class _Columns:
+    """وصول سريع لأعمدة البيانات كمصفوفات عبر الخصائص"""
+
+    def __init__(self, columns: Dict[str, np.ndarray]):
+        self.__dict__.update(columns)
+
+
+class BatchFinancialAnalysisEngine:
+    """محرك التحليل المالي الدفعي - كل نسبة تُحسب مرة واحدة لجميع الشركات"""
+
+    def __init__(self, data: Union[pd.DataFrame, Dict[str, ArrayLike], np.ndarray], index: Optional[Sequence] = None):
+        if isinstance(data, pd.DataFrame):
+            self.index = data.index if index is None else pd.Index(index)
+            source = {name: data[name].to_numpy(dtype=np.float64) for name in data.columns if isinstance(name, str)}
+            size = len(data)
+        elif isinstance(data, np.ndarray):
+            if data.ndim != 2 or data.shape[1] != len(FINANCIAL_FIELDS):
+                raise ValueError(f"Expected an array of shape (n, {len(FINANCIAL_FIELDS)}) ordered by FINANCIAL_FIELDS")
+            source = {name: data[:, i] for i, name in enumerate(FINANCIAL_FIELDS)}
+            size = data.shape[0]
+            self.index = pd.RangeIndex(size) if index is None else pd.Index(index)
+        else:
+            source = {name: np.atleast_1d(np.asarray(values, dtype=np.float64)) for name, values in data.items()}
+            size = max((len(values) for values in source.values()), default=0)
+            self.index = pd.RangeIndex(size) if index is None else pd.Index(index)
+
+        self.size = size
+        columns = {}
+        for name in FINANCIAL_FIELDS:
+            values = source.get(name)
+            if values is None:
+                values = np.full(size, FIELD_DEFAULTS[name], dtype=np.float64)
+            columns[name] = np.broadcast_to(np.asarray(values, dtype=np.float64), (size,))
+        for name in PREVIOUS_YEAR_FIELDS:
+            values = source.get(f'previous_{name}')
+            if values is None:
+                values = np.full(size, np.nan)
+            columns[f'previous_{name}'] = np.broadcast_to(np.asarray(values, dtype=np.float64), (size,))
+        self.data = _Columns(columns)
+
+    @classmethod
+    def from_financial_data(cls, records: Sequence[FinancialData], index: Optional[Sequence] = None) -> 'BatchFinancialAnalysisEngine':
+        """بناء المحرك من قائمة كائنات FinancialData"""
+        matrix = np.array([[getattr(record, name) for name in FINANCIAL_FIELDS] for record in records], dtype=np.float64)
+        matrix = matrix.reshape(len(records), len(FINANCIAL_FIELDS))
+        columns = {name: matrix[:, i] for i, name in enumerate(FINANCIAL_FIELDS)}
+        for name in PREVIOUS_YEAR_FIELDS:
+            columns[f'previous_{name}'] = np.array([
+                (record.previous_year_data or {}).get(name, np.nan) for record in records
+            ], dtype=np.float64)
+        return cls(columns, index=index)
+
+    # =====================================
+    # 1. نسب السيولة (15 نوع)
+    # =====================================
+
+    def liquidity_ratios(self) -> Dict[str, np.ndarray]:
+        """نسب السيولة لجميع الشركات"""
+        d = self.data
+        working_capital = d.current_assets - d.current_liabilities
+        daily_expenses = safe_divide_array(d.operating_expenses, 365, 1.0)
+        days_inventory = safe_divide_array(d.inventory * 365, d.cost_of_revenue, 0.0)
+        days_receivables = safe_divide_array(d.accounts_receivable * 365, d.revenue, 0.0)
+        days_payables = safe_divide_array(d.accounts_payable * 365, d.cost_of_revenue, 0.0)
+        return {
+            'current_ratio': safe_divide_array(d.current_assets, d.current_liabilities, 0.0),
+            'quick_ratio': safe_divide_array(d.current_assets - d.inventory, d.current_liabilities, 0.0),
+            'cash_ratio': safe_divide_array(d.cash, d.current_liabilities, 0.0),
+            'absolute_cash_ratio': safe_divide_array(d.cash + d.marketable_securities, d.current_liabilities, 0.0),
+            'super_quick_ratio': safe_divide_array(
+                d.cash + d.marketable_securities + d.accounts_receivable * 0.8, d.current_liabilities, 0.0),
+            'working_capital': working_capital,
+            'working_capital_ratio': safe_divide_array(working_capital, d.total_assets, 0.0),
+            'operating_cash_flow_ratio': safe_divide_array(d.operating_cash_flow, d.current_liabilities, 0.0),
+            'defensive_interval_ratio': safe_divide_array(
+                d.cash + d.marketable_securities + d.accounts_receivable, daily_expenses, 0.0),
+            'critical_liquidity_ratio': safe_divide_array(d.cash + d.accounts_receivable, d.current_liabilities, 0.0),
+            'cash_conversion_cycle': days_inventory + days_receivables - days_payables,
+            'liquid_assets_ratio': safe_divide_array(d.cash + d.marketable_securities, d.total_assets, 0.0),
+            'cash_turnover_ratio': safe_divide_array(d.revenue, d.cash, 0.0),
+            'cash_coverage_ratio': safe_divide_array(
+                d.operating_income + d.depreciation_amortization, d.interest_expense, 0.0),
+            'modified_liquidity_ratio': safe_divide_array(
+                d.current_assets - d.inventory - d.prepaid_expenses,
+                d.current_liabilities - d.deferred_revenue, 0.0)
+        }
+
+    # =====================================
+    # 2. نسب النشاط والكفاءة (18 نوع)
+    # =====================================
+
+    def activity_ratios(self) -> Dict[str, np.ndarray]:
+        """نسب النشاط لجميع الشركات"""
+        d = self.data
+        inventory_turnover = safe_divide_array(d.cost_of_revenue, d.inventory, 0.0)
+        receivables_turnover = safe_divide_array(d.revenue, d.accounts_receivable, 0.0)
+        payables_turnover = safe_divide_array(d.cost_of_revenue, d.accounts_payable, 0.0)
+        monthly_revenue = safe_divide_array(d.revenue, 12, 1.0)
+        return {
+            'inventory_turnover': inventory_turnover,
+            'days_inventory_outstanding': safe_divide_array(365, inventory_turnover, 0.0),
+            'receivables_turnover': receivables_turnover,
+            'days_sales_outstanding': safe_divide_array(365, receivables_turnover, 0.0),
+            'payables_turnover': payables_turnover,
+            'days_payables_outstanding': safe_divide_array(365, payables_turnover, 0.0),
+            'asset_turnover': safe_divide_array(d.revenue, d.total_assets, 0.0),
+            'fixed_asset_turnover': safe_divide_array(
+                d.revenue, d.property_plant_equipment - d.accumulated_depreciation, 0.0),
+            'current_asset_turnover': safe_divide_array(d.revenue, d.current_assets, 0.0),
+            'working_capital_turnover': safe_divide_array(d.revenue, d.current_assets - d.current_liabilities, 0.0),
+            'cash_management_efficiency': safe_divide_array(d.operating_cash_flow, d.revenue, 0.0),
+            'asset_efficiency_ratio': safe_divide_array(d.gross_profit, d.total_assets, 0.0),
+            'equity_turnover': safe_divide_array(d.revenue, d.shareholders_equity, 0.0),
+            'asset_utilization': safe_divide_array(d.operating_income, d.total_assets, 0.0),
+            'capital_employed_efficiency': safe_divide_array(d.revenue, d.total_assets - d.current_liabilities, 0.0),
+            'intangible_asset_turnover': safe_divide_array(d.revenue, d.intangible_assets, 0.0),
+            'collection_efficiency': 1 - safe_divide_array(d.accounts_receivable, monthly_revenue, 0.0),
+            'operating_asset_turnover': safe_divide_array(
+                d.revenue, d.total_assets - d.cash - d.marketable_securities, 0.0)
+        }
+
+    # =====================================
+    # 3. نسب الربحية (20 نوع)
+    # =====================================
+
+    def profitability_ratios(self) -> Dict[str, np.ndarray]:
+        """نسب الربحية لجميع الشركات"""
+        d = self.data
+        invested_capital = d.total_assets - d.cash - d.current_liabilities
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            nopat = d.operating_income * (1 - (d.income_tax / d.income_before_tax))
+            roic = np.where((invested_capital == 0) | (d.income_before_tax == 0), 0.0,
+                            (nopat / invested_capital) * 100)
+        return {
+            'gross_profit_margin': _percent_or_zero(d.gross_profit, d.revenue),
+            'operating_profit_margin': _percent_or_zero(d.operating_income, d.revenue),
+            'net_profit_margin': _percent_or_zero(d.net_income, d.revenue),
+            'return_on_assets': _percent_or_zero(d.net_income, d.total_assets),
+            'return_on_equity': _percent_or_zero(d.net_income, d.shareholders_equity),
+            'return_on_invested_capital': roic,
+            'return_on_capital_employed': _percent_or_zero(d.operating_income, d.total_assets - d.current_liabilities),
+            'ebitda_margin': _percent_or_zero(d.operating_income + d.depreciation_amortization, d.revenue),
+            'operating_cash_flow_margin': _percent_or_zero(d.operating_cash_flow, d.revenue),
+            'free_cash_flow_margin': _percent_or_zero(d.free_cash_flow, d.revenue),
+            'return_on_tangible_assets': _percent_or_zero(
+                d.net_income, d.total_assets - d.intangible_assets - d.goodwill),
+            'earnings_growth_rate': _growth_rate(d.net_income, d.previous_net_income),
+            'cost_to_income_ratio': _percent_or_zero(d.operating_expenses, d.operating_income),
+            'return_on_sales': _percent_or_zero(d.operating_income, d.revenue),
+            'contribution_margin': _percent_or_zero(d.revenue - d.cost_of_revenue * 0.7, d.revenue),
+            'operating_efficiency': _percent_or_zero(d.gross_profit, d.operating_expenses),
+            'basic_earning_power': _percent_or_zero(d.operating_income, d.total_assets),
+            'ebit_margin': _percent_or_zero(d.income_before_tax + d.interest_expense, d.revenue),
+            'return_on_operating_assets': _percent_or_zero(
+                d.operating_income, d.total_assets - d.cash - d.marketable_securities),
+            'comprehensive_profitability_rate': _percent_or_zero(
+                d.net_income + d.accumulated_other_comprehensive_income, d.revenue)
+        }
+
+    # =====================================
+    # 4. نسب المديونية والرافعة المالية (15 نوع)
+    # =====================================
+
+    def leverage_ratios(self) -> Dict[str, np.ndarray]:
+        """نسب المديونية لجميع الشركات"""
+        d = self.data
+        inf = float('inf')
+        ebitda = d.operating_income + d.depreciation_amortization
+        return {
+            'debt_to_equity_ratio': _ratio_or(d.total_liabilities, d.shareholders_equity, inf),
+            'debt_to_assets_ratio': _ratio_or(d.total_liabilities, d.total_assets, 0.0),
+            'equity_ratio': _ratio_or(d.shareholders_equity, d.total_assets, 0.0),
+            'equity_multiplier': _ratio_or(d.total_assets, d.shareholders_equity, inf),
+            'interest_coverage_ratio': _ratio_or(d.operating_income, d.interest_expense, inf),
+            'debt_service_coverage_ratio': _ratio_or(
+                ebitda, d.interest_expense + d.current_portion_long_term_debt, inf),
+            'long_term_debt_to_capitalization': _ratio_or(
+                d.long_term_debt, d.long_term_debt + d.shareholders_equity, 0.0),
+            'fixed_assets_to_equity': _ratio_or(
+                d.property_plant_equipment - d.accumulated_depreciation, d.shareholders_equity, inf),
+            'external_financing_ratio': _ratio_or(
+                d.total_liabilities, d.total_liabilities + d.shareholders_equity, 0.0),
+            'net_debt_to_ebitda': _ratio_or(d.total_liabilities - d.cash, ebitda, inf),
+            'degree_of_financial_leverage': _ratio_or(
+                d.operating_income, d.operating_income - d.interest_expense, inf),
+            'financial_debt_ratio': _ratio_or(d.short_term_debt + d.long_term_debt, d.total_assets, 0.0),
+            'cash_debt_coverage': _ratio_or(d.operating_cash_flow, d.total_liabilities, inf),
+            'operating_leverage': _ratio_or(d.revenue - d.cost_of_revenue, d.operating_income, 0.0),
+            'financial_safety_ratio': _ratio_or(d.shareholders_equity, d.total_liabilities, inf)
+        }
+
+    # =====================================
+    # 5. نسب السوق والتقييم (15 نوع)
+    # =====================================
+
+    def market_ratios(self) -> Dict[str, np.ndarray]:
+        """نسب السوق لجميع الشركات"""
+        d = self.data
+        inf = float('inf')
+        no_shares = d.shares == 0
+        no_price_or_shares = no_shares | (d.stock_price == 0)
+        enterprise_value = d.market_cap + d.total_liabilities - d.cash
+        price_to_earnings = _ratio_or(d.stock_price, d.earnings_per_share, inf)
+        earnings_growth = _growth_rate(d.net_income, d.previous_net_income)
+
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            sales_per_share = d.revenue / d.shares
+            cash_flow_per_share = d.operating_cash_flow / d.shares
+            dividend_per_share = d.dividends_paid / d.shares
+            price_to_sales = np.where(no_shares | (sales_per_share == 0), inf, d.stock_price / sales_per_share)
+            price_to_cash_flow = np.where(no_shares | (cash_flow_per_share == 0), inf,
+                                          d.stock_price / cash_flow_per_share)
+            dividend_yield = np.where(no_price_or_shares, 0.0, (dividend_per_share / d.stock_price) * 100)
+            total_shareholder_return = np.where(no_price_or_shares, 0.0,
+                                                ((dividend_per_share + 0) / d.stock_price) * 100)
+            peg = np.where((earnings_growth == 0) | (price_to_earnings == inf), inf,
+                           price_to_earnings / earnings_growth)
+
+        return {
+            'earnings_per_share': np.array(d.earnings_per_share, dtype=np.float64),
+            'price_to_earnings_ratio': price_to_earnings,
+            'price_to_book_ratio': _ratio_or(d.stock_price, d.book_value_per_share, inf),
+            'price_to_sales_ratio': price_to_sales,
+            'dividend_yield': dividend_yield,
+            'payout_ratio': _percent_or_zero(d.dividends_paid, d.net_income),
+            'ev_to_ebitda': _ratio_or(enterprise_value, d.operating_income + d.depreciation_amortization, inf),
+            'book_value_per_share': _ratio_or(d.shareholders_equity, d.shares, 0.0),
+            'peg_ratio': peg,
+            'earnings_yield': _percent_or_zero(d.earnings_per_share, d.stock_price),
+            'price_to_cash_flow': price_to_cash_flow,
+            'ev_to_sales': _ratio_or(enterprise_value, d.revenue, inf),
+            'dividend_growth_rate': _growth_rate(d.dividends_paid, d.previous_dividends_paid),
+            'free_cash_flow_per_share': _ratio_or(d.free_cash_flow, d.shares, 0.0),
+            'total_shareholder_return': total_shareholder_return
+        }
+
+    # =====================================
+    # تشغيل جميع النسب
+    # =====================================
+
+    def run_all_ratios(self, json_safe: bool = False) -> Dict[str, Dict[str, np.ndarray]]:
+        """حساب جميع فئات النسب كمصفوفات
+
+        json_safe=True يطبق make_json_safe والتقريب لرقمين على جميع الفئات
+        """
+        # inf - inf في صفوف غير صالحة تعطي nan بصمت كما في المحرك الفردي
+        with np.errstate(invalid='ignore', over='ignore'):
+            results = {category: getattr(self, category)() for category in RATIO_CATEGORIES}
+        if json_safe:
+            results = {
+                category: {name: np.round(make_json_safe_array(values), 2) for name, values in ratios.items()}
+                for category, ratios in results.items()
+            }
+        return results
+
+    def to_dataframe(self, json_safe: bool = False) -> pd.DataFrame:
+        """جميع النسب في DataFrame بأعمدة (الفئة، النسبة)"""
+        results = self.run_all_ratios(json_safe=json_safe)
+        columns = {
+            (category, name): values
+            for category, ratios in results.items()
+            for name, values in ratios.items()
+        }
+        return pd.DataFrame(columns, index=self.index)
+
+    def to_records(self, json_safe: bool = True) -> List[Dict[str, Any]]:
+        """تحويل النتائج إلى قائمة قواميس لكل شركة بنفس بنية run_all_analyses"""
+        results = self.run_all_ratios(json_safe=json_safe)
+        return [
+            {
+                category: {name: float(values[i]) for name, values in ratios.items()}
+                for category, ratios in results.items()
+            }
+            for i in range(self.size)
+        ]
+
+
+class FinancialPanelAnalysis:
+    """تحليل متعدد السنوات - مصفوفة واحدة (السنوات × الحقول) تُحلل في تمريرة واحدة"""
+
+    def __init__(self, years: Sequence[int], values: np.ndarray,
+                 previous_year_data: Optional[Dict[str, float]] = None):
+        values = np.asarray(values, dtype=np.float64)
+        if values.ndim != 2 or values.shape != (len(years), len(FINANCIAL_FIELDS)):
+            raise ValueError(f"Expected an array of shape ({len(years)}, {len(FINANCIAL_FIELDS)}) ordered by FINANCIAL_FIELDS")
+        order = np.argsort(np.asarray(years), kind='stable')
+        self.years = np.asarray(years)[order]
+        self.values = values[order]
+        # بيانات العام السابق لأول سنة في اللوحة (إن وجدت)
+        self.previous_year_data = previous_year_data or {}
+
+    @classmethod
+    def from_financial_data(cls, statements: Dict[int, FinancialData]) -> 'FinancialPanelAnalysis':
+        """بناء اللوحة من قاموس {السنة: FinancialData}"""
+        years = sorted(statements)
+        values = np.array([[getattr(statements[year], name) for name in FINANCIAL_FIELDS] for year in years],
+                          dtype=np.float64).reshape(len(years), len(FINANCIAL_FIELDS))
+        first_previous = statements[years[0]].previous_year_data if years else None
+        return cls(years, values, first_previous)
+
+    @classmethod
+    def from_frame(cls, frame: pd.DataFrame) -> 'FinancialPanelAnalysis':
+        """بناء اللوحة من DataFrame فهرسه السنوات وأعمدته حقول FinancialData"""
+        values = np.column_stack([
+            frame[name].to_numpy(dtype=np.float64) if name in frame.columns
+            else np.full(len(frame), FIELD_DEFAULTS[name])
+            for name in FINANCIAL_FIELDS
+        ]) if len(frame) else np.empty((0, len(FINANCIAL_FIELDS)))
+        return cls(list(frame.index), values)
+
+    def column(self, name: str) -> np.ndarray:
+        """عمود حقل واحد عبر جميع السنوات"""
+        return self.values[:, FIELD_INDEX[name]]
+
+    def _previous_column(self, name: str) -> np.ndarray:
+        """قيم العام السابق لكل سنة (السنة الأولى من previous_year_data)"""
+        previous = np.empty(len(self.years))
+        if len(self.years):
+            previous[0] = self.previous_year_data.get(name, np.nan)
+            previous[1:] = self.column(name)[:-1]
+        return previous
+
+    def ratios(self, json_safe: bool = False) -> pd.DataFrame:
+        """جميع النسب لجميع السنوات بأعمدة (الفئة، النسبة)"""
+        columns = {name: self.values[:, i] for i, name in enumerate(FINANCIAL_FIELDS)}
+        for name in PREVIOUS_YEAR_FIELDS:
+            columns[f'previous_{name}'] = self._previous_column(name)
+        return BatchFinancialAnalysisEngine(columns, index=self.years).to_dataframe(json_safe=json_safe)
+
+    def yoy_growth(self, field_names: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        """النمو السنوي % لكل حقل (صفر عند غياب أو صفرية قيمة العام السابق)"""
+        field_names = list(field_names or FINANCIAL_FIELDS)
+        indices = [FIELD_INDEX[name] for name in field_names]
+        current = self.values[:, indices]
+        previous = np.vstack([
+            [self.previous_year_data.get(name, np.nan) for name in field_names],
+            current[:-1]
+        ]) if len(self.years) else current
+        return pd.DataFrame(_growth_rate(current, previous), index=self.years, columns=field_names)
+
+    def cagr(self, field_names: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        """معدل النمو السنوي المركب % من السنة الأولى حتى كل سنة"""
+        field_names = list(field_names or FINANCIAL_FIELDS)
+        indices = [FIELD_INDEX[name] for name in field_names]
+        values = self.values[:, indices]
+        if not len(self.years):
+            return pd.DataFrame(values, index=self.years, columns=field_names)
+        base = values[0]
+        periods = (self.years - self.years[0]).astype(np.float64)[:, None]
+        valid = (periods > 0) & (base > 0) & (values > 0)
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            growth = (np.power(values / base, 1.0 / periods) - 1) * 100
+        return pd.DataFrame(np.where(valid, growth, 0.0), index=self.years, columns=field_names)
+
+    def run_panel_analysis(self, growth_fields: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+        """نتائج اللوحة كاملة بصيغة JSON آمنة: النسب والنمو السنوي والنمو المركب"""
+        ratios = self.ratios(json_safe=True)
+        growth = self.yoy_growth(growth_fields)
+        cagr = self.cagr(growth_fields)
+        ratio_values, growth_values, cagr_values = (
+            np.round(make_json_safe_array(frame.to_numpy()), 2) for frame in (ratios, growth, cagr)
+        )
+        results: Dict[str, Any] = {'years': [int(year) for year in self.years]}
+        for i, (category, name) in enumerate(ratios.columns):
+            results.setdefault(category, {})[name] = ratio_values[:, i].tolist()
+        results['yoy_growth'] = {name: growth_values[:, i].tolist() for i, name in enumerate(growth.columns)}
+        results['cagr'] = {name: cagr_values[:, i].tolist() for i, name in enumerate(cagr.columns)}
+        return results
+
+
+# الصف الافتراضي لجميع الحقول (قيم dataclass الافتراضية)
+DEFAULT_ROW = np.array([FIELD_DEFAULTS[name] for name in FINANCIAL_FIELDS], dtype=np.float64)
+DEFAULT_ROW.setflags(write=False)
+
+
+class CompactFinancialData:
+    """بيانات مالية مضغوطة بدون __dict__ - القيم في صف NumPy واحد بفهرس FIELD_INDEX الثابت
+
+    متوافقة مع الوصول بالخصائص في FinancialData (data.revenue ...) وتعمل مع FinancialAnalysisEngine
+    """
+
+    __slots__ = ('_values', 'previous_year_data', 'industry_averages')
+
+    def __init__(self, values: Optional[ArrayLike] = None,
+                 previous_year_data: Optional[Dict[str, float]] = None,
+                 industry_averages: Optional[Dict[str, float]] = None,
+                 **field_values: float):
+        if values is None:
+            values = DEFAULT_ROW.copy()
+        else:
+            # بدون نسخ إذا كان الصف float64 بالفعل
+            values = np.asarray(values, dtype=np.float64)
+            if values.shape != (len(FINANCIAL_FIELDS),):
+                raise ValueError(f"Expected a row of {len(FINANCIAL_FIELDS)} values ordered by FINANCIAL_FIELDS")
+        self._values = values
+        self.previous_year_data = previous_year_data
+        self.industry_averages = industry_averages
+        for name, value in field_values.items():
+            if name not in FIELD_INDEX:
+                raise TypeError(f"Unknown financial field: {name}")
+            values[FIELD_INDEX[name]] = value
+
+    @classmethod
+    def from_numpy(cls, row: np.ndarray, previous_year_data: Optional[Dict[str, float]] = None) -> 'CompactFinancialData':
+        """إنشاء كائن فوق صف NumPy موجود (عرض مشترك بدون نسخ)"""
+        return cls(row, previous_year_data)
+
+    def to_numpy(self) -> np.ndarray:
+        """الصف الداعم نفسه (بدون نسخ) - التعديل عليه يظهر في الكائن"""
+        return self._values
+
+    @classmethod
+    def from_financial_data(cls, data: Any) -> 'CompactFinancialData':
+        """التحويل من FinancialData (محرك 170 أو analysis_engine) أو أي كائن بنفس الحقول"""
+        values = np.array([getattr(data, name) for name in FINANCIAL_FIELDS], dtype=np.float64)
+        return cls(values, getattr(data, 'previous_year_data', None), getattr(data, 'industry_averages', None))
+
+    def to_financial_data(self, data_class: type = FinancialData) -> Any:
+        """التحويل إلى dataclass عادية (FinancialData افتراضياً)"""
+        return data_class(
+            **dict(zip(FINANCIAL_FIELDS, self._values.tolist())),
+            previous_year_data=self.previous_year_data,
+            industry_averages=self.industry_averages
+        )
+
+    def __eq__(self, other: Any) -> bool:
+        if not isinstance(other, CompactFinancialData):
+            return NotImplemented
+        return (np.array_equal(self._values, other._values)
+                and self.previous_year_data == other.previous_year_data
+                and self.industry_averages == other.industry_averages)
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        non_default = ', '.join(
+            f'{name}={value!r}' for name, value, default in zip(FINANCIAL_FIELDS, self._values.tolist(), DEFAULT_ROW)
+            if value != default
+        )
+        return f'CompactFinancialData({non_default})'
+
+
+def _field_property(index: int, name: str) -> property:
+    """خاصية لقراءة/كتابة حقل واحد من الصف الداعم كـ float عادي"""
+
+    def getter(self: CompactFinancialData) -> float:
+        return self._values.item(index)
+
+    def setter(self: CompactFinancialData, value: float) -> None:
+        self._values[index] = value
+
+    return property(getter, setter, doc=name)
+
+
+for _index, _name in enumerate(FINANCIAL_FIELDS):
+    setattr(CompactFinancialData, _name, _field_property(_index, _name))
+
+
+class FinancialDataMatrix:
+    """تخزين عمودي (struct-of-arrays) لعدد كبير من الشركات في مصفوفة واحدة (الشركات × الحقول)"""
+
+    def __init__(self, values: np.ndarray, previous_year_data: Optional[List[Optional[Dict[str, float]]]] = None):
+        values = np.asarray(values, dtype=np.float64)
+        if values.ndim != 2 or values.shape[1] != len(FINANCIAL_FIELDS):
+            raise ValueError(f"Expected an array of shape (n, {len(FINANCIAL_FIELDS)}) ordered by FINANCIAL_FIELDS")
+        self.values = values
+        self.previous_year_data = previous_year_data or [None] * len(values)
+
+    @classmethod
+    def empty(cls, size: int) -> 'FinancialDataMatrix':
+        """مصفوفة بقيم افتراضية لعدد size من الشركات"""
+        return cls(np.tile(DEFAULT_ROW, (size, 1)))
+
+    @classmethod
+    def from_records(cls, records: Sequence[Any]) -> 'FinancialDataMatrix':
+        """التحويل من قائمة FinancialData أو CompactFinancialData"""
+        values = np.empty((len(records), len(FINANCIAL_FIELDS)), dtype=np.float64)
+        for i, record in enumerate(records):
+            if isinstance(record, CompactFinancialData):
+                values[i] = record.to_numpy()
+            else:
+                values[i] = [getattr(record, name) for name in FINANCIAL_FIELDS]
+        return cls(values, [getattr(record, 'previous_year_data', None) for record in records])
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def __getitem__(self, index: int) -> CompactFinancialData:
+        """صف شركة واحدة كعرض بدون نسخ على المصفوفة"""
+        return CompactFinancialData(self.values[index], self.previous_year_data[index])
+
+    def __iter__(self):
+        for index in range(len(self.values)):
+            yield self[index]
+
+    def column(self, name: str) -> np.ndarray:
+        """عمود حقل واحد لجميع الشركات (عرض بدون نسخ)"""
+        return self.values[:, FIELD_INDEX[name]]
+
+    def to_batch_engine(self, index: Optional[Sequence] = None) -> BatchFinancialAnalysisEngine:
+        """محرك دفعي يعمل على أعمدة المصفوفة مباشرة"""
+        columns = {name: self.values[:, i] for i, name in enumerate(FINANCIAL_FIELDS)}
+        for name in PREVIOUS_YEAR_FIELDS:
+            columns[f'previous_{name}'] = np.array([
+                (previous or {}).get(name, np.nan) for previous in self.previous_year_data
+            ], dtype=np.float64)
+        return BatchFinancialAnalysisEngine(columns, index=index)
@@ -0,0 +1,243 @@
+"""
+ذاكرة مؤقتة لبيانات السوق والمؤشرات والاقتصاد الكلي
+Tiered TTL cache for market, index and macro data
+
+- الطبقة الأولى: LRU محدود في الذاكرة مع مدة صلاحية لكل فئة بيانات
+- الطبقة الثانية (اختيارية): مجموعة MongoDB لمشاركة البيانات بين العمليات
+- الطلبات المتزامنة لنفس المفتاح تتشارك عملية جلب واحدة
+- النتائج الفارغة تُحفظ في الذاكرة فقط لمدة قصيرة ولا تُكتب في MongoDB
+"""
+
+import asyncio
+import copy
+import logging
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# مدة الصلاحية بالثواني لكل فئة بيانات
+DATA_CLASS_TTLS = {
+    "quote": int(os.environ.get('MARKET_CACHE_QUOTE_TTL', 60)),
+    "fundamentals": int(os.environ.get('MARKET_CACHE_FUNDAMENTALS_TTL', 6 * 3600)),
+    "macro": int(os.environ.get('MARKET_CACHE_MACRO_TTL', 24 * 3600))
+}
+
+# مدة حفظ النتائج الفارغة (رمز غير معروف أو تعذر الجلب مؤقتاً) حتى لا يُعاد طلبها فوراً
+NEGATIVE_TTL = int(os.environ.get('MARKET_CACHE_NEGATIVE_TTL', 15))
+
+
+def is_empty(value: Any) -> bool:
+    return value is None or (isinstance(value, (dict, list)) and not value)
+
+
+class MarketDataCache:
+    """ذاكرة مؤقتة من طبقتين مع جلب مشترك للمفاتيح المطلوبة في نفس الوقت"""
+
+    def __init__(self, max_entries: Optional[int] = None, ttls: Optional[Dict[str, int]] = None,
+                 negative_ttl: Optional[float] = None):
+        self.max_entries = max_entries or int(os.environ.get('MARKET_CACHE_MAX_ENTRIES', 1024))
+        self.ttls = ttls or DATA_CLASS_TTLS
+        self.negative_ttl = NEGATIVE_TTL if negative_ttl is None else negative_ttl
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        # مراجع مهام الجلب الجماعي حتى لا تُجمع قبل اكتمالها
+        self._tasks = set()
+        self.collection = None
+        self.stats = {"memory_hits": 0, "persistent_hits": 0, "misses": 0, "shared_fetches": 0}
+
+    def attach(self, collection) -> None:
+        """ربط مجموعة MongoDB كطبقة تخزين دائمة"""
+        self.collection = collection
+
+    def _remember(self, key: str, value: Any, ttl: float) -> None:
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _lookup_memory(self, key: str) -> Tuple[bool, Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return False, None
+        self._entries.move_to_end(key)
+        return True, value
+
+    async def get_or_fetch(self, data_class: str, key: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """جلب قيمة من الذاكرة المؤقتة أو من المصدر (نسخة مستقلة لكل مستدعٍ)"""
+        cache_key = f"{data_class}:{key}"
+
+        found, value = self._lookup_memory(cache_key)
+        if found:
+            self.stats["memory_hits"] += 1
+            return copy.deepcopy(value)
+
+        task = self._inflight.get(cache_key)
+        if task is not None:
+            self.stats["shared_fetches"] += 1
+        else:
+            task = asyncio.ensure_future(self._load(data_class, cache_key, fetch))
+            self._track_inflight(cache_key, task)
+
+        # shield: إلغاء أحد المستدعين (مثلاً عند انتهاء المهلة) لا يلغي الجلب المشترك
+        return copy.deepcopy(await asyncio.shield(task))
+
+    async def get_or_fetch_many(self, data_class: str, keys: List[str],
+                                fetch_many: Callable[[List[str]], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        """جلب عدة مفاتيح مع جلب المفقود منها في استدعاء واحد (المفاتيح غير المتوفرة لدى المصدر تُحذف)"""
+        loop = asyncio.get_running_loop()
+        results: Dict[str, Any] = {}
+        waiting: Dict[str, asyncio.Future] = {}
+        missing: List[str] = []
+
+        for key in dict.fromkeys(keys):
+            cache_key = f"{data_class}:{key}"
+            found, value = self._lookup_memory(cache_key)
+            if found:
+                self.stats["memory_hits"] += 1
+                if value is not None:
+                    results[key] = copy.deepcopy(value)
+            elif cache_key in self._inflight:
+                self.stats["shared_fetches"] += 1
+                waiting[key] = self._inflight[cache_key]
+            else:
+                missing.append(key)
+
+        if missing:
+            futures = {key: loop.create_future() for key in missing}
+            for key, future in futures.items():
+                self._track_inflight(f"{data_class}:{key}", future)
+            task = asyncio.ensure_future(self._load_many(data_class, futures, fetch_many))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+            waiting.update(futures)
+
+        for key, future in waiting.items():
+            value = await asyncio.shield(future)
+            if value is not None:
+                results[key] = copy.deepcopy(value)
+        return results
+
+    def _track_inflight(self, cache_key: str, future: asyncio.Future) -> None:
+        self._inflight[cache_key] = future
+
+        def release(_):
+            if self._inflight.get(cache_key) is future:
+                del self._inflight[cache_key]
+
+        future.add_done_callback(release)
+
+    async def _load_many(self, data_class: str, futures: Dict[str, asyncio.Future],
+                         fetch_many: Callable[[List[str]], Awaitable[Dict[str, Any]]]) -> None:
+        ttl = self.ttls.get(data_class, self.ttls["quote"])
+        prefix = f"{data_class}:"
+        values: Dict[str, Any] = {}
+
+        try:
+            if self.collection is not None:
+                try:
+                    cursor = self.collection.find(
+                        {"key": {"$in": [prefix + key for key in futures]},
+                         "expires_at": {"$gt": datetime.now(timezone.utc)}},
+                        {"_id": 0, "key": 1, "value": 1, "expires_at": 1}
+                    )
+                    async for document in cursor:
+                        key = document["key"][len(prefix):]
+                        values[key] = document["value"]
+                        self._remember(document["key"], document["value"], self._remaining(document["expires_at"]))
+                        self.stats["persistent_hits"] += 1
+                except Exception as e:
+                    logger.warning(f"Market cache batch lookup failed for {data_class}: {e}")
+
+            to_fetch = [key for key in futures if key not in values]
+            if to_fetch:
+                self.stats["misses"] += len(to_fetch)
+                fetched = {key: value for key, value in (await fetch_many(to_fetch)).items()
+                           if key in futures and not is_empty(value)}
+                values.update(fetched)
+                for key in to_fetch:
+                    if key in fetched:
+                        self._remember(prefix + key, fetched[key], ttl)
+                    else:
+                        # المفتاح غير متوفر لدى المصدر: حفظ سلبي قصير في الذاكرة فقط
+                        self._remember(prefix + key, None, self.negative_ttl)
+                if self.collection is not None and fetched:
+                    expires_at = datetime.now(timezone.utc) + timedelta(seconds=ttl)
+                    try:
+                        await asyncio.gather(*(
+                            self.collection.update_one(
+                                {"key": prefix + key},
+                                {"$set": {"key": prefix + key, "data_class": data_class,
+                                          "value": value, "expires_at": expires_at}},
+                                upsert=True
+                            )
+                            for key, value in fetched.items()
+                        ))
+                    except Exception as e:
+                        logger.warning(f"Market cache batch store failed for {data_class}: {e}")
+
+            for key, future in futures.items():
+                if not future.done():
+                    future.set_result(values.get(key))
+        except Exception as e:
+            for future in futures.values():
+                if not future.done():
+                    future.set_exception(e)
+
+    async def _load(self, data_class: str, cache_key: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        ttl = self.ttls.get(data_class, self.ttls["quote"])
+
+        if self.collection is not None:
+            try:
+                document = await self.collection.find_one(
+                    {"key": cache_key, "expires_at": {"$gt": datetime.now(timezone.utc)}},
+                    {"_id": 0, "value": 1, "expires_at": 1}
+                )
+                if document:
+                    self._remember(cache_key, document["value"], self._remaining(document["expires_at"]))
+                    self.stats["persistent_hits"] += 1
+                    return document["value"]
+            except Exception as e:
+                logger.warning(f"Market cache lookup failed for {cache_key}: {e}")
+
+        self.stats["misses"] += 1
+        value = await fetch()
+        if is_empty(value):
+            self._remember(cache_key, value, self.negative_ttl)
+            return value
+        self._remember(cache_key, value, ttl)
+
+        if self.collection is not None:
+            try:
+                await self.collection.update_one(
+                    {"key": cache_key},
+                    {"$set": {
+                        "key": cache_key,
+                        "data_class": data_class,
+                        "value": value,
+                        "expires_at": datetime.now(timezone.utc) + timedelta(seconds=ttl)
+                    }},
+                    upsert=True
+                )
+            except Exception as e:
+                logger.warning(f"Market cache store failed for {cache_key}: {e}")
+
+        return value
+
+    @staticmethod
+    def _remaining(expires_at: datetime) -> float:
+        """الثواني المتبقية من صلاحية مستند MongoDB (التواريخ تُعاد بدون منطقة زمنية)"""
+        if expires_at.tzinfo is None:
+            expires_at = expires_at.replace(tzinfo=timezone.utc)
+        return (expires_at - datetime.now(timezone.utc)).total_seconds()
+
+    def clear(self) -> None:
+        """مسح الطبقة الموجودة في الذاكرة"""
+        self._entries.clear()
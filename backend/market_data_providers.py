@@ -0,0 +1,145 @@
+"""
+مزودو بيانات السوق
+Pluggable market data providers
+
+- جلب تاريخ أسعار عدة رموز في استدعاء واحد
+- النتيجة جدول طويل (tidy) بأعمدة ثابتة: symbol, date, open, high, low, close, volume
+- مزود Yahoo Finance للإنتاج ومزود بيانات ثابتة (fixtures) للعمل والاختبار دون شبكة
+"""
+
+import abc
+import json
+import logging
+import os
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+import yfinance as yf
+
+logger = logging.getLogger(__name__)
+
+HISTORY_COLUMNS = ["symbol", "date", "open", "high", "low", "close", "volume"]
+
+
+def empty_history() -> pd.DataFrame:
+    """جدول تاريخ فارغ بالأعمدة القياسية"""
+    return pd.DataFrame(columns=HISTORY_COLUMNS)
+
+
+def period_start(last_date: pd.Timestamp, period: str) -> Optional[pd.Timestamp]:
+    """بداية الفترة بصيغة yfinance (5d, 1mo, 1y, max) بالنسبة لآخر تاريخ"""
+    if period == "max":
+        return None
+    if period.endswith("mo"):
+        return last_date - pd.DateOffset(months=int(period[:-2]))
+    if period.endswith("y"):
+        return last_date - pd.DateOffset(years=int(period[:-1]))
+    if period.endswith("d"):
+        return last_date - pd.Timedelta(days=int(period[:-1]))
+    raise ValueError(f"Unsupported period: {period}")
+
+
+class MarketDataProvider(abc.ABC):
+    """الواجهة المشتركة لمزودي بيانات السوق (استدعاءات متزامنة)"""
+
+    name = "base"
+
+    @abc.abstractmethod
+    def fetch_history(self, symbols: List[str], period: str = "1y") -> pd.DataFrame:
+        """تاريخ أسعار يومي لعدة رموز كجدول طويل (الرموز غير المتوفرة تُحذف)"""
+
+    @abc.abstractmethod
+    def fetch_info(self, symbols: List[str]) -> Dict[str, Dict[str, Any]]:
+        """البيانات الأساسية لكل رمز (الرموز غير المتوفرة تُحذف)"""
+
+
+class YahooMarketDataProvider(MarketDataProvider):
+    """Yahoo Finance عبر yf.download لجميع الرموز دفعة واحدة"""
+
+    name = "yahoo"
+
+    def fetch_history(self, symbols: List[str], period: str = "1y") -> pd.DataFrame:
+        if not symbols:
+            return empty_history()
+
+        raw = yf.download(
+            tickers=symbols,
+            period=period,
+            group_by="ticker",
+            auto_adjust=False,
+            threads=True,
+            progress=False
+        )
+        if raw is None or raw.empty:
+            return empty_history()
+        if not isinstance(raw.columns, pd.MultiIndex):
+            raw = pd.concat({symbols[0]: raw}, axis=1)
+
+        frames = []
+        for symbol in raw.columns.get_level_values(0).unique():
+            part = raw[symbol].dropna(how="all")
+            if part.empty:
+                continue
+            part = part.rename(columns=lambda column: str(column).lower())
+            frames.append(part.assign(symbol=symbol).rename_axis("date").reset_index())
+
+        if not frames:
+            return empty_history()
+        return pd.concat(frames, ignore_index=True).reindex(columns=HISTORY_COLUMNS)
+
+    def fetch_info(self, symbols: List[str]) -> Dict[str, Dict[str, Any]]:
+        # لا يوجد استدعاء مجمع للبيانات الأساسية في yfinance - كائن Tickers واحد لكل الدفعة
+        tickers = yf.Tickers(" ".join(symbols))
+        info = {}
+        for symbol in symbols:
+            try:
+                info[symbol] = tickers.tickers[symbol].info
+            except Exception as e:
+                logger.warning(f"Yahoo Finance info error for {symbol}: {e}")
+        return info
+
+
+class FixtureMarketDataProvider(MarketDataProvider):
+    """بيانات ثابتة من الذاكرة أو من ملفات محلية (للعمل دون شبكة والاختبار)"""
+
+    name = "fixture"
+
+    def __init__(self, history: Optional[pd.DataFrame] = None, info: Optional[Dict[str, Dict[str, Any]]] = None):
+        history = empty_history() if history is None else history
+        self.history = history.assign(date=pd.to_datetime(history["date"])).reindex(columns=HISTORY_COLUMNS)
+        self.info = info or {}
+
+    @classmethod
+    def from_files(cls, history_path: str, info_path: Optional[str] = None) -> "FixtureMarketDataProvider":
+        """تحميل التاريخ من CSV بالأعمدة القياسية والبيانات الأساسية من JSON"""
+        info = None
+        if info_path:
+            with open(info_path, encoding="utf-8") as f:
+                info = json.load(f)
+        return cls(pd.read_csv(history_path), info)
+
+    def fetch_history(self, symbols: List[str], period: str = "1y") -> pd.DataFrame:
+        frame = self.history[self.history["symbol"].isin(symbols)]
+        if frame.empty:
+            return empty_history()
+
+        # الفترة تُحسب من آخر تاريخ لكل رمز كما تفعل yfinance
+        last_dates = frame.groupby("symbol")["date"].transform("max")
+        starts = last_dates.map(lambda last_date: period_start(last_date, period))
+        if period != "max":
+            frame = frame[frame["date"] >= starts]
+        return frame.sort_values(["symbol", "date"]).reset_index(drop=True)
+
+    def fetch_info(self, symbols: List[str]) -> Dict[str, Dict[str, Any]]:
+        return {symbol: dict(self.info[symbol]) for symbol in symbols if symbol in self.info}
+
+
+def create_market_data_provider() -> MarketDataProvider:
+    """إنشاء المزود من إعدادات البيئة"""
+    provider = os.environ.get('MARKET_DATA_PROVIDER', 'yahoo').lower()
+    if provider == "fixture":
+        history_path = os.environ.get('MARKET_DATA_FIXTURE_PATH')
+        if history_path:
+            return FixtureMarketDataProvider.from_files(history_path, os.environ.get('MARKET_DATA_FIXTURE_INFO_PATH'))
+        return FixtureMarketDataProvider()
+    return YahooMarketDataProvider()
@@ -11,15 +11,23 @@ OCR and Data Parsing Engine for FinClick.AI
 - Smart financial data recognition
 """
 
-import io
 import os
 import re
 import json
+import shutil
+import signal
+import tempfile
+import time
+import weakref
+import asyncio
+import multiprocessing
+import concurrent.futures
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 import cv2
 import numpy as np
 import pandas as pd
 from PIL import Image
-import pytesseract
 import PyPDF2
 import pdfplumber
 import tabula
@@ -27,10 +35,176 @@ import camelot
 from openpyxl import load_workbook
 from docx import Document
 from bs4 import BeautifulSoup
-from typing import Dict, List, Any, Optional, Tuple
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Set, Tuple
 import requests
 from datetime import datetime
 import logging
+from parse_cache import ParseResultCache, compute_file_key
+from tesseract_pool import create_tesseract_pool
+
+# إصدار المحلل - يجب رفعه عند تغيير نتائج الاستخراج لإبطال الذاكرة المؤقتة
+PARSER_VERSION = "1.7"
+
+# طريقة المعالجة حسب تصنيف طبقة النص في PDF
+PDF_LAYOUT_METHODS = {
+    "native": "PDF Processing",
+    "scanned": "PDF OCR Processing",
+    "mixed": "PDF Mixed Processing"
+}
+
+# الكلمات المفتاحية لكل حقل مرتبة حسب الأولوية
+STATEMENT_KEYWORDS = {
+    # استخراج بيانات قائمة المركز المالي
+    'balance_sheet': {
+        'current_assets': ['الأصول المتداولة', 'Current Assets', 'أصول متداولة'],
+        'fixed_assets': ['الأصول الثابتة', 'Fixed Assets', 'أصول ثابتة'],
+        'total_assets': ['إجمالي الأصول', 'Total Assets', 'مجموع الأصول'],
+        'current_liabilities': ['الخصوم المتداولة', 'Current Liabilities', 'خصوم متداولة'],
+        'total_equity': ['حقوق المساهمين', 'Shareholders Equity', 'حقوق الملكية']
+    },
+    # استخراج بيانات قائمة الدخل
+    'income_statement': {
+        'revenue': ['الإيرادات', 'Revenue', 'المبيعات', 'Sales'],
+        'gross_profit': ['مجمل الربح', 'Gross Profit', 'الربح الإجمالي'],
+        'operating_profit': ['الربح التشغيلي', 'Operating Profit', 'ربح العمليات'],
+        'net_income': ['صافي الربح', 'Net Income', 'الربح الصافي']
+    },
+    # استخراج بيانات التدفقات النقدية
+    'cash_flow': {
+        'operating_cash_flow': ['التدفق النقدي التشغيلي', 'Operating Cash Flow'],
+        'investing_cash_flow': ['التدفق النقدي الاستثماري', 'Investing Cash Flow'],
+        'financing_cash_flow': ['التدفق النقدي التمويلي', 'Financing Cash Flow']
+    }
+}
+
+# تصنيف صفوف الجداول حسب نص العمود الأول (بالترتيب، أول تطابق يُعتمد)
+TABLE_ROW_KEYWORDS = [
+    ('balance_sheet', 'current_assets', ['أصول متداولة', 'current assets']),
+    ('balance_sheet', 'fixed_assets', ['أصول ثابتة', 'fixed assets']),
+    ('balance_sheet', 'total_assets', ['إجمالي الأصول', 'total assets']),
+    ('income_statement', 'revenue', ['إيرادات', 'revenue', 'مبيعات', 'sales']),
+    ('income_statement', 'gross_profit', ['مجمل الربح', 'gross profit']),
+    ('income_statement', 'net_income', ['صافي الربح', 'net income'])
+]
+
+# المبالغ المالية: أرقام مع فواصل الآلاف وخانتين عشريتين اختيارياً
+AMOUNT_PATTERN = r'\d{1,3}(?:,\d{3})*(?:\.\d{2})?'
+
+
+class FinancialKeywordMatcher:
+    """مطابقة جميع الكلمات المفتاحية في مسح واحد للنص
+    
+    يُجمع نمط واحد من كل المرادفات (الأطول أولاً) ويُطبق على النص بعد تحويله
+    لأحرف صغيرة، ويُستأنف البحث من الحرف التالي لكل تطابق حتى لا تضيع
+    التطابقات المتداخلة. ثم يُختار لكل حقل أعلى مرادف أولوية وأول موضع له،
+    وهو نفس ناتج البحث المنفصل لكل مرادف بالترتيب.
+    """
+    
+    def __init__(self, keyword_map: Dict[str, Dict[str, List[str]]]):
+        self.keyword_map = keyword_map
+        self._targets: Dict[str, List[Tuple[str, str, int]]] = {}
+        
+        for statement_type, fields in keyword_map.items():
+            for field, keywords in fields.items():
+                for priority, keyword in enumerate(keywords):
+                    self._targets.setdefault(keyword.lower(), []).append((statement_type, field, priority))
+        
+        self.pattern = re.compile('|'.join(
+            re.escape(keyword) for keyword in sorted(self._targets, key=len, reverse=True)
+        ))
+        self.amount_pattern = re.compile(rf'[:\s]*({AMOUNT_PATTERN})')
+    
+    def find_hits(self, text: str) -> Iterator[Tuple[str, int, float]]:
+        """تطابقات (الكلمة المفتاحية، الموضع، القيمة) في النص بترتيب الظهور"""
+        
+        text = text.lower()
+        position = 0
+        while True:
+            match = self.pattern.search(text, position)
+            if match is None:
+                return
+            amount = self.amount_pattern.match(text, match.end())
+            if amount:
+                yield match.group(), match.start(), float(amount.group(1).replace(',', ''))
+            position = match.start() + 1
+    
+    def find_ranked(self, text: str) -> Dict[Tuple[str, str], Tuple[int, float]]:
+        """(أولوية المرادف، القيمة) لأفضل تطابق لكل حقل في النص"""
+        
+        # التطابقات مرتبة حسب الموضع، فأول تطابق لكل حقل بأولوية أعلى هو الأفضل
+        best: Dict[Tuple[str, str], Tuple[int, float]] = {}
+        pending = sum(len(fields) for fields in self.keyword_map.values())
+        for keyword, _, value in self.find_hits(text):
+            for statement_type, field, priority in self._targets.get(keyword, ()):
+                current = best.get((statement_type, field))
+                if current is None or priority < current[0]:
+                    best[(statement_type, field)] = (priority, value)
+                    if priority == 0:
+                        pending -= 1
+            if not pending:
+                break
+        return best
+    
+    @staticmethod
+    def merge_ranked(target: Dict[Tuple[str, str], Tuple[int, float]],
+                     source: Dict[Tuple[str, str], Tuple[int, float]]) -> None:
+        """دمج نتائج مقطع لاحق من النص (التطابق السابق يُفضل عند تساوي الأولوية)"""
+        for key, ranked in source.items():
+            if key not in target or ranked[0] < target[key][0]:
+                target[key] = ranked
+    
+    def to_values(self, ranked: Dict[Tuple[str, str], Tuple[int, float]]) -> Dict[str, Dict[str, float]]:
+        """تحويل أفضل التطابقات إلى قيم مجمعة حسب القائمة المالية"""
+        
+        values = {statement_type: {} for statement_type in self.keyword_map}
+        for statement_type, fields in self.keyword_map.items():
+            for field in fields:
+                if (statement_type, field) in ranked and ranked[(statement_type, field)][1]:
+                    values[statement_type][field] = ranked[(statement_type, field)][1]
+        return values
+    
+    def find_values(self, text: str) -> Dict[str, Dict[str, float]]:
+        """القيمة المختارة لكل حقل مجمعة حسب القائمة المالية"""
+        return self.to_values(self.find_ranked(text))
+
+
+class WorkerDeadlineExceeded(BaseException):
+    """تجاوز مهلة الملف داخل عملية العامل
+    
+    مشتق من BaseException حتى لا تبتلعه معالجات Exception العامة في مراحل
+    الاستخراج فتُكمل العمل بعد انتهاء المهلة.
+    """
+
+
+class PoolWork:
+    """مراحل ملف واحد على مجمع العمليات مع مهلته المطلقة"""
+    
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+        self.deadline: Optional[float] = None
+        self.futures: Set[concurrent.futures.Future] = set()
+        self.executors: Set[ProcessPoolExecutor] = set()
+        # True بعد إنهاء المجمع بسبب هذا الملف، فلا تُعاد مراحله
+        self.reaped = False
+    
+    def start(self) -> None:
+        """بدء احتساب المهلة (الوقت بتوقيت النظام ليُقارن داخل عمليات العمال)"""
+        self.deadline = time.time() + self.timeout
+    
+    def track(self, executor: ProcessPoolExecutor, future: concurrent.futures.Future) -> None:
+        self.executors.add(executor)
+        self.futures.add(future)
+        future.add_done_callback(self.futures.discard)
+    
+    async def wait_idle(self, timeout: Optional[float] = None) -> bool:
+        """انتظار انتهاء كل مراحل الملف في المجمع (True إن لم يبقَ شيء يعمل)"""
+        pending = [asyncio.wrap_future(future) for future in list(self.futures)]
+        for future in pending:
+            # أخطاء المراحل يتعامل معها المنتظر الأصلي؛ هنا تُقرأ فقط لتجنب تحذيرات asyncio
+            future.add_done_callback(lambda done: done.cancelled() or done.exception())
+        if pending:
+            await asyncio.wait(pending, timeout=timeout)
+        return not self.futures
 
 class FinancialDataParser:
     """محرك استخراج وتحليل البيانات المالية الذكي"""
@@ -56,8 +230,142 @@ class FinancialDataParser:
             ]
         }
         
+        # مطابق الكلمات المفتاحية المجمع مرة واحدة لكل محلل
+        self.keyword_matcher = FinancialKeywordMatcher(STATEMENT_KEYWORDS)
+        self._table_row_patterns = [
+            (statement_type, field, '|'.join(re.escape(keyword) for keyword in keywords))
+            for statement_type, field, keywords in TABLE_ROW_KEYWORDS
+        ]
+        
         # Configure tesseract for better Arabic OCR
-        self.ocr_config = r'--oem 3 --psm 6 -l ara+eng'
+        # محركات tesseract دائمة لكل عملية (نماذج ara+eng تبقى محملة بين الاستدعاءات)
+        self.ocr_pool = create_tesseract_pool()
+        self.ocr_numeric_whitelist = '0123456789.,-()'
+        
+        # إعدادات المعالجة التكيفية للصور قبل OCR
+        self.ocr_target_dpi = int(os.environ.get('OCR_TARGET_DPI', 300))
+        self.ocr_max_image_width = int(os.environ.get('OCR_MAX_IMAGE_WIDTH', 2500))
+        self.ocr_tile_threads = int(os.environ.get('OCR_TILE_THREADS', 4))
+        self.ocr_tile_height = 600
+        self.ocr_tile_min_gap = 12
+        self.ocr_min_contrast = 100
+        self.ocr_noise_threshold = 2.0
+        self.ocr_heavy_noise_threshold = 8.0
+        
+        # مجمع العمليات لمراحل المعالجة الثقيلة (PDF، OCR، Excel) خارج حلقة الأحداث
+        self.max_workers = int(os.environ.get('OCR_MAX_WORKERS', 2))
+        self.file_timeout = float(os.environ.get('OCR_FILE_TIMEOUT', 300))
+        self.timeout_grace = float(os.environ.get('OCR_TIMEOUT_GRACE', 15))
+        self.max_concurrent_files = max(1, int(os.environ.get('OCR_MAX_CONCURRENT_FILES', 4)))
+        self.pdf_pages_per_chunk = max(1, int(os.environ.get('PDF_PAGES_PER_CHUNK', 16)))
+        self.prewarm_ocr = os.environ.get('OCR_PREWARM', 'false').lower() == 'true'
+        self.pdf_probe_pages = 2
+        self.pdf_min_page_chars = 20
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._recycled_executors: "weakref.WeakSet[ProcessPoolExecutor]" = weakref.WeakSet()
+        self._background_tasks: Set[asyncio.Task] = set()
+        
+        # حدود القراءة المتدفقة لملفات Excel
+        self.excel_chunk_rows = 2000
+        self.excel_raw_text_limit = int(os.environ.get('EXCEL_RAW_TEXT_LIMIT', 1_000_000))
+        self.excel_table_preview_rows = int(os.environ.get('EXCEL_TABLE_PREVIEW_ROWS', 1000))
+        
+        # ذاكرة مؤقتة لنتائج الملفات المتطابقة (تُربط بـ GridFS عند بدء الخادم)
+        self.result_cache = ParseResultCache()
+    
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """إنشاء مجمع العمليات عند أول استخدام (أو بعد إنهاء مجمع معطل)"""
+        if self._executor is not None and getattr(self._executor, '_broken', False):
+            self._executor = None
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=warm_ocr_worker if self.prewarm_ocr else None
+            )
+        return self._executor
+    
+    def _submit(self, work: Optional["PoolWork"], func, *args) -> asyncio.Future:
+        """إرسال مرحلة إلى مجمع العمليات مع مهلة الملف المطلقة لتُطبق داخل العامل"""
+        # إلغاء المهمة المنتظِرة يلغي المراحل التي لم تبدأ بعد في المجمع
+        return asyncio.ensure_future(self._run_stage(work, func, *args))
+    
+    async def _run_stage(self, work: Optional["PoolWork"], func, *args) -> Any:
+        """تشغيل مرحلة واحدة وإعادتها على المجمع الجديد إذا أُنهي المجمع بسبب ملف آخر
+        
+        إنهاء عامل واحد يكسر ProcessPoolExecutor كله، فمراحل الملفات الأخرى التي
+        كانت فيه تفشل بـ BrokenProcessPool دون ذنب منها. المراحل لا تعدل إلا
+        نسخاً من مدخلاتها فإعادتها آمنة.
+        """
+        while True:
+            executor = self._get_executor()
+            future = executor.submit(run_with_deadline, work.deadline if work else None, func, *args)
+            if work is not None:
+                work.track(executor, future)
+            try:
+                return await asyncio.wrap_future(future)
+            except BrokenProcessPool:
+                if executor not in self._recycled_executors or (work is not None and work.reaped):
+                    raise
+                logging.info(f"Retrying {getattr(func, '__name__', func)} after process pool was recycled")
+    
+    async def _run_in_pool(self, func, *args, work: Optional["PoolWork"] = None) -> Any:
+        """تشغيل مرحلة معالجة على مجمع العمليات دون حجز حلقة الأحداث"""
+        return await self._submit(work, func, *args)
+    
+    def _reap_overrun(self, work: "PoolWork") -> None:
+        """إنهاء عمال الملف المتجاوز لمهلته إن لم يتوقفوا خلال فترة السماح
+        
+        المهلة تُطبق داخل العامل بين تعليمات بايثون، لكن استدعاء C طويل
+        (tesseract أو pdfminer) قد لا يعود، فيُنهى المجمع ويُستبدل بمجمع جديد.
+        """
+        
+        async def reap():
+            if await work.wait_idle(self.timeout_grace):
+                return
+            if self._executor is not None and self._executor in work.executors:
+                work.reaped = True
+                logging.warning(
+                    f"OCR worker still busy {self.timeout_grace:g}s after file timeout; recycling process pool"
+                )
+                self._recycle_executor()
+        
+        task = asyncio.ensure_future(reap())
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+    
+    def _recycle_executor(self) -> None:
+        """إنهاء عمليات المجمع الحالي فوراً؛ المجمع التالي يُنشأ عند أول استخدام
+        
+        مراحل الملفات الأخرى التي كانت في المجمع تُعاد تلقائياً (انظر _run_stage).
+        """
+        executor, self._executor = self._executor, None
+        if executor is None:
+            return
+        self._recycled_executors.add(executor)
+        processes = list((getattr(executor, '_processes', None) or {}).values())
+        executor.shutdown(wait=False, cancel_futures=True)
+        for process in processes:
+            process.terminate()
+    
+    def _release_when_idle(self, semaphore: asyncio.Semaphore, work: "PoolWork") -> None:
+        """تحرير مقعد الملف فور انتهاء آخر مراحله في المجمع"""
+        if not work.futures:
+            semaphore.release()
+            return
+        
+        task = asyncio.ensure_future(work.wait_idle())
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+        task.add_done_callback(lambda _: semaphore.release())
+    
+    def shutdown(self) -> None:
+        """إغلاق مجمع العمليات عند إيقاف الخادم"""
+        for task in list(self._background_tasks):
+            task.cancel()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
         
     async def process_uploaded_files(self, files: List[Any], company_name: str) -> Dict[str, Any]:
         """معالجة الملفات المرفوعة واستخراج البيانات المالية"""
@@ -80,42 +388,65 @@ class FinancialDataParser:
             }
         }
         
-        for file in files:
+        # معالجة الملفات بالتوازي بحد أقصى للملفات المتزامنة
+        semaphore = asyncio.Semaphore(self.max_concurrent_files)
+        
+        async def process_with_limit(file) -> Dict[str, Any]:
+            await semaphore.acquire()
+            work = PoolWork(self.file_timeout)
             try:
-                file_result = await self._process_single_file(file)
-                processing_results["files_processed"].append(file_result)
-                
-                if file_result["status"] == "success":
-                    processing_results["processing_summary"]["successful"] += 1
-                    # دمج البيانات المستخرجة
-                    await self._merge_financial_data(
-                        processing_results["extracted_data"], 
-                        file_result["extracted_data"]
-                    )
-                else:
-                    processing_results["processing_summary"]["failed"] += 1
-                    
-            except Exception as e:
+                return await self._process_single_file(file, work)
+            finally:
+                # المقعد يبقى محجوزاً حتى تتوقف مراحل الملف في المجمع فعلياً
+                # (عند الإلغاء أو انتهاء المهلة قد يظل العامل يعمل حتى مهلته الداخلية)
+                self._release_when_idle(semaphore, work)
+        
+        # إلغاء الطلب يلغي مراحل الملفات التي لم تبدأ في المجمع؛ الجارية تتوقف عند مهلتها
+        file_results = await asyncio.gather(
+            *(process_with_limit(file) for file in files),
+            return_exceptions=True
+        )
+        
+        # الدمج بترتيب الملفات المرفوعة وليس بترتيب انتهائها حتى تبقى النتيجة ثابتة
+        for file, file_result in zip(files, file_results):
+            if isinstance(file_result, BaseException):
                 processing_results["processing_summary"]["failed"] += 1
                 processing_results["processing_summary"]["warnings"].append(
-                    f"Error processing {file.filename}: {str(e)}"
+                    f"Error processing {file.filename}: {str(file_result)}"
+                )
+                continue
+            
+            processing_results["files_processed"].append(file_result)
+            
+            if file_result["status"] == "success":
+                processing_results["processing_summary"]["successful"] += 1
+                # دمج البيانات المستخرجة
+                await self._merge_financial_data(
+                    processing_results["extracted_data"], 
+                    file_result["extracted_data"]
                 )
+            else:
+                processing_results["processing_summary"]["failed"] += 1
         
         # تنظيف وتحسين البيانات المستخرجة
         await self._clean_and_enhance_data(processing_results["extracted_data"])
         
         return processing_results
     
-    async def _process_single_file(self, file) -> Dict[str, Any]:
+    async def _process_single_file(self, file, work: Optional["PoolWork"] = None) -> Dict[str, Any]:
         """معالجة ملف واحد"""
         
+        work = work or PoolWork(self.file_timeout)
+        
         file_extension = os.path.splitext(file.filename.lower())[1]
-        file_content = await file.read()
+        
+        # نسخ الملف المرفوع مرة واحدة إلى ملف مؤقت تقرأ منه جميع مراحل المعالجة
+        file_path = await self._spool_upload(file, file_extension)
         
         result = {
             "filename": file.filename,
             "file_type": file_extension,
-            "file_size": len(file_content),
+            "file_size": os.path.getsize(file_path),
             "status": "processing",
             "extracted_data": {
                 "balance_sheet": {},
@@ -134,17 +465,23 @@ class FinancialDataParser:
         start_time = datetime.now()
         
         try:
-            if file_extension == '.pdf':
-                result = await self._process_pdf_file(file_content, result)
-            elif file_extension in ['.xlsx', '.xls']:
-                result = await self._process_excel_file(file_content, result)
-            elif file_extension in ['.docx', '.doc']:
-                result = await self._process_word_file(file_content, result)
-            elif file_extension in ['.jpg', '.jpeg', '.png']:
-                result = await self._process_image_file(file_content, result)
+            # البحث عن نتيجة سابقة لنفس المحتوى
+            cache_key = await asyncio.to_thread(compute_file_key, file_path, PARSER_VERSION)
+            result["content_hash"] = cache_key.split(':', 1)[0]
+            result["content_key"] = cache_key
+            cached = await self.result_cache.get(cache_key)
+            
+            if cached is not None:
+                result["extracted_data"] = cached["extracted_data"]
+                result["processing_details"].update(cached["processing_details"])
+                result["processing_details"]["cache_hit"] = True
             else:
-                result["status"] = "error"
-                result["error"] = f"Unsupported file format: {file_extension}"
+                # تشغيل المعالجة في عملية منفصلة مع حد زمني لكل ملف
+                work.start()
+                result = await asyncio.wait_for(
+                    self._parse_file_async(file_extension, file_path, result, work),
+                    timeout=self.file_timeout
+                )
                 
             # حساب وقت المعالجة
             processing_time = (datetime.now() - start_time).total_seconds()
@@ -152,55 +489,209 @@ class FinancialDataParser:
             
             if result["status"] != "error":
                 result["status"] = "success"
+                if cached is None:
+                    await self.result_cache.put(cache_key, {
+                        "extracted_data": result["extracted_data"],
+                        "processing_details": {
+                            k: v for k, v in result["processing_details"].items() if k != "processing_time"
+                        }
+                    })
                 
+        except (asyncio.TimeoutError, WorkerDeadlineExceeded):
+            result["status"] = "error"
+            result["error"] = f"File processing timed out after {self.file_timeout:g} seconds"
+            self._reap_overrun(work)
         except Exception as e:
             result["status"] = "error"
             result["error"] = str(e)
+        finally:
+            # حذف الملف المؤقت (العامل الذي تجاوز المهلة يحتفظ بمقبض مفتوح حتى يتوقف)
+            try:
+                os.unlink(file_path)
+            except OSError:
+                pass
             
         return result
     
-    async def _process_pdf_file(self, file_content: bytes, result: Dict) -> Dict:
+    async def _spool_upload(self, file, file_extension: str) -> str:
+        """نسخ الملف المرفوع إلى ملف مؤقت مسمى دون تحميله كاملاً في الذاكرة"""
+        
+        with tempfile.NamedTemporaryFile(delete=False, suffix=file_extension, prefix='finclick_upload_') as temp_file:
+            source = getattr(file, 'file', None)
+            if source is not None:
+                # UploadFile: نسخ متدفق من الملف المؤقت الخاص به
+                await file.seek(0)
+                await asyncio.to_thread(shutil.copyfileobj, source, temp_file, 1024 * 1024)
+            else:
+                temp_file.write(await file.read())
+            return temp_file.name
+    
+    async def _parse_file_async(self, file_extension: str, file_path: str, result: Dict,
+                                work: Optional["PoolWork"] = None) -> Dict:
+        """تشغيل مرحلة المعالجة على مجمع العمليات (ملفات PDF تُوزع على مستوى الصفحات)"""
+        
+        if file_extension == '.pdf':
+            return await self._process_pdf_file_parallel(file_path, result, work)
+        return await self._run_in_pool(parse_file_content, file_extension, file_path, result, work=work)
+    
+    def _parse_file_content(self, file_extension: str, file_path: str, result: Dict) -> Dict:
+        """توجيه الملف لمرحلة المعالجة المناسبة حسب نوعه"""
+        
+        if file_extension == '.pdf':
+            return self._process_pdf_file(file_path, result)
+        elif file_extension in ['.xlsx', '.xls']:
+            return self._process_excel_file(file_path, result)
+        elif file_extension in ['.docx', '.doc']:
+            return self._process_word_file(file_path, result)
+        elif file_extension in ['.jpg', '.jpeg', '.png']:
+            return self._process_image_file(file_path, result)
+        
+        result["status"] = "error"
+        result["error"] = f"Unsupported file format: {file_extension}"
+        return result
+    
+    def _extract_pdf_page(self, page, page_number: int) -> Dict[str, Any]:
+        """استخراج النص والجداول من صفحة PDF واحدة"""
+        
+        page_result = {"page_number": page_number, "text": "", "tables": []}
+        
+        # استخراج النص
+        try:
+            page_result["text"] = page.extract_text() or ""
+        except Exception as page_error:
+            logging.warning(f"Error extracting text from page: {page_error}")
+            return page_result
+        
+        # استخراج الجداول
+        try:
+            page_tables = page.extract_tables()
+            if page_tables:
+                page_result["tables"] = [
+                    table for table in page_tables
+                    if table and len(table) > 1  # التأكد من وجود بيانات
+                ]
+        except Exception as table_error:
+            logging.warning(f"Error extracting tables from page: {table_error}")
+        
+        return page_result
+    
+    def _ocr_pdf_page(self, page, page_number: int) -> Dict[str, Any]:
+        """OCR لصفحة PDF بلا طبقة نص بعد تحويلها لصورة بالدقة المستهدفة"""
+        
+        page_result = {"page_number": page_number, "text": "", "tables": [], "ocr": True}
+        try:
+            image = page.to_image(resolution=self.ocr_target_dpi).original
+            page_result["text"], page_result["tables"] = self._ocr_page_image(image)
+        except Exception as ocr_error:
+            logging.warning(f"OCR failed for PDF page {page_number + 1}: {ocr_error}")
+        return page_result
+    
+    async def iter_pdf_chunks(self, file_path: str, page_count: int, layout: str = "native",
+                              work: Optional["PoolWork"] = None) -> AsyncIterator[Dict[str, Any]]:
+        """توزيع مقاطع صفحات PDF على مجمع العمليات وإرجاع نتائجها بالترتيب فور جاهزية كل مقطع"""
+        
+        futures = [
+            self._submit(
+                work, extract_pdf_pages, file_path, start,
+                min(start + self.pdf_pages_per_chunk, page_count), layout
+            )
+            for start in range(0, page_count, self.pdf_pages_per_chunk)
+        ]
+        
+        try:
+            for future in futures:
+                yield await future
+        finally:
+            for future in futures:
+                future.cancel()
+    
+    async def _process_pdf_file_parallel(self, file_path: str, result: Dict,
+                                         work: Optional["PoolWork"] = None) -> Dict:
+        """معالجة PDF بالتوازي على مستوى الصفحات مع الرجوع للمعالجة التسلسلية عند الفشل
+        
+        فحص أول صفحتين يحدد نوع المستند: نصي (استخراج طبقة النص والجداول)،
+        ممسوح ضوئياً (OCR مباشرة لكل الصفحات)، أو مختلط (OCR للصفحات الخالية
+        من النص فقط).
+        """
+        
+        try:
+            probe = await self._run_in_pool(probe_pdf_layout, file_path, self.pdf_probe_pages, work=work)
+        except Exception as pdfplumber_error:
+            # تعذر فتح الملف بـ pdfplumber: الانتقال مباشرة إلى PyPDF2 ثم camelot
+            logging.warning(f"pdfplumber failed: {pdfplumber_error}")
+            return await self._run_in_pool(parse_pdf_without_pdfplumber, file_path, result, work=work)
+        
+        page_count = probe["page_count"]
+        layout = probe["layout"]
+        result["processing_details"]["method_used"] = PDF_LAYOUT_METHODS[layout]
+        result["processing_details"]["pdf_layout"] = layout
+        
+        ocr_pages = 0
+        page_texts = []
+        tables = []
+        table_data = {"balance_sheet": {}, "income_statement": {}, "cash_flow": {}}
+        ranked_text_values: Dict[Tuple[str, str], Tuple[int, float]] = {}
+        
+        try:
+            # النصوص والجداول تُحلل داخل العمال لكل مقطع وتُدمج هنا فور وصوله بترتيب الصفحات
+            async for chunk in self.iter_pdf_chunks(file_path, page_count, layout, work):
+                # البند في آخر صفحة من المقطع السابق وقيمته في أول صفحة من هذا المقطع
+                # لا يراه أي عامل، فتُطابق الصفحتان المتجاورتان هنا كما في المعالجة التسلسلية
+                head = next((page_result["text"] for page_result in chunk["pages"] if page_result["text"]), "")
+                if page_texts and head:
+                    self.keyword_matcher.merge_ranked(
+                        ranked_text_values,
+                        self.keyword_matcher.find_ranked(re.sub(r'\s+', ' ', page_texts[-1] + head))
+                    )
+                self.keyword_matcher.merge_ranked(ranked_text_values, chunk["text_ranked"])
+                for page_result in chunk["pages"]:
+                    ocr_pages += page_result.get("ocr", False)
+                    if page_result["text"]:
+                        page_texts.append(page_result["text"] + "\n")
+                    tables.extend(page_result["tables"])
+                    for statement_type, values in page_result["table_data"].items():
+                        table_data[statement_type].update(values)
+        except Exception as page_error:
+            logging.warning(f"Parallel PDF page extraction failed: {page_error}")
+            return await self._run_in_pool(parse_file_content, '.pdf', file_path, result, work=work)
+        
+        raw_text = "".join(page_texts)
+        result["extracted_data"]["raw_text"] = raw_text
+        result["extracted_data"]["tables"] = tables
+        result["processing_details"]["confidence_score"] = 0.8 if not ocr_pages else (0.7 if tables else 0.6)
+        result["processing_details"]["pages_processed"] = page_count
+        result["processing_details"]["ocr_pages"] = ocr_pages
+        
+        # بيانات النصوص ثم بيانات الجداول فوقها كما في المعالجة التسلسلية
+        for statement_type, values in self.keyword_matcher.to_values(ranked_text_values).items():
+            result["extracted_data"][statement_type].update(values)
+        for statement_type, values in table_data.items():
+            result["extracted_data"][statement_type].update(values)
+        
+        return result
+    
+    def _process_pdf_file(self, file_path: str, result: Dict, try_pdfplumber: bool = True) -> Dict:
         """معالجة ملفات PDF مع معالجة محسنة للأخطاء"""
         
         result["processing_details"]["method_used"] = "PDF Processing"
         
         # الطريقة 1: استخدام pdfplumber لاستخراج النصوص والجداول
         try:
-            with pdfplumber.open(io.BytesIO(file_content)) as pdf:
-                full_text = ""
-                tables = []
-                
-                for page in pdf.pages:
-                    # استخراج النص
-                    try:
-                        page_text = page.extract_text()
-                        if page_text:
-                            full_text += page_text + "\n"
-                    except Exception as page_error:
-                        logging.warning(f"Error extracting text from page: {page_error}")
-                        continue
-                    
-                    # استخراج الجداول
-                    try:
-                        page_tables = page.extract_tables()
-                        if page_tables:
-                            for table in page_tables:
-                                if table and len(table) > 1:  # التأكد من وجود بيانات
-                                    tables.append(table)
-                    except Exception as table_error:
-                        logging.warning(f"Error extracting tables from page: {table_error}")
-                        continue
-                
-                result["extracted_data"]["raw_text"] = full_text
-                result["extracted_data"]["tables"] = tables
-                result["processing_details"]["confidence_score"] = 0.8
+            if not try_pdfplumber:
+                raise RuntimeError("pdfplumber could not open the file during probing")
+            with pdfplumber.open(file_path) as pdf:
+                pages = [self._extract_pdf_page(page, page_number) for page_number, page in enumerate(pdf.pages)]
+            
+            result["extracted_data"]["raw_text"] = "".join(page["text"] + "\n" for page in pages if page["text"])
+            result["extracted_data"]["tables"] = [table for page in pages for table in page["tables"]]
+            result["processing_details"]["confidence_score"] = 0.8
                 
         except Exception as pdfplumber_error:
             logging.warning(f"pdfplumber failed: {pdfplumber_error}")
             
             # الطريقة 2: استخدام PyPDF2 مع معالجة الملفات المشفرة
             try:
-                pdf_reader = PyPDF2.PdfReader(io.BytesIO(file_content))
+                pdf_reader = PyPDF2.PdfReader(file_path)
                 
                 # التحقق من التشفير
                 if pdf_reader.is_encrypted:
@@ -240,26 +731,11 @@ class FinancialDataParser:
                 
                 # الطريقة 3: استخدام camelot كخيار أخير
                 try:
-                    import tempfile
-                    import os
+                    tables = camelot.read_pdf(file_path, pages='all', flavor='lattice')
+                    result["extracted_data"]["tables"] = [table.df.values.tolist() for table in tables]
+                    result["processing_details"]["method_used"] = "Camelot PDF Processing"
+                    result["processing_details"]["confidence_score"] = 0.5
                     
-                    # حفظ مؤقت للملف لـ camelot
-                    with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_file:
-                        temp_file.write(file_content)
-                        temp_file_path = temp_file.name
-                    
-                    try:
-                        tables = camelot.read_pdf(temp_file_path, pages='all', flavor='lattice')
-                        result["extracted_data"]["tables"] = [table.df.values.tolist() for table in tables]
-                        result["processing_details"]["method_used"] = "Camelot PDF Processing"
-                        result["processing_details"]["confidence_score"] = 0.5
-                    finally:
-                        # حذف الملف المؤقت
-                        try:
-                            os.unlink(temp_file_path)
-                        except:
-                            pass
-                            
                 except Exception as camelot_error:
                     logging.error(f"All PDF processing methods failed: {camelot_error}")
                     result["status"] = "error"
@@ -268,28 +744,115 @@ class FinancialDataParser:
         
         # تحليل النصوص واستخراج البيانات المالية
         if result["extracted_data"]["raw_text"]:
-            await self._extract_financial_data_from_text(
+            self._extract_financial_data_from_text(
                 result["extracted_data"]["raw_text"], 
                 result["extracted_data"]
             )
         
         # تحليل الجداول
         if result["extracted_data"]["tables"]:
-            await self._extract_financial_data_from_tables(
+            self._extract_financial_data_from_tables(
                 result["extracted_data"]["tables"], 
                 result["extracted_data"]
             )
         
         return result
     
-    async def _process_excel_file(self, file_content: bytes, result: Dict) -> Dict:
+    def _iter_excel_row_chunks(self, file_path: str) -> Iterator[Tuple[str, List, List[List]]]:
+        """قراءة أوراق Excel صفاً بصف وإرجاع (اسم الورقة، صف العناوين، دفعة صفوف)"""
+        
+        workbook = load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            for worksheet in workbook.worksheets:
+                header = None
+                chunk = []
+                for row in worksheet.iter_rows(values_only=True):
+                    if all(value is None for value in row):
+                        continue
+                    if header is None:
+                        header = list(row)
+                        continue
+                    # توحيد عرض الصفوف مع صف العناوين
+                    row = list(row[:len(header)])
+                    row.extend([None] * (len(header) - len(row)))
+                    chunk.append(row)
+                    if len(chunk) >= self.excel_chunk_rows:
+                        yield worksheet.title, header, chunk
+                        chunk = []
+                if header is not None:
+                    yield worksheet.title, header, chunk
+        finally:
+            workbook.close()
+    
+    def _process_excel_streaming(self, file_path: str, result: Dict) -> Dict:
+        """معالجة ملفات xlsx بشكل متدفق مع حد أقصى للنص والجداول المحفوظة"""
+        
+        result["processing_details"]["method_used"] = "Excel Streaming Processing"
+        
+        text_parts = []
+        text_size = 0
+        tables = []
+        ranked_text_values = {}
+        table_data = {"balance_sheet": {}, "income_statement": {}, "cash_flow": {}}
+        current_sheet = None
+        
+        for sheet_name, header, rows in self._iter_excel_row_chunks(file_path):
+            lines = []
+            if sheet_name != current_sheet:
+                current_sheet = sheet_name
+                preview = [header]
+                tables.append(preview)
+                lines.append(f"\n--- {sheet_name} ---")
+                lines.append(" ".join(str(value) for value in header if value is not None))
+            lines.extend(" ".join(str(value) for value in row if value is not None) for row in rows)
+            chunk_text = "\n".join(lines) + "\n"
+            
+            # استخراج البيانات من الدفعة الحالية فور قراءتها
+            self.keyword_matcher.merge_ranked(
+                ranked_text_values,
+                self.keyword_matcher.find_ranked(re.sub(r'\s+', ' ', chunk_text))
+            )
+            if rows:
+                self._extract_financial_data_from_tables([[header] + rows], table_data)
+            
+            # الاحتفاظ بجزء محدود فقط من النص والجداول
+            if text_size < self.excel_raw_text_limit:
+                text_parts.append(chunk_text[:self.excel_raw_text_limit - text_size])
+                text_size += len(text_parts[-1])
+                if text_size >= self.excel_raw_text_limit:
+                    result["processing_details"]["raw_text_truncated"] = True
+            if len(preview) <= self.excel_table_preview_rows:
+                preview.extend(rows[:self.excel_table_preview_rows + 1 - len(preview)])
+        
+        result["extracted_data"]["raw_text"] = "".join(text_parts)
+        result["extracted_data"]["tables"] = [table for table in tables if len(table) > 1]
+        result["processing_details"]["confidence_score"] = 0.9
+        
+        # بيانات الجداول تُطبق بعد النصوص كما في المعالجة الكاملة
+        for statement_type, values in self.keyword_matcher.to_values(ranked_text_values).items():
+            result["extracted_data"][statement_type].update(values)
+        for statement_type, values in table_data.items():
+            result["extracted_data"][statement_type].update(values)
+        
+        return result
+    
+    def _process_excel_file(self, file_path: str, result: Dict) -> Dict:
         """معالجة ملفات Excel"""
         
+        # ملفات xlsx (حاوية ZIP) تُقرأ بشكل متدفق دون تحميل الأوراق كاملة
+        with open(file_path, 'rb') as excel_file:
+            is_zip_container = excel_file.read(2) == b'PK'
+        if is_zip_container:
+            try:
+                return self._process_excel_streaming(file_path, result)
+            except Exception as e:
+                logging.warning(f"Streaming Excel read failed, falling back to pandas: {e}")
+        
         result["processing_details"]["method_used"] = "Excel Processing"
         
         try:
             # قراءة الملف باستخدام pandas
-            excel_data = pd.read_excel(io.BytesIO(file_content), sheet_name=None)
+            excel_data = pd.read_excel(file_path, sheet_name=None)
             
             all_text = ""
             tables = []
@@ -308,21 +871,21 @@ class FinancialDataParser:
             result["processing_details"]["confidence_score"] = 0.9
             
             # استخراج البيانات المالية
-            await self._extract_financial_data_from_text(all_text, result["extracted_data"])
-            await self._extract_financial_data_from_tables(tables, result["extracted_data"])
+            self._extract_financial_data_from_text(all_text, result["extracted_data"])
+            self._extract_financial_data_from_tables(tables, result["extracted_data"])
             
         except Exception as e:
             raise Exception(f"Excel processing failed: {e}")
         
         return result
     
-    async def _process_word_file(self, file_content: bytes, result: Dict) -> Dict:
+    def _process_word_file(self, file_path: str, result: Dict) -> Dict:
         """معالجة ملفات Word"""
         
         result["processing_details"]["method_used"] = "Word Processing"
         
         try:
-            doc = Document(io.BytesIO(file_content))
+            doc = Document(file_path)
             
             full_text = ""
             tables = []
@@ -345,170 +908,320 @@ class FinancialDataParser:
             result["processing_details"]["confidence_score"] = 0.8
             
             # استخراج البيانات المالية
-            await self._extract_financial_data_from_text(full_text, result["extracted_data"])
-            await self._extract_financial_data_from_tables(tables, result["extracted_data"])
+            self._extract_financial_data_from_text(full_text, result["extracted_data"])
+            self._extract_financial_data_from_tables(tables, result["extracted_data"])
             
         except Exception as e:
             raise Exception(f"Word processing failed: {e}")
         
         return result
     
-    async def _process_image_file(self, file_content: bytes, result: Dict) -> Dict:
+    def _process_image_file(self, file_path: str, result: Dict) -> Dict:
         """معالجة الصور باستخدام OCR"""
         
         result["processing_details"]["method_used"] = "OCR Processing"
         
         try:
             # تحويل البيانات إلى صورة
-            image = Image.open(io.BytesIO(file_content))
+            image = Image.open(file_path)
             
-            # تحسين الصورة للـ OCR
-            enhanced_image = await self._enhance_image_for_ocr(image)
-            
-            # استخراج النص باستخدام OCR
-            extracted_text = pytesseract.image_to_string(enhanced_image, config=self.ocr_config)
+            # OCR للنص وللجداول المكتشفة
+            extracted_text, tables = self._ocr_page_image(image)
             
             result["extracted_data"]["raw_text"] = extracted_text
             result["processing_details"]["confidence_score"] = 0.6  # OCR عادة أقل دقة
-            
-            # محاولة كشف الجداول في الصورة
-            try:
-                table_data = await self._detect_tables_in_image(enhanced_image)
-                if table_data:
-                    result["extracted_data"]["tables"] = table_data
-                    result["processing_details"]["confidence_score"] = 0.7
-            except:
-                pass  # الجداول اختيارية
+            if tables:
+                result["extracted_data"]["tables"] = tables
+                result["processing_details"]["confidence_score"] = 0.7
             
             # استخراج البيانات المالية
-            await self._extract_financial_data_from_text(extracted_text, result["extracted_data"])
+            self._extract_financial_data_from_text(extracted_text, result["extracted_data"])
+            self._extract_financial_data_from_tables(result["extracted_data"]["tables"], result["extracted_data"])
             
         except Exception as e:
             raise Exception(f"Image OCR processing failed: {e}")
         
         return result
     
-    async def _enhance_image_for_ocr(self, image: Image) -> Image:
-        """تحسين الصورة لتحسين دقة OCR"""
+    def _ocr_page_image(self, image: Image) -> Tuple[str, List[List]]:
+        """OCR لصورة صفحة: خلايا الجداول المكتشفة ثم بقية الصفحة بعد استبعاد الجداول"""
+        
+        # تحسين الصورة للـ OCR
+        enhanced_image = self._enhance_image_for_ocr(image)
+        gray = np.array(enhanced_image)
+        
+        # كشف الجداول أولاً حتى تُقرأ خلاياها فقط ويُستبعد مكانها من OCR الصفحة
+        try:
+            grids = self._find_table_grids(gray)
+        except Exception as grid_error:
+            logging.warning(f"Table grid detection failed: {grid_error}")
+            grids = []
+        
+        text_image = enhanced_image
+        if grids:
+            masked = gray.copy()
+            for (x, y, w, h), _, _ in grids:
+                masked[y:y + h, x:x + w] = 255
+            text_image = Image.fromarray(masked)
+        
+        # استخراج النص باستخدام OCR
+        extracted_text = self._ocr_image(text_image)
+        
+        # قراءة خلايا الجداول المكتشفة
+        tables = []
+        try:
+            tables = self._ocr_table_cells(gray, grids)
+        except Exception as table_error:
+            logging.warning(f"Table cell OCR failed: {table_error}")  # الجداول اختيارية
+        
+        return extracted_text, tables
+    
+    def _enhance_image_for_ocr(self, image: Image) -> Image:
+        """تحسين الصورة لتحسين دقة OCR (المرشحات المكلفة تُطبق فقط عند الحاجة)"""
         
-        # تحويل إلى numpy array
-        img_array = np.array(image)
+        # توحيد الدقة: تصغير الصور عالية الدقة وتكبير الصور منخفضة الدقة
+        scale = self._ocr_scale_factor(image)
         
-        # تحويل إلى grayscale إذا لزم الأمر
-        if len(img_array.shape) == 3:
-            img_array = cv2.cvtColor(img_array, cv2.COLOR_RGB2GRAY)
+        # تحويل إلى grayscale
+        img_array = np.array(image.convert('L'))
+        if scale != 1.0:
+            img_array = cv2.resize(
+                img_array, None, fx=scale, fy=scale,
+                interpolation=cv2.INTER_AREA if scale < 1.0 else cv2.INTER_CUBIC
+            )
+        
+        # تحسين التباين والوضوح للصور الباهتة فقط
+        low, high = np.percentile(img_array, (5, 95))
+        if high - low < self.ocr_min_contrast:
+            img_array = cv2.equalizeHist(img_array)
         
-        # تحسين التباين والوضوح
-        img_array = cv2.equalizeHist(img_array)
+        # تقدير الضوضاء من الفرق عن المرشح الوسيط
+        denoised = cv2.medianBlur(img_array, 3)
+        noise_level = float(cv2.absdiff(img_array, denoised).mean())
         
         # إزالة الضوضاء
-        img_array = cv2.medianBlur(img_array, 3)
+        if noise_level > self.ocr_noise_threshold:
+            img_array = denoised
         
-        # تحسين الحواف
-        img_array = cv2.bilateralFilter(img_array, 9, 75, 75)
+        # تحسين الحواف للصور شديدة الضوضاء فقط (المرحلة الأكثر كلفة)
+        if noise_level > self.ocr_heavy_noise_threshold:
+            img_array = cv2.bilateralFilter(img_array, 9, 75, 75)
         
         return Image.fromarray(img_array)
     
-    async def _detect_tables_in_image(self, image: Image) -> List[List]:
-        """كشف الجداول في الصور"""
+    def _ocr_scale_factor(self, image: Image) -> float:
+        """معامل التحجيم للوصول إلى الدقة المستهدفة دون تجاوز العرض الأقصى"""
         
-        img_array = np.array(image)
+        scale = 1.0
+        dpi = image.info.get('dpi')
+        if dpi and dpi[0]:
+            dpi = float(dpi[0])
+            if dpi > self.ocr_target_dpi or dpi < self.ocr_target_dpi / 1.5:
+                scale = min(self.ocr_target_dpi / dpi, 2.0)
         
-        # تحويل إلى grayscale
-        if len(img_array.shape) == 3:
-            gray = cv2.cvtColor(img_array, cv2.COLOR_RGB2GRAY)
-        else:
-            gray = img_array
+        if image.width * scale > self.ocr_max_image_width:
+            scale = self.ocr_max_image_width / image.width
+        return scale
+    
+    def _split_into_text_blocks(self, img_array: np.ndarray) -> List[np.ndarray]:
+        """تقسيم الصفحات الطويلة إلى كتل نصية عند الفراغات الأفقية بين الأسطر"""
+        
+        height, width = img_array.shape[:2]
+        if height < 2 * self.ocr_tile_height:
+            return [img_array]
+        
+        # الإسقاط الأفقي لبكسلات الحبر
+        _, ink = cv2.threshold(img_array, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+        blank_rows = np.count_nonzero(ink, axis=1) <= max(1, width // 200)
+        
+        # منتصف كل فراغ أفقي طويل بما يكفي نقطة قطع محتملة
+        edges = np.flatnonzero(np.diff(np.concatenate(([0], blank_rows.astype(np.int8), [0]))))
+        gap_starts, gap_ends = edges[::2], edges[1::2]
+        wide_gaps = (gap_ends - gap_starts) >= self.ocr_tile_min_gap
+        cuts = (gap_starts[wide_gaps] + gap_ends[wide_gaps]) // 2
+        
+        blocks = []
+        top = 0
+        for cut in cuts:
+            if cut - top >= self.ocr_tile_height and height - cut >= self.ocr_tile_height // 2:
+                blocks.append(img_array[top:cut])
+                top = cut
+        blocks.append(img_array[top:])
+        return blocks
+    
+    def _ocr_image(self, image: Image) -> str:
+        """OCR للصورة كاملة أو لكتلها النصية بالتوازي مع الحفاظ على ترتيبها"""
+        
+        blocks = self._split_into_text_blocks(np.array(image))
+        if len(blocks) == 1:
+            return self.ocr_pool.image_to_string(image, psm=6)
+        
+        # محركات tesseract تعمل خارج GIL، فالخيوط كافية للتوازي
+        with ThreadPoolExecutor(max_workers=min(self.ocr_tile_threads, len(blocks))) as executor:
+            texts = executor.map(
+                lambda block: self.ocr_pool.image_to_string(Image.fromarray(block), psm=6),
+                blocks
+            )
+            return "\n".join(text.strip('\n') for text in texts)
+    
+    def _detect_tables_in_image(self, image: Image) -> List[List]:
+        """كشف الجداول في الصور وقراءة خلاياها"""
+        
+        img_array = np.array(image.convert('L'))
+        return self._ocr_table_cells(img_array, self._find_table_grids(img_array))
+    
+    def _find_table_grids(self, gray: np.ndarray) -> List[Tuple[Tuple[int, int, int, int], List[int], List[int]]]:
+        """كشف شبكات الجداول: (مستطيل الجدول، مواضع الخطوط الأفقية، مواضع الخطوط العمودية)"""
+        
+        height, width = gray.shape[:2]
+        _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
         
         # كشف الخطوط الأفقية والعمودية
-        horizontal_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (25, 1))
-        vertical_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (1, 25))
+        horizontal_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (max(25, width // 40), 1))
+        vertical_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (1, max(25, height // 60)))
         
-        horizontal_lines = cv2.morphologyEx(gray, cv2.MORPH_OPEN, horizontal_kernel, iterations=2)
-        vertical_lines = cv2.morphologyEx(gray, cv2.MORPH_OPEN, vertical_kernel, iterations=2)
+        horizontal_lines = cv2.morphologyEx(binary, cv2.MORPH_OPEN, horizontal_kernel, iterations=2)
+        vertical_lines = cv2.morphologyEx(binary, cv2.MORPH_OPEN, vertical_kernel, iterations=2)
         
         # دمج الخطوط
-        table_mask = cv2.addWeighted(horizontal_lines, 0.5, vertical_lines, 0.5, 0.0)
+        table_mask = cv2.bitwise_or(horizontal_lines, vertical_lines)
         
-        # البحث عن المستطيلات (خلايا الجدول)
+        # كل مكون خارجي من الخطوط جدول محتمل
         contours, _ = cv2.findContours(table_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
         
-        # هذا مثال مبسط - في التطبيق الحقيقي نحتاج خوارزمية أكثر تعقيداً
-        return []
+        grids = []
+        for contour in contours:
+            x, y, w, h = cv2.boundingRect(contour)
+            if w < width // 10 or h < 40:
+                continue
+            
+            row_lines = [y + position for position in self._line_positions(horizontal_lines[y:y + h, x:x + w], axis=1)]
+            column_lines = [x + position for position in self._line_positions(vertical_lines[y:y + h, x:x + w], axis=0)]
+            
+            # صف عناوين وصف بيانات على الأقل، وعمود تسميات وعمود قيم على الأقل
+            if len(row_lines) >= 3 and len(column_lines) >= 3:
+                grids.append(((x, y, w, h), row_lines, column_lines))
+        
+        return sorted(grids, key=lambda grid: (grid[0][1], grid[0][0]))
     
-    async def _extract_financial_data_from_text(self, text: str, extracted_data: Dict) -> None:
-        """استخراج البيانات المالية من النصوص"""
+    @staticmethod
+    def _line_positions(line_mask: np.ndarray, axis: int) -> List[int]:
+        """مراكز الخطوط التي تمتد على نصف عرض (أو ارتفاع) الجدول على الأقل"""
         
-        if not text:
-            return
+        coverage = np.count_nonzero(line_mask, axis=axis)
+        positions = np.flatnonzero(coverage >= 0.5 * line_mask.shape[axis])
+        if not len(positions):
+            return []
+        groups = np.split(positions, np.flatnonzero(np.diff(positions) > 1) + 1)
+        return [int(group.mean()) for group in groups]
+    
+    def _ocr_table_cells(self, gray: np.ndarray, grids: List) -> List[List[List[str]]]:
+        """OCR لخلايا الجداول: خلية بخلية على المحركات الدائمة، أو استدعاء واحد لكل جدول بدونها
         
-        # تنظيف النص
-        text = re.sub(r'\s+', ' ', text).strip()
+        بدون tesserocr كل استدعاء يشغل عملية tesseract جديدة، فتُقرأ كلمات الجدول كاملاً
+        مرة واحدة وتُوزع على الخلايا حسب مواقعها.
+        """
         
-        # البحث عن الأرقام والمبالغ المالية
-        financial_patterns = [
-            r'(\d{1,3}(?:,\d{3})*(?:\.\d{2})?)',  # أرقام مع فواصل
-            r'(\d+\.?\d*)',  # أرقام عادية
-        ]
+        if not grids:
+            return []
         
-        # استخراج بيانات قائمة المركز المالي
-        balance_sheet_keywords = {
-            'current_assets': ['الأصول المتداولة', 'Current Assets', 'أصول متداولة'],
-            'fixed_assets': ['الأصول الثابتة', 'Fixed Assets', 'أصول ثابتة'],
-            'total_assets': ['إجمالي الأصول', 'Total Assets', 'مجموع الأصول'],
-            'current_liabilities': ['الخصوم المتداولة', 'Current Liabilities', 'خصوم متداولة'],
-            'total_equity': ['حقوق المساهمين', 'Shareholders Equity', 'حقوق الملكية']
-        }
+        if self.ocr_pool.persistent:
+            tables = self._ocr_cells_individually(gray, grids)
+        else:
+            tables = [self._ocr_table_words(gray, grid) for grid in grids]
         
-        for key, keywords in balance_sheet_keywords.items():
-            value = self._extract_value_near_keywords(text, keywords)
-            if value:
-                extracted_data['balance_sheet'][key] = value
-        
-        # استخراج بيانات قائمة الدخل
-        income_keywords = {
-            'revenue': ['الإيرادات', 'Revenue', 'المبيعات', 'Sales'],
-            'gross_profit': ['مجمل الربح', 'Gross Profit', 'الربح الإجمالي'],
-            'operating_profit': ['الربح التشغيلي', 'Operating Profit', 'ربح العمليات'],
-            'net_income': ['صافي الربح', 'Net Income', 'الربح الصافي']
-        }
+        # عناوين أعمدة فريدة حتى يمكن تحويل الجدول إلى DataFrame
+        for table in tables:
+            seen = set()
+            for column, name in enumerate(table[0]):
+                if not name or name in seen:
+                    table[0][column] = f"{name or 'column'}_{column}"
+                seen.add(table[0][column])
         
-        for key, keywords in income_keywords.items():
-            value = self._extract_value_near_keywords(text, keywords)
-            if value:
-                extracted_data['income_statement'][key] = value
+        return tables
+    
+    def _ocr_cells_individually(self, gray: np.ndarray, grids: List) -> List[List[List[str]]]:
+        """OCR لكل خلية على حدة: نصي لصف العناوين وعمود التسميات ورقمي لبقية الخلايا"""
         
-        # استخراج بيانات التدفقات النقدية
-        cash_flow_keywords = {
-            'operating_cash_flow': ['التدفق النقدي التشغيلي', 'Operating Cash Flow'],
-            'investing_cash_flow': ['التدفق النقدي الاستثماري', 'Investing Cash Flow'],
-            'financing_cash_flow': ['التدفق النقدي التمويلي', 'Financing Cash Flow']
-        }
+        _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+        margin = 4
+        
+        tables = []
+        cells = []
+        for _, row_lines, column_lines in grids:
+            table = [[''] * (len(column_lines) - 1) for _ in range(len(row_lines) - 1)]
+            tables.append(table)
+            for row, (top, bottom) in enumerate(zip(row_lines, row_lines[1:])):
+                for column, (left, right) in enumerate(zip(column_lines, column_lines[1:])):
+                    top_edge, bottom_edge = top + margin, bottom - margin
+                    left_edge, right_edge = left + margin, right - margin
+                    if bottom_edge - top_edge < 8 or right_edge - left_edge < 8:
+                        continue
+                    # تجاهل الخلايا الفارغة دون تشغيل OCR
+                    if np.count_nonzero(binary[top_edge:bottom_edge, left_edge:right_edge]) < 10:
+                        continue
+                    crop = gray[top_edge:bottom_edge, left_edge:right_edge]
+                    cells.append((table, row, column, crop, row > 0 and column > 0))
         
-        for key, keywords in cash_flow_keywords.items():
-            value = self._extract_value_near_keywords(text, keywords)
-            if value:
-                extracted_data['cash_flow'][key] = value
+        with ThreadPoolExecutor(max_workers=self.ocr_tile_threads) as executor:
+            texts = executor.map(lambda cell: self._ocr_cell(cell[3], cell[4]), cells)
+            for (table, row, column, _, _), text in zip(cells, texts):
+                table[row][column] = text
+        
+        return tables
     
-    def _extract_value_near_keywords(self, text: str, keywords: List[str]) -> Optional[float]:
-        """استخراج القيمة العددية القريبة من الكلمات المفتاحية"""
+    def _ocr_cell(self, crop: np.ndarray, numeric: bool) -> str:
+        """OCR لخلية واحدة كسطر نصي (الخلايا الرقمية بقائمة أحرف رقمية فقط)"""
         
-        for keyword in keywords:
-            # البحث عن الكلمة المفتاحية
-            pattern = rf'{re.escape(keyword)}[:\s]*(\d{{1,3}}(?:,\d{{3}})*(?:\.\d{{2}})?)'
-            match = re.search(pattern, text, re.IGNORECASE)
-            
-            if match:
-                # تنظيف الرقم وتحويله
-                number_str = match.group(1).replace(',', '')
-                try:
-                    return float(number_str)
-                except ValueError:
-                    continue
+        padded = cv2.copyMakeBorder(crop, 10, 10, 10, 10, cv2.BORDER_CONSTANT, value=255)
+        text = self.ocr_pool.image_to_string(
+            Image.fromarray(padded), psm=7, whitelist=self.ocr_numeric_whitelist if numeric else None
+        )
+        return self._clean_cell_text(text, numeric)
+    
+    def _ocr_table_words(self, gray: np.ndarray, grid: Tuple) -> List[List[str]]:
+        """قراءة جدول كامل باستدعاء OCR واحد وتوزيع كلماته على الخلايا حسب مراكزها"""
         
-        return None
+        (x, y, w, h), row_lines, column_lines = grid
+        cells = [[[] for _ in column_lines[1:]] for _ in row_lines[1:]]
+        
+        for left, top, width, height, text in self.ocr_pool.words(Image.fromarray(gray[y:y + h, x:x + w]), psm=6):
+            row = int(np.searchsorted(row_lines, y + top + height / 2)) - 1
+            column = int(np.searchsorted(column_lines, x + left + width / 2)) - 1
+            if 0 <= row < len(cells) and 0 <= column < len(cells[row]):
+                cells[row][column].append(text)
+        
+        return [
+            [self._clean_cell_text(' '.join(words), row > 0 and column > 0) for column, words in enumerate(row_words)]
+            for row, row_words in enumerate(cells)
+        ]
+    
+    @staticmethod
+    def _clean_cell_text(text: str, numeric: bool) -> str:
+        """تنظيف نص الخلية: حدود الجدول المقروءة كأحرف، وفي الخلايا الرقمية فواصل الآلاف والأقواس"""
+        
+        text = text.strip().strip('|').strip()
+        if numeric:
+            # الأرقام السالبة بين أقواس كما في القوائم المالية
+            text = text.replace(' ', '').replace(',', '')
+            if len(text) > 2 and text.startswith('(') and text.endswith(')'):
+                text = '-' + text[1:-1]
+        return text
     
-    async def _extract_financial_data_from_tables(self, tables: List[List], extracted_data: Dict) -> None:
+    def _extract_financial_data_from_text(self, text: str, extracted_data: Dict) -> None:
+        """استخراج البيانات المالية من النصوص"""
+        
+        if not text:
+            return
+        
+        # تنظيف النص
+        text = re.sub(r'\s+', ' ', text).strip()
+        
+        # مسح واحد للنص لجميع الحقول ومرادفاتها
+        for statement_type, values in self.keyword_matcher.find_values(text).items():
+            extracted_data[statement_type].update(values)
+    
+    def _extract_financial_data_from_tables(self, tables: List[List], extracted_data: Dict) -> None:
         """استخراج البيانات المالية من الجداول"""
         
         for table in tables:
@@ -518,52 +1231,62 @@ class FinancialDataParser:
             # تحويل الجدول إلى DataFrame للمعالجة الأسهل
             try:
                 df = pd.DataFrame(table[1:], columns=table[0])
-                
-                # البحث عن أعمدة تحتوي على أرقام
-                numeric_columns = []
-                for col in df.columns:
-                    if df[col].dtype == 'object':
-                        # محاولة تحويل العمود إلى أرقام
-                        numeric_values = pd.to_numeric(df[col], errors='coerce')
-                        if not numeric_values.isna().all():
-                            numeric_columns.append(col)
-                
-                # استخراج البيانات بناءً على النصوص في العمود الأول
-                for _, row in df.iterrows():
-                    row_text = str(row.iloc[0]).lower()
-                    
-                    # البحث عن القيم العددية في الصف
-                    numeric_value = None
-                    for col in numeric_columns:
-                        try:
-                            val = pd.to_numeric(str(row[col]).replace(',', ''), errors='coerce')
-                            if not pd.isna(val) and val != 0:
-                                numeric_value = float(val)
-                                break
-                        except:
-                            continue
-                    
-                    if numeric_value is None:
-                        continue
-                    
-                    # تصنيف البيانات
-                    if any(keyword in row_text for keyword in ['أصول متداولة', 'current assets']):
-                        extracted_data['balance_sheet']['current_assets'] = numeric_value
-                    elif any(keyword in row_text for keyword in ['أصول ثابتة', 'fixed assets']):
-                        extracted_data['balance_sheet']['fixed_assets'] = numeric_value
-                    elif any(keyword in row_text for keyword in ['إجمالي الأصول', 'total assets']):
-                        extracted_data['balance_sheet']['total_assets'] = numeric_value
-                    elif any(keyword in row_text for keyword in ['إيرادات', 'revenue', 'مبيعات', 'sales']):
-                        extracted_data['income_statement']['revenue'] = numeric_value
-                    elif any(keyword in row_text for keyword in ['مجمل الربح', 'gross profit']):
-                        extracted_data['income_statement']['gross_profit'] = numeric_value
-                    elif any(keyword in row_text for keyword in ['صافي الربح', 'net income']):
-                        extracted_data['income_statement']['net_income'] = numeric_value
+                for (statement_type, field), value in self._map_table_rows(df).items():
+                    extracted_data[statement_type][field] = value
                         
             except Exception as e:
                 # تجاهل الأخطاء في جداول معينة والانتقال للجدول التالي
                 continue
     
+    @staticmethod
+    def _clean_numeric_column(column: pd.Series) -> np.ndarray:
+        """تحويل عمود نصي إلى أرقام: إزالة فواصل الآلاف و(123) تعني -123"""
+        
+        text = column.astype(str).str.strip().str.replace(',', '', regex=False)
+        text = text.str.replace(r'^\((.*)\)$', r'-\1', regex=True)
+        return pd.to_numeric(text, errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+    
+    def _map_table_rows(self, df: pd.DataFrame) -> Dict[Tuple[str, str], float]:
+        """ربط صفوف الجدول ببنود القوائم المالية بعمليات على مستوى الأعمدة
+        
+        لكل صف: أول قيمة رقمية غير صفرية في الأعمدة الرقمية، وأول تصنيف مطابق
+        لنص العمود الأول. الصفوف اللاحقة تستبدل القيم السابقة لنفس البند.
+        """
+        
+        if df.columns.duplicated().any():
+            raise ValueError("Duplicate table headers")
+        
+        # تنظيف الأعمدة النصية مرة واحدة (فواصل الآلاف والأقواس السالبة) قبل اكتشاف الأعمدة الرقمية
+        numeric_columns = []
+        for position in range(df.shape[1]):
+            column = df.iloc[:, position]
+            if column.dtype == 'object' or isinstance(column.dtype, pd.StringDtype):
+                cleaned = self._clean_numeric_column(column)
+                if not np.isnan(cleaned).all():
+                    numeric_columns.append(cleaned)
+        
+        if not numeric_columns or df.empty:
+            return {}
+        
+        # اختيار أول قيمة غير صفرية لكل صف
+        values = np.column_stack(numeric_columns)
+        valid = ~np.isnan(values) & (values != 0)
+        has_value = valid.any(axis=1)
+        row_values = values[np.arange(len(values)), valid.argmax(axis=1)]
+        
+        # تصنيف البيانات حسب نص العمود الأول (أول تصنيف مطابق)
+        labels = df.iloc[:, 0].astype(str).str.lower()
+        unmatched = has_value.copy()
+        mapped = {}
+        for statement_type, field, pattern in self._table_row_patterns:
+            matches = unmatched & labels.str.contains(pattern, regex=True, na=False).to_numpy(dtype=bool)
+            unmatched &= ~matches
+            if matches.any():
+                mapped[(statement_type, field)] = (np.flatnonzero(matches)[0], float(row_values[matches][-1]))
+        
+        # الحفاظ على ترتيب الإسناد حسب أول صف لكل بند كما في المعالجة صفاً بصف
+        return {key: value for key, (_, value) in sorted(mapped.items(), key=lambda item: item[1][0])}
+    
     async def _merge_financial_data(self, target_data: Dict, source_data: Dict) -> None:
         """دمج البيانات المالية من مصادر متعددة"""
         
@@ -695,4 +1418,84 @@ class FinancialDataParser:
         }
 
 # Global instance
-financial_parser = FinancialDataParser()
\ No newline at end of file
+financial_parser = FinancialDataParser()
+
+
+def _raise_deadline_exceeded(signum, frame) -> None:
+    raise WorkerDeadlineExceeded()
+
+
+def run_with_deadline(deadline: Optional[float], func, *args) -> Any:
+    """تشغيل مرحلة داخل العامل مع إيقافها عند المهلة المطلقة للملف (SIGALRM)"""
+    
+    if deadline is None or not hasattr(signal, 'setitimer'):
+        return func(*args)
+    remaining = deadline - time.time()
+    if remaining <= 0:
+        raise WorkerDeadlineExceeded()
+    
+    previous_handler = signal.signal(signal.SIGALRM, _raise_deadline_exceeded)
+    signal.setitimer(signal.ITIMER_REAL, remaining)
+    try:
+        return func(*args)
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous_handler)
+
+
+def parse_file_content(file_extension: str, file_path: str, result: Dict) -> Dict:
+    """نقطة دخول مجمع العمليات: معالجة محتوى ملف واحد داخل عملية العامل"""
+    return financial_parser._parse_file_content(file_extension, file_path, result)
+
+
+def probe_pdf_layout(file_path: str, probe_pages: int = 2) -> Dict[str, Any]:
+    """فحص سريع لأول صفحات PDF لتصنيفه: نصي، ممسوح ضوئياً أو مختلط"""
+    
+    with pdfplumber.open(file_path) as pdf:
+        page_count = len(pdf.pages)
+        probed = pdf.pages[:probe_pages]
+        text_pages = sum(len(page.chars) >= financial_parser.pdf_min_page_chars for page in probed)
+    
+    if text_pages == len(probed):
+        layout = "native"
+    elif text_pages == 0:
+        layout = "scanned"
+    else:
+        layout = "mixed"
+    return {"page_count": page_count, "layout": layout}
+
+
+def extract_pdf_pages(file_path: str, start: int, stop: int, layout: str = "native") -> Dict[str, Any]:
+    """استخراج نطاق من صفحات PDF مع بياناته المالية داخل عملية العامل
+    
+    الصفحات بلا طبقة نص (أو كل الصفحات في المستندات الممسوحة) تُقرأ بـ OCR.
+    تطابقات النص تُعاد مرتبة حسب الأولوية لتُدمج مع المقاطع الأخرى بالترتيب.
+    """
+    
+    page_results = []
+    with pdfplumber.open(file_path, pages=list(range(start + 1, stop + 1))) as pdf:
+        for page_number, page in enumerate(pdf.pages, start):
+            if layout == "scanned" or len(page.chars) < financial_parser.pdf_min_page_chars:
+                page_result = financial_parser._ocr_pdf_page(page, page_number)
+            else:
+                page_result = financial_parser._extract_pdf_page(page, page_number)
+            page_result["table_data"] = {"balance_sheet": {}, "income_statement": {}, "cash_flow": {}}
+            if page_result["tables"]:
+                financial_parser._extract_financial_data_from_tables(page_result["tables"], page_result["table_data"])
+            page_results.append(page_result)
+    
+    chunk_text = "".join(page_result["text"] + "\n" for page_result in page_results if page_result["text"])
+    return {
+        "pages": page_results,
+        "text_ranked": financial_parser.keyword_matcher.find_ranked(re.sub(r'\s+', ' ', chunk_text))
+    }
+
+
+def parse_pdf_without_pdfplumber(file_path: str, result: Dict) -> Dict:
+    """سلسلة PyPDF2 ثم camelot للملفات التي لا يفتحها pdfplumber"""
+    return financial_parser._process_pdf_file(file_path, result, try_pdfplumber=False)
+
+
+def warm_ocr_worker() -> None:
+    """مُهيئ عمليات العمال: تحميل محركات tesseract مرة واحدة عند بدء العملية"""
+    financial_parser.ocr_pool.warm()
@@ -0,0 +1,106 @@
+"""
+ذاكرة مؤقتة لنتائج تحليل الملفات المرفوعة حسب المحتوى
+Content-addressed cache for parsed uploads
+
+- المفتاح: SHA-256 لمحتوى الملف مع إصدار المحلل
+- الطبقة الأولى: LRU في الذاكرة محدود بالحجم المضغوط للنتائج
+- الطبقة الثانية (اختيارية): GridFS في MongoDB لمشاركة النتائج بين العمليات وإعادة التشغيل
+"""
+
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+import mmap
+import os
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def compute_file_key(file_path: str, parser_version: str) -> str:
+    """حساب مفتاح المحتوى من بصمة SHA-256 للملف (عبر mmap) وإصدار المحلل"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                digest.update(mapped)
+    return f"{digest.hexdigest()}:{parser_version}"
+
+
+def encode_payload(payload: Dict[str, Any]) -> bytes:
+    """ترميز النتيجة كـ JSON مضغوط"""
+    return gzip.compress(json.dumps(payload, ensure_ascii=False, default=str).encode('utf-8'))
+
+
+def decode_payload(data: bytes) -> Dict[str, Any]:
+    """فك ترميز JSON المضغوط"""
+    return json.loads(gzip.decompress(data).decode('utf-8'))
+
+
+class ParseResultCache:
+    """ذاكرة مؤقتة من طبقتين لنتائج تحليل الملفات"""
+
+    def __init__(self, max_bytes: Optional[int] = None, bucket_name: str = "parse_cache"):
+        self.max_bytes = max_bytes or int(os.environ.get('PARSE_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+        self.bucket_name = bucket_name
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._size = 0
+        self._bucket = None
+        self.stats = {"memory_hits": 0, "persistent_hits": 0, "misses": 0}
+
+    def attach(self, db) -> None:
+        """ربط GridFS كطبقة تخزين دائمة"""
+        from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+        self._bucket = AsyncIOMotorGridFSBucket(db, bucket_name=self.bucket_name)
+
+    def _remember(self, key: str, data: bytes) -> None:
+        """إضافة نتيجة مضغوطة مع إخراج الأقدم استخداماً حتى يعود الحجم تحت الحد"""
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._size -= len(previous)
+        # نتيجة أكبر من الحد كله تبقى في GridFS فقط
+        if len(data) > self.max_bytes:
+            return
+        self._entries[key] = data
+        self._size += len(data)
+        while self._size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= len(evicted)
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """جلب نتيجة محفوظة (نسخة مستقلة) أو None"""
+        data = self._entries.get(key)
+        if data is not None:
+            self._entries.move_to_end(key)
+            self.stats["memory_hits"] += 1
+            return await asyncio.to_thread(decode_payload, data)
+
+        if self._bucket is not None:
+            try:
+                cursor = self._bucket.find({"filename": key}, limit=1)
+                async for grid_out in cursor:
+                    data = await grid_out.read()
+                    self._remember(key, data)
+                    self.stats["persistent_hits"] += 1
+                    return await asyncio.to_thread(decode_payload, data)
+            except Exception as e:
+                logger.warning(f"Parse cache lookup failed for {key}: {e}")
+
+        self.stats["misses"] += 1
+        return None
+
+    async def put(self, key: str, payload: Dict[str, Any]) -> None:
+        """حفظ نتيجة في الذاكرة وفي GridFS إن كان متاحاً"""
+        data = await asyncio.to_thread(encode_payload, payload)
+        self._remember(key, data)
+
+        if self._bucket is not None:
+            try:
+                cursor = self._bucket.find({"filename": key}, limit=1)
+                if not await cursor.to_list(length=1):
+                    await self._bucket.upload_from_stream(key, data, metadata={"content_encoding": "gzip"})
+            except Exception as e:
+                logger.warning(f"Parse cache store failed for {key}: {e}")
@@ -4,6 +4,8 @@ from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import DuplicateKeyError, PyMongoError
 import os
 import logging
 import hashlib
@@ -26,7 +28,10 @@ import math
 from analysis_engine import FinancialAnalysisEngine
 from ocr_data_parser import financial_parser
 from ai_agents import ai_agents
-from comprehensive_financial_analyzer import ComprehensiveFinancialAnalyzer
+from comprehensive_financial_analyzer import run_comprehensive_analysis_job
+from financial_analysis_engine_170 import select_metrics
+from analysis_jobs import analysis_jobs, JobQueueFull, JOB_COMPLETED
+from file_artifacts import file_artifacts
 
 def make_json_safe(obj):
     """Recursively make an object JSON-safe by replacing inf and nan values"""
@@ -194,13 +199,37 @@ async def initialize_predefined_accounts():
     
     # إنشاء الحسابات إذا لم تكن موجودة
     for account in predefined_accounts:
-        existing_user = await db.users.find_one({"email": account["email"]})
+        existing_user = await db.users.find_one({"email": account["email"]}, {"_id": 1})
         if not existing_user:
             await db.users.insert_one(account)
             logger.info(f"Created predefined account: {account['email']}")
         else:
             logger.info(f"Predefined account already exists: {account['email']}")
 
+# فهارس الاستعلامات الأكثر استخداماً
+async def ensure_indexes():
+    """إنشاء فهارس MongoDB للاستعلامات الساخنة (آمن عند التكرار)"""
+    index_plan = [
+        ("users", [("email", ASCENDING)], {"unique": True, "name": "email_unique"}),
+        ("users", [("id", ASCENDING)], {"name": "id"}),
+        ("companies", [("user_id", ASCENDING)], {"name": "user_id"}),
+        ("analysis_results", [("user_id", ASCENDING), ("created_at", DESCENDING)], {"name": "user_id_created_at"}),
+        ("analysis_results", [("id", ASCENDING)], {"name": "id"}),
+        ("file_processing", [("user_email", ASCENDING), ("upload_date", DESCENDING)], {"name": "user_email_upload_date"}),
+        ("analysis_jobs", [("id", ASCENDING)], {"unique": True, "name": "id_unique"}),
+        ("analysis_jobs", [("owner", ASCENDING), ("created_at", DESCENDING)], {"name": "owner_created_at"}),
+        ("file_artifacts.files", [("metadata.artifact_key", ASCENDING)], {"name": "artifact_key"}),
+        ("market_data_cache", [("key", ASCENDING)], {"unique": True, "name": "key_unique"}),
+        ("market_data_cache", [("expires_at", ASCENDING)], {"expireAfterSeconds": 0, "name": "expires_at_ttl"}),
+    ]
+    
+    for collection_name, keys, options in index_plan:
+        try:
+            await db[collection_name].create_index(keys, **options)
+        except PyMongoError as e:
+            # مثلاً: بريد مكرر يمنع إنشاء الفهرس الفريد - يستمر التشغيل مع تسجيل المشكلة
+            logger.error(f"Failed to create index {options['name']} on {collection_name}: {e}")
+
 # Financial Analysis Functions
 def calculate_liquidity_ratios(balance_sheet: Dict, income_statement: Dict) -> Dict:
     """حساب نسب السيولة"""
@@ -306,7 +335,7 @@ async def get_industry_benchmarks(sector: str, comparison_level: str) -> Dict:
 @api_router.post("/auth/register")
 async def register_user(user_data: UserRegister):
     # Check if user exists
-    existing_user = await db.users.find_one({"email": user_data.email})
+    existing_user = await db.users.find_one({"email": user_data.email}, {"_id": 1})
     if existing_user:
         raise HTTPException(status_code=400, detail="User already exists")
     
@@ -316,7 +345,10 @@ async def register_user(user_data: UserRegister):
         user_type=user_data.user_type
     )
     
-    await db.users.insert_one(user.dict())
+    try:
+        await db.users.insert_one(user.dict())
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="User already exists")
     
     token = create_jwt_token(user.id, user.email, user.user_type)
     
@@ -332,7 +364,10 @@ async def register_user(user_data: UserRegister):
 
 @api_router.post("/auth/login")
 async def login_user(login_data: UserLogin):
-    user = await db.users.find_one({"email": login_data.email})
+    user = await db.users.find_one(
+        {"email": login_data.email},
+        {"_id": 1, "id": 1, "email": 1, "password_hash": 1, "user_type": 1, "subscription_status": 1}
+    )
     if not user or not verify_password(login_data.password, user["password_hash"]):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
@@ -635,6 +670,86 @@ async def get_analysis_types():
     
     return {"analysis_types": analysis_types}
 
+def validate_analysis_types(request: AnalysisRequest) -> None:
+    """رفض أنواع التحليل غير المعروفة قبل تشغيل أي حساب"""
+    try:
+        select_metrics(request.analysis_types)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+def build_comprehensive_data(request: AnalysisRequest) -> Dict[str, Any]:
+    """بناء البيانات الشاملة المطلوبة للمحلل الشامل من طلب التحليل"""
+    return {
+        "company_name": request.company_name,
+        "analysis_types": request.analysis_types,
+        "sector": request.sector,
+        "legal_entity": request.legal_entity,
+        "analysis_years": request.analysis_years,
+        "comparison_level": request.comparison_level,
+        
+        # البيانات المالية الشاملة
+        "current_assets": 5200000,
+        "cash": 1200000,
+        "marketable_securities": 500000,
+        "accounts_receivable": 1800000,
+        "inventory": 1400000,
+        "prepaid_expenses": 200000,
+        "other_current_assets": 100000,
+        
+        "total_assets": 13700000,
+        "current_liabilities": 2200000,
+        "accounts_payable": 900000,
+        "short_term_debt": 800000,
+        "total_liabilities": 5000000,
+        "shareholders_equity": 7500000,
+        "retained_earnings": 3200000,
+        
+        "revenue": 12000000,
+        "cost_of_revenue": 6800000,
+        "gross_profit": 5200000,
+        "operating_expenses": 2800000,
+        "operating_income": 2400000,
+        "interest_expense": 250000,
+        "income_before_tax": 2200000,
+        "income_tax": 550000,
+        "net_income": 1650000,
+        
+        "operating_cash_flow": 2200000,
+        "capital_expenditures": 800000,
+        "free_cash_flow": 1400000,
+        
+        "market_cap": 25000000,
+        "stock_price": 25.0,
+        "earnings_per_share": 1.65,
+        "shares": 1000000
+    }
+
+def build_analysis_response(comprehensive_results: Dict[str, Any], request: AnalysisRequest, user_email: str) -> Dict[str, Any]:
+    """إضافة معلومات الطلب والنظام لنتائج التحليل الشامل وتطبيق JSON safety"""
+    enhanced_response = {
+        **comprehensive_results,
+        "request_info": {
+            "company_name": request.company_name,
+            "language": request.language,
+            "sector": request.sector,
+            "legal_entity": request.legal_entity,
+            "comparison_level": request.comparison_level,
+            "analysis_years": request.analysis_years,
+            "user_email": user_email,
+            "analysis_timestamp": datetime.now().isoformat()
+        },
+        "system_info": {
+            "engine_version": "FinClick.AI v3.0 - النظام الثوري الشامل",
+            "analysis_count": "170+ تحليل مالي شامل كامل",
+            "processing_status": "مكتمل بنجاح",
+            "accuracy_level": "99.8%",
+            "performance": "أقل من ثانية واحدة",
+            "analysis_depth": "شامل ومتكامل حسب القالب المطلوب",
+            "quality_certification": "معتمد ومطابق للمعايير الدولية"
+        }
+    }
+    return make_json_safe(enhanced_response)
+
 @api_router.post("/analyze")
 async def analyze_financial_data(
     request: AnalysisRequest,
@@ -642,6 +757,8 @@ async def analyze_financial_data(
 ):
     """تحليل البيانات المالية الشامل - المحرك الثوري الجديد مع 170+ نوع تحليل"""
     
+    validate_analysis_types(request)
+    
     try:
         logger.info(f"🚀 بدء التحليل الثوري الجديد للمستخدم: {user_data.get('email')}, الشركة: {request.company_name}")
         
@@ -719,82 +836,13 @@ async def analyze_financial_data(
         logger.info("🔥 تشغيل النظام الشامل الثوري مع 170+ نوع تحليل مالي وفقاً للقالب المطلوب")
         
         # بيانات شاملة محسنة للنظام الجديد
-        comprehensive_data = {
-            "company_name": request.company_name,
-            "sector": request.sector,
-            "legal_entity": request.legal_entity,
-            "analysis_years": request.analysis_years,
-            "comparison_level": request.comparison_level,
-            
-            # البيانات المالية الشاملة
-            "current_assets": 5200000,
-            "cash": 1200000,
-            "marketable_securities": 500000,
-            "accounts_receivable": 1800000,
-            "inventory": 1400000,
-            "prepaid_expenses": 200000,
-            "other_current_assets": 100000,
-            
-            "total_assets": 13700000,
-            "current_liabilities": 2200000,
-            "accounts_payable": 900000,
-            "short_term_debt": 800000,
-            "total_liabilities": 5000000,
-            "shareholders_equity": 7500000,
-            "retained_earnings": 3200000,
-            
-            "revenue": 12000000,
-            "cost_of_revenue": 6800000,
-            "gross_profit": 5200000,
-            "operating_expenses": 2800000,
-            "operating_income": 2400000,
-            "interest_expense": 250000,
-            "income_before_tax": 2200000,
-            "income_tax": 550000,
-            "net_income": 1650000,
-            
-            "operating_cash_flow": 2200000,
-            "capital_expenditures": 800000,
-            "free_cash_flow": 1400000,
-            
-            "market_cap": 25000000,
-            "stock_price": 25.0,
-            "earnings_per_share": 1.65,
-            "shares": 1000000
-        }
+        comprehensive_data = build_comprehensive_data(request)
         
-        # إنشاء محلل شامل
-        comprehensive_analyzer = ComprehensiveFinancialAnalyzer(comprehensive_data)
-        
-        # تشغيل التحليل الشامل مع 170+ نوع تحليل
-        comprehensive_results = comprehensive_analyzer.run_comprehensive_analysis()
-        
-        # إضافة معلومات إضافية للاستجابة الشاملة
-        enhanced_response = {
-            **comprehensive_results,
-            "request_info": {
-                "company_name": request.company_name,
-                "language": request.language,
-                "sector": request.sector,
-                "legal_entity": request.legal_entity,
-                "comparison_level": request.comparison_level,
-                "analysis_years": request.analysis_years,
-                "user_email": user_data.get('email'),
-                "analysis_timestamp": datetime.now().isoformat()
-            },
-            "system_info": {
-                "engine_version": "FinClick.AI v3.0 - النظام الثوري الشامل",
-                "analysis_count": "170+ تحليل مالي شامل كامل",
-                "processing_status": "مكتمل بنجاح",
-                "accuracy_level": "99.8%",
-                "performance": "أقل من ثانية واحدة",
-                "analysis_depth": "شامل ومتكامل حسب القالب المطلوب",
-                "quality_certification": "معتمد ومطابق للمعايير الدولية"
-            }
-        }
+        # تشغيل التحليل الشامل مع 170+ نوع تحليل على مجمع العمليات دون حجز حلقة الأحداث
+        comprehensive_results = await analysis_jobs.run(run_comprehensive_analysis_job, comprehensive_data)
         
-        # تطبيق JSON safety على الاستجابة الكاملة
-        safe_response = make_json_safe(enhanced_response)
+        # إضافة معلومات إضافية للاستجابة الشاملة وتطبيق JSON safety
+        safe_response = build_analysis_response(comprehensive_results, request, user_data.get('email'))
         
         logger.info(f"✅ اكتمل التحليل الثوري بنجاح - 170+ تحليل مالي لشركة: {request.company_name}")
         return safe_response
@@ -806,6 +854,52 @@ async def analyze_financial_data(
             detail=f"خطأ في التحليل المالي: {str(e)}"
         )
 
+@api_router.post("/jobs/analyze")
+async def submit_analysis_job(
+    request: AnalysisRequest,
+    user_data = Depends(get_current_user)
+):
+    """إرسال تحليل شامل كمهمة في الخلفية وإرجاع معرّف المهمة فوراً"""
+    
+    validate_analysis_types(request)
+    
+    user_email = user_data.get('email')
+    try:
+        job_id = await analysis_jobs.submit(
+            user_email,
+            "comprehensive_analysis",
+            run_comprehensive_analysis_job,
+            build_comprehensive_data(request),
+            finalize=lambda results: build_analysis_response(results, request, user_email),
+            metadata={"company_name": request.company_name, "language": request.language}
+        )
+    except JobQueueFull:
+        raise HTTPException(status_code=503, detail="عدد المهام قيد التنفيذ وصل للحد الأقصى، حاول لاحقاً")
+    logger.info(f"📥 تم إرسال مهمة تحليل {job_id} للمستخدم: {user_email}")
+    
+    return {"job_id": job_id, "status": "queued"}
+
+@api_router.get("/jobs/{job_id}")
+async def get_analysis_job_status(job_id: str, user_data = Depends(get_current_user)):
+    """الاستعلام عن حالة مهمة التحليل"""
+    job = await analysis_jobs.get_job(job_id, user_data.get('email'))
+    if not job:
+        raise HTTPException(status_code=404, detail="المهمة غير موجودة")
+    return job
+
+@api_router.get("/jobs/{job_id}/result")
+async def get_analysis_job_result(job_id: str, user_data = Depends(get_current_user)):
+    """جلب نتيجة مهمة التحليل بعد اكتمالها"""
+    job = await analysis_jobs.get_job(job_id, user_data.get('email'), include_result=True)
+    if not job:
+        raise HTTPException(status_code=404, detail="المهمة غير موجودة")
+    if job["status"] != JOB_COMPLETED:
+        raise HTTPException(
+            status_code=409,
+            detail={"status": job["status"], "error": job.get("error")}
+        )
+    return job["result"]
+
 @api_router.post("/analyze-with-files")
 async def analyze_with_uploaded_files(
     request: AnalysisRequest,
@@ -884,11 +978,23 @@ async def get_analysis_history(user_data = Depends(get_current_user)):
     """جلب تاريخ التحليلات"""
     analyses = await db.analysis_results.find(
         {"user_id": user_data["user_id"]},
-        {"_id": 0}  # Exclude the _id field to avoid ObjectId serialization issues
+        {"_id": 0, "id": 1, "company_name": 1, "created_at": 1}  # ملخص فقط - التفاصيل عبر /analysis-history/{id}
     ).sort("created_at", -1).to_list(100)
     
     return analyses
 
+@api_router.get("/analysis-history/{analysis_id}")
+async def get_analysis_details(analysis_id: str, user_data = Depends(get_current_user)):
+    """جلب تحليل محفوظ كاملاً"""
+    analysis = await db.analysis_results.find_one(
+        {"id": analysis_id, "user_id": user_data["user_id"]},
+        {"_id": 0}
+    )
+    if not analysis:
+        raise HTTPException(status_code=404, detail="Analysis not found")
+    
+    return analysis
+
 @api_router.post("/upload-financial-files")
 async def upload_financial_files(
     files: List[UploadFile] = File(...),
@@ -912,20 +1018,21 @@ async def upload_financial_files(
         # معالجة الملفات باستخدام نظام OCR
         processing_results = await financial_parser.process_uploaded_files(files, company_name)
         
-        # حفظ النتائج في قاعدة البيانات
+        # حفظ النتائج في قاعدة البيانات (النص الخام والجداول تُنقل إلى GridFS)
         file_processing_record = {
             "user_email": current_user["email"],
             "company_name": company_name,
-            "processing_results": processing_results,
+            "processing_results": await file_artifacts.externalize(current_user["email"], processing_results),
             "upload_date": datetime.utcnow(),
             "status": "completed"
         }
         
-        await db["file_processing"].insert_one(file_processing_record)
+        insert_result = await db["file_processing"].insert_one(file_processing_record)
         
         return {
             "status": "success",
             "message": "Files processed successfully",
+            "processing_id": str(insert_result.inserted_id),
             "processing_summary": processing_results["processing_summary"],
             "extracted_data": processing_results["extracted_data"],
             "company_name": company_name,
@@ -958,7 +1065,13 @@ async def get_file_processing_history(
     
     try:
         history = await db["file_processing"].find(
-            {"user_email": current_user["email"]}
+            {"user_email": current_user["email"]},
+            {
+                "company_name": 1,
+                "upload_date": 1,
+                "status": 1,
+                "processing_results.processing_summary": 1
+            }
         ).sort("upload_date", -1).limit(limit).to_list(None)
         
         # تنسيق النتائج
@@ -984,6 +1097,23 @@ async def get_file_processing_history(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@api_router.get("/file-artifacts/{artifact_id}")
+async def get_file_artifacts(
+    artifact_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """استرجاع النص الخام والجداول المستخرجة لملف مرفوع"""
+    
+    artifacts = await file_artifacts.load(artifact_id, current_user["email"])
+    if artifacts is None:
+        raise HTTPException(status_code=404, detail="Artifacts not found")
+    
+    return {
+        "status": "success",
+        "artifact_id": artifact_id,
+        **artifacts
+    }
+
 @api_router.get("/ai-agents-status")
 async def get_ai_agents_status():
     """الحصول على حالة وكلاء الذكاء الاصطناعي"""
@@ -1273,7 +1403,14 @@ app.add_middleware(
 async def startup_event():
     """تهيئة النظام عند بدء التشغيل"""
     logger.info("Starting FinClick.AI system initialization...")
+    await ensure_indexes()
     await initialize_predefined_accounts()
+    analysis_jobs.start(db["analysis_jobs"])
+    await analysis_jobs.fail_interrupted_jobs()
+    financial_parser.result_cache.attach(db)
+    file_artifacts.attach(db)
+    await ai_agents.initialize_session()
+    ai_agents.market_cache.attach(db["market_data_cache"])
     logger.info("System initialization completed successfully")
 
 # Configure logging
@@ -1285,4 +1422,7 @@ logger = logging.getLogger(__name__)
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await analysis_jobs.shutdown()
+    financial_parser.shutdown()
+    await ai_agents.close_session()
     client.close()
\ No newline at end of file
@@ -0,0 +1,136 @@
+"""
+مجمع محركات tesseract الدائمة
+Persistent tesseract engine pool for OCR
+
+- عند توفر tesserocr: محركات PyTessBaseAPI تبقى نماذج اللغة محملة فيها بين الاستدعاءات
+- بدون tesserocr: الرجوع إلى pytesseract (عملية tesseract لكل استدعاء)
+- كل محرك يستخدمه خيط واحد في كل مرة عبر طابور
+- المحركات تُنشأ عند الحاجة حتى حد أقصى لكل عملية وتُحرر عند خروجها
+- الواجهتان تستخدمان محرك LSTM فقط حتى تتطابق النتائج
+"""
+
+import logging
+import multiprocessing.util
+import os
+import queue
+import threading
+from typing import List, Optional, Tuple
+
+import pytesseract
+from PIL import Image
+
+try:
+    import tesserocr
+except ImportError:  # tesserocr اختياري
+    tesserocr = None
+
+logger = logging.getLogger(__name__)
+
+# وضع المحرك الموحد للواجهتين (1 = LSTM فقط، يطابق tesserocr.OEM.LSTM_ONLY)
+TESSERACT_OEM = 1
+
+
+def _end_handles(handles: "queue.Queue") -> None:
+    """إنهاء المحركات المتاحة في الطابور"""
+    while True:
+        try:
+            handle = handles.get_nowait()
+        except queue.Empty:
+            return
+        try:
+            handle.End()
+        except Exception as e:
+            logger.warning(f"Releasing tesseract engine failed: {e}")
+
+
+class TesseractWorkerPool:
+    """طابور من محركات tesseract المحملة مسبقاً تتقاسمها خيوط OCR في العملية"""
+
+    def __init__(self, size: int = 2, lang: str = 'ara+eng'):
+        self.size = max(1, size)
+        self.lang = lang
+        self._handles: "queue.Queue" = queue.Queue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self.persistent = tesserocr is not None
+
+        # Finalize يعمل عند جمع المجمع وعند خروج العملية، بما فيها عمليات مجمع
+        # العمليات التي تنتهي بـ os._exit دون تشغيل معالجات atexit
+        self._finalizer = multiprocessing.util.Finalize(
+            self, _end_handles, args=(self._handles,), exitpriority=10
+        )
+
+    def _create_handle(self):
+        return tesserocr.PyTessBaseAPI(lang=self.lang, oem=TESSERACT_OEM)
+
+    def _acquire(self):
+        """أخذ محرك متاح أو إنشاء محرك جديد ما دام العدد أقل من الحد"""
+        with self._lock:
+            if self._handles.empty() and self._created < self.size:
+                self._created += 1
+                return self._create_handle()
+        return self._handles.get()
+
+    def warm(self, count: int = 1) -> None:
+        """تحميل عدد محدود من المحركات مسبقاً (يُستدعى عند بدء عملية العامل)
+        
+        البقية تُنشأ عند أول حاجة فعلية حتى لا تحجز كل عملية ذاكرة نماذج لا تستخدمها.
+        """
+        if not self.persistent:
+            return
+        with self._lock:
+            while self._created < min(count, self.size):
+                self._handles.put(self._create_handle())
+                self._created += 1
+        logger.info(f"Tesseract pool warmed with {self._created}/{self.size} engines ({self.lang})")
+
+    def image_to_string(self, image: Image, psm: int = 6, whitelist: Optional[str] = None) -> str:
+        """التعرف على النص في صورة بنمط تقسيم الصفحة وقائمة الأحرف المحددة"""
+
+        if not self.persistent:
+            config = f'--oem {TESSERACT_OEM} --psm {psm} -l {self.lang}'
+            if whitelist:
+                config += f' -c tessedit_char_whitelist={whitelist}'
+            return pytesseract.image_to_string(image, config=config)
+
+        handle = self._acquire()
+        try:
+            handle.SetPageSegMode(psm)
+            handle.SetVariable('tessedit_char_whitelist', whitelist or '')
+            handle.SetImage(image)
+            return handle.GetUTF8Text()
+        finally:
+            self._handles.put(handle)
+
+    def words(self, image: Image, psm: int = 6) -> List[Tuple[int, int, int, int, str]]:
+        """الكلمات ومستطيلاتها (left, top, width, height, text) في استدعاء tesseract واحد
+
+        يُستخدم لقراءة جدول كامل دفعة واحدة عندما لا تتوفر محركات دائمة.
+        """
+
+        data = pytesseract.image_to_data(
+            image, config=f'--oem {TESSERACT_OEM} --psm {psm} -l {self.lang}',
+            output_type=pytesseract.Output.DICT
+        )
+        return [
+            (left, top, width, height, text.strip())
+            for left, top, width, height, text in zip(
+                data['left'], data['top'], data['width'], data['height'], data['text']
+            )
+            if text and text.strip()
+        ]
+
+    def close(self) -> None:
+        """تحرير المحركات المحملة (يُستدعى تلقائياً عند خروج العملية)"""
+        with self._lock:
+            _end_handles(self._handles)
+            self._created = 0
+
+
+def create_tesseract_pool() -> TesseractWorkerPool:
+    """إنشاء مجمع المحركات من إعدادات البيئة"""
+    # خيوط المربعات الزائدة عن عدد المحركات تنتظر في الطابور
+    return TesseractWorkerPool(
+        size=min(int(os.environ.get('OCR_TILE_THREADS', 4)), int(os.environ.get('OCR_ENGINES_PER_WORKER', 2))),
+        lang=os.environ.get('OCR_LANGUAGES', 'ara+eng')
+    )
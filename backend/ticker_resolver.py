@@ -0,0 +1,305 @@
+"""
+تحديد رمز السهم من اسم الشركة عبر فهرس مبني مسبقاً
+Indexed fuzzy company-name to ticker resolver
+
+- تطبيع الأسماء العربية والعبرية والإنجليزية (التشكيل، أشكال الألف، الحروف النهائية العبرية، اللواحق القانونية)
+- فهرس مقلوب للمقاطع الثلاثية (trigrams) محفوظ كمصفوفات numpy تُحمّل عبر mmap
+- البحث باستخدام searchsorted وترتيب المرشحين بمعامل Dice
+- التعرف على لواحق البورصات (مثل POLI.TA) وتفضيل البورصة المطلوبة
+- عند تساوي الدرجات: البورصة المطلوبة، ثم البورصة الافتراضية، ثم الرمز أبجدياً
+
+بناء الفهرس مرة واحدة من ملف القوائم:
+    python ticker_resolver.py build listings.csv /data/ticker_index
+حيث يحتوي الملف على الأعمدة symbol, name, exchange (صف لكل اسم بديل للشركة)
+"""
+
+import argparse
+import json
+import logging
+import os
+import re
+import unicodedata
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION = 1
+
+# لواحق Yahoo Finance لكل بورصة
+EXCHANGE_SUFFIXES = {
+    "TASE": ".TA",
+    "TADAWUL": ".SR",
+    "ADX": ".AD",
+    "DFM": ".AE",
+    "QSE": ".QA",
+    "BK": ".KW",
+    "EGX": ".CA",
+    "LSE": ".L",
+    "NASDAQ": "",
+    "NYSE": ""
+}
+SUFFIX_EXCHANGES = {suffix: exchange for exchange, suffix in EXCHANGE_SUFFIXES.items() if suffix}
+
+# كلمات لا تميّز الشركة (صيغ قانونية)
+LEGAL_WORDS = {
+    "inc", "incorporated", "corp", "corporation", "co", "company", "ltd", "limited", "plc", "llc",
+    "sa", "ag", "nv", "group", "holding", "holdings", "the",
+    "شركه", "ش", "م", "ع", "مساهمه", "عامه", "محدوده", "القابضه", "مجموعه",
+    "בעמ", "חברת", "חברה"
+}
+
+ARABIC_DIACRITICS = re.compile('[\u0610-\u061A\u064B-\u065F\u0670\u06D6-\u06ED\u0640]')
+HEBREW_POINTS = re.compile('[\u0591-\u05C7]')
+NON_WORD = re.compile(r'[^\w\s]|_')
+ARABIC_LETTER_MAP = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ى': 'ي', 'ئ': 'ي', 'ؤ': 'و', 'ة': 'ه'
+})
+HEBREW_FINAL_MAP = str.maketrans({'ך': 'כ', 'ם': 'מ', 'ן': 'נ', 'ף': 'פ', 'ץ': 'צ'})
+
+
+def normalize_name(text: str) -> str:
+    """تطبيع اسم الشركة للمطابقة بغض النظر عن اللغة والتشكيل والصيغة القانونية"""
+    text = unicodedata.normalize('NFKC', text or '').casefold()
+    text = ARABIC_DIACRITICS.sub('', text)
+    text = HEBREW_POINTS.sub('', text)
+    text = text.replace('"', '').replace('״', '').replace("'", '')  # בע"מ -> בעמ
+    text = text.translate(ARABIC_LETTER_MAP).translate(HEBREW_FINAL_MAP)
+    tokens = NON_WORD.sub(' ', text).split()
+    meaningful = [token for token in tokens if token not in LEGAL_WORDS] or tokens
+    # "ال" التعريف لا تميّز الاسم
+    return ' '.join(token[2:] if token.startswith('ال') and len(token) > 4 else token for token in meaningful)
+
+
+def encode_trigrams(normalized: str) -> np.ndarray:
+    """المقاطع الثلاثية الفريدة كأعداد صحيحة مرتبة (ثلاث نقاط ترميز في 63 بت)"""
+    padded = f"  {normalized} "
+    grams = {
+        (ord(padded[i]) << 42) | (ord(padded[i + 1]) << 21) | ord(padded[i + 2])
+        for i in range(len(padded) - 2)
+    }
+    return np.array(sorted(grams), dtype=np.int64)
+
+
+def split_symbol(symbol: str):
+    """فصل الرمز الأساسي عن لاحقة البورصة: POLI.TA -> (POLI, TASE)"""
+    symbol = symbol.strip().upper()
+    base, dot, suffix = symbol.rpartition('.')
+    if dot and f".{suffix}" in SUFFIX_EXCHANGES:
+        return base, SUFFIX_EXCHANGES[f".{suffix}"]
+    return symbol, None
+
+
+def build_ticker_index(listings_path: str, index_dir: str) -> Dict[str, int]:
+    """بناء الفهرس من ملف القوائم (CSV) وحفظه كمصفوفات numpy"""
+    listings = pd.read_csv(listings_path, dtype=str).fillna('')
+    if 'exchange' not in listings:
+        listings['exchange'] = ''
+
+    # جدول الإصدارات الفريدة (رمز + بورصة) وصف لكل اسم بديل
+    listings['exchange'] = listings['exchange'].str.upper().str.strip()
+    listings['symbol'] = listings['symbol'].str.upper().str.strip()
+    listings = listings[(listings['symbol'] != '') & (listings['name'].str.strip() != '')]
+    issuers = listings.drop_duplicates(['symbol', 'exchange'])[['symbol', 'name', 'exchange']].reset_index(drop=True)
+    issuer_ids = pd.MultiIndex.from_frame(issuers[['symbol', 'exchange']]).get_indexer(
+        pd.MultiIndex.from_frame(listings[['symbol', 'exchange']])
+    )
+
+    entry_issuer, entry_gram_count, postings = [], [], {}
+    for issuer_id, name in zip(issuer_ids, listings['name']):
+        normalized = normalize_name(name)
+        if not normalized:
+            continue
+        grams = encode_trigrams(normalized)
+        entry_id = len(entry_issuer)
+        entry_issuer.append(issuer_id)
+        entry_gram_count.append(len(grams))
+        for gram in grams.tolist():
+            postings.setdefault(gram, []).append(entry_id)
+
+    gram_keys = np.array(sorted(postings), dtype=np.int64)
+    gram_lengths = np.array([len(postings[gram]) for gram in gram_keys.tolist()], dtype=np.int64)
+    gram_offsets = np.concatenate([[0], np.cumsum(gram_lengths)]).astype(np.int64)
+    gram_postings = np.fromiter(
+        (entry for gram in gram_keys.tolist() for entry in postings[gram]),
+        dtype=np.int32, count=int(gram_offsets[-1])
+    )
+
+    # رموز الإصدارات الأساسية (بدون لاحقة) مرتبة للبحث المباشر بالرمز
+    base_symbols = np.array([split_symbol(symbol)[0] for symbol in issuers['symbol']])
+    symbol_order = np.argsort(base_symbols, kind='stable').astype(np.int32)
+
+    os.makedirs(index_dir, exist_ok=True)
+    arrays = {
+        "gram_keys": gram_keys,
+        "gram_offsets": gram_offsets,
+        "gram_postings": gram_postings,
+        "entry_issuer": np.array(entry_issuer, dtype=np.int32),
+        "entry_gram_count": np.array(entry_gram_count, dtype=np.int32),
+        "issuer_symbols": issuers['symbol'].to_numpy(dtype=str),
+        "issuer_names": issuers['name'].to_numpy(dtype=str),
+        "issuer_exchanges": issuers['exchange'].to_numpy(dtype=str),
+        "sorted_base_symbols": base_symbols[symbol_order],
+        "symbol_order": symbol_order
+    }
+    for name, array in arrays.items():
+        np.save(os.path.join(index_dir, f"{name}.npy"), array)
+
+    stats = {"version": INDEX_VERSION, "issuers": len(issuers), "entries": len(entry_issuer), "trigrams": len(gram_keys)}
+    with open(os.path.join(index_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(stats, f)
+    logger.info(f"Ticker index built: {stats}")
+    return stats
+
+
+class TickerResolver:
+    """البحث في فهرس الرموز المحمّل عبر mmap"""
+
+    def __init__(self, index_dir: str, default_exchange: Optional[str] = None):
+        # البورصة المعتمدة عند تساوي المرشحين دون بورصة مطلوبة (مثل TEVA في TASE وNYSE)
+        self.default_exchange = (default_exchange or os.environ.get('TICKER_DEFAULT_EXCHANGE', 'TASE')).upper()
+        with open(os.path.join(index_dir, "meta.json"), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        if self.meta.get("version") != INDEX_VERSION:
+            raise ValueError(f"Unsupported ticker index version: {self.meta.get('version')}")
+
+        def load(name: str) -> np.ndarray:
+            # عرض ndarray عادي فوق الملف المربوط (يتجنب كلفة فهرسة np.memmap دون نسخ البيانات)
+            return np.asarray(np.load(os.path.join(index_dir, f"{name}.npy"), mmap_mode='r'))
+
+        self.gram_keys = load("gram_keys")
+        self.gram_offsets = load("gram_offsets")
+        self.gram_postings = load("gram_postings")
+        self.entry_issuer = load("entry_issuer")
+        self.entry_gram_count = load("entry_gram_count")
+        self.issuer_symbols = load("issuer_symbols")
+        self.issuer_names = load("issuer_names")
+        self.issuer_exchanges = load("issuer_exchanges")
+        self.sorted_base_symbols = load("sorted_base_symbols")
+        self.symbol_order = load("symbol_order")
+
+    def _candidate(self, issuer_id: int, score: float) -> Dict:
+        return {
+            "symbol": str(self.issuer_symbols[issuer_id]),
+            "name": str(self.issuer_names[issuer_id]),
+            "exchange": str(self.issuer_exchanges[issuer_id]),
+            "score": round(float(score), 4)
+        }
+
+    def _symbol_matches(self, query: str) -> List[int]:
+        """الإصدارات التي يطابق رمزها الأساسي الاستعلام (مثل TEVA أو POLI.TA)"""
+        base, _ = split_symbol(query)
+        left = np.searchsorted(self.sorted_base_symbols, base, side='left')
+        right = np.searchsorted(self.sorted_base_symbols, base, side='right')
+        return [int(self.symbol_order[position]) for position in range(left, right)]
+
+    def resolve(self, query: str, limit: int = 5, exchange: Optional[str] = None) -> List[Dict]:
+        """المرشحون مرتبين حسب التشابه (1.0 = تطابق تام أو تطابق الرمز)"""
+        _, suffix_exchange = split_symbol(query)
+        preferred_exchange = (exchange or suffix_exchange or '').upper()
+        scores: Dict[int, float] = {}
+
+        # تطابق مباشر مع الرمز
+        if len(query.strip()) <= 12 and ' ' not in query.strip():
+            for issuer_id in self._symbol_matches(query):
+                scores[issuer_id] = 1.0
+
+        normalized = normalize_name(query)
+        if normalized:
+            query_grams = encode_trigrams(normalized)
+            positions = np.searchsorted(self.gram_keys, query_grams)
+            in_range = positions < len(self.gram_keys)
+            positions, query_present = positions[in_range], query_grams[in_range]
+            positions = positions[self.gram_keys[positions] == query_present]
+
+            if len(positions):
+                # جمع قوائم الإدخالات لكل المقاطع دفعة واحدة (بدون حلقة على المقاطع)
+                starts = self.gram_offsets[positions]
+                lengths = self.gram_offsets[positions + 1] - starts
+                gather = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+                entry_ids, shared = np.unique(self.gram_postings[gather], return_counts=True)
+                # متوسط معامل Dice ونسبة تغطية مقاطع الاستعلام (حتى لا تُظلم الأسماء المختصرة)
+                dice = 2.0 * shared / (len(query_grams) + self.entry_gram_count[entry_ids])
+                similarity = (dice + shared / len(query_grams)) / 2.0
+                top = np.argpartition(-similarity, min(limit * 4, len(similarity)) - 1)[:limit * 4]
+                for entry_id, score in zip(entry_ids[top], similarity[top]):
+                    issuer_id = int(self.entry_issuer[entry_id])
+                    scores[issuer_id] = max(scores.get(issuer_id, 0.0), float(score))
+
+        if preferred_exchange:
+            # تفضيل البورصة المطلوبة عند تساوي الأسماء تقريباً
+            scores = {
+                issuer_id: score + (0.05 if self.issuer_exchanges[issuer_id] == preferred_exchange else 0.0)
+                for issuer_id, score in scores.items()
+            }
+
+        # ترتيب ثابت عند التساوي: البورصة المطلوبة ثم الافتراضية ثم الرمز
+        def rank(item):
+            issuer_id, score = item
+            exchange_code = self.issuer_exchanges[issuer_id]
+            exchange_rank = 0 if exchange_code == preferred_exchange else 1 if exchange_code == self.default_exchange else 2
+            return -round(score, 6), exchange_rank, str(self.issuer_symbols[issuer_id]), issuer_id
+
+        ranked = sorted(scores.items(), key=rank)[:limit]
+        return [self._candidate(issuer_id, min(score, 1.0)) for issuer_id, score in ranked]
+
+    def best_match(self, query: str, min_score: float = 0.5, exchange: Optional[str] = None) -> Optional[str]:
+        """أفضل رمز بصيغة Yahoo Finance (مع لاحقة البورصة) أو None"""
+        candidates = self.resolve(query, limit=1, exchange=exchange)
+        if not candidates or candidates[0]["score"] < min_score:
+            return None
+        symbol, exchange_code = candidates[0]["symbol"], candidates[0]["exchange"]
+        suffix = EXCHANGE_SUFFIXES.get(exchange_code, '')
+        if suffix and not symbol.endswith(suffix):
+            symbol += suffix
+        return symbol
+
+
+def load_ticker_resolver(index_dir: Optional[str] = None) -> Optional[TickerResolver]:
+    """تحميل الفهرس من TICKER_INDEX_DIR (None إن لم يُضبط أو تعذر التحميل)"""
+    index_dir = index_dir or os.environ.get('TICKER_INDEX_DIR')
+    if not index_dir:
+        return None
+    try:
+        resolver = TickerResolver(index_dir)
+        logger.info(f"Ticker index loaded from {index_dir}: {resolver.meta}")
+        return resolver
+    except Exception as e:
+        logger.warning(f"Ticker index unavailable at {index_dir}: {e}")
+        return None
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """أوامر الإدارة: بناء الفهرس من ملف القوائم أو تجربة البحث فيه"""
+    parser = argparse.ArgumentParser(description="Company-name to ticker index")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser("build", help="build the index from a listings CSV (symbol, name, exchange)")
+    build.add_argument("listings_path")
+    build.add_argument("index_dir")
+
+    lookup = commands.add_parser("resolve", help="look up company names in a built index")
+    lookup.add_argument("index_dir")
+    lookup.add_argument("queries", nargs="+")
+    lookup.add_argument("--exchange")
+    lookup.add_argument("--limit", type=int, default=5)
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    if args.command == "build":
+        print(json.dumps(build_ticker_index(args.listings_path, args.index_dir)))
+    else:
+        resolver = TickerResolver(args.index_dir)
+        for query in args.queries:
+            print(json.dumps({
+                "query": query,
+                "best_match": resolver.best_match(query, exchange=args.exchange),
+                "candidates": resolver.resolve(query, limit=args.limit, exchange=args.exchange)
+            }, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,384 @@
+import asyncio
+import copy
+import importlib
+import inspect
+import itertools
+import os
+import sys
+import types
+from types import SimpleNamespace
+
+import pytest
+
+# وحدات الخادم موجودة في backend/ كوحدات مستقلة (بدون حزمة)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend'))
+
+
+def _ensure_module(name, **attributes):
+    """وحدة بديلة للاعتماديات الشبكية غير المثبتة في بيئة الاختبار فقط"""
+    try:
+        importlib.import_module(name)
+    except ImportError:
+        module = types.ModuleType(name)
+        module.__dict__.update(attributes)
+        sys.modules[name] = module
+
+
+class StubClientSession:
+    """جلسة aiohttp بديلة تسجل الإغلاق فقط"""
+
+    instances = []
+
+    def __init__(self, **options):
+        self.options = options
+        self.closed = False
+        StubClientSession.instances.append(self)
+
+    async def close(self):
+        self.closed = True
+
+
+# الاختبارات تستخدم الوضع غير المتصل ومزود البيانات الثابتة فقط
+_ensure_module("aiohttp", ClientSession=StubClientSession, TCPConnector=dict, ClientTimeout=dict)
+_ensure_module("alpha_vantage")
+_ensure_module("alpha_vantage.timeseries", TimeSeries=object)
+_ensure_module("alpha_vantage.fundamentaldata", FundamentalData=object)
+_ensure_module("yfinance")
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_pyfunc_call(pyfuncitem):
+    """تشغيل دوال الاختبار غير المتزامنة في حلقة أحداث جديدة لكل اختبار"""
+    if not inspect.iscoroutinefunction(pyfuncitem.obj):
+        return None
+    arguments = {name: pyfuncitem.funcargs[name] for name in pyfuncitem._fixtureinfo.argnames}
+    asyncio.run(pyfuncitem.obj(**arguments))
+    return True
+
+
+# ---------------------------------------------------------------------------
+# MongoDB وهمية في الذاكرة بالقدر الذي تستخدمه وحدات الخادم
+# ---------------------------------------------------------------------------
+
+class DuplicateKeyError(Exception):
+    """بديل pymongo.errors.DuplicateKeyError عند عدم تثبيت pymongo"""
+
+
+try:
+    from pymongo.errors import DuplicateKeyError  # noqa: F811
+except ImportError:
+    pass
+
+
+_MISSING = object()
+
+
+def _get_path(document, path):
+    value = document
+    for part in path.split('.'):
+        if not isinstance(value, dict) or part not in value:
+            return _MISSING
+        value = value[part]
+    return value
+
+
+def _set_path(document, path, value):
+    *parents, last = path.split('.')
+    for part in parents:
+        document = document.setdefault(part, {})
+    document[last] = value
+
+
+def _compare(value, condition):
+    if isinstance(condition, dict) and condition and all(key.startswith('$') for key in condition):
+        for operator, operand in condition.items():
+            if operator == '$in':
+                if not any(_compare(value, item) for item in operand):
+                    return False
+            elif operator == '$nin':
+                if any(_compare(value, item) for item in operand):
+                    return False
+            elif operator == '$ne':
+                if _compare(value, operand):
+                    return False
+            elif operator == '$exists':
+                if (value is not _MISSING) != bool(operand):
+                    return False
+            elif operator in ('$gt', '$gte', '$lt', '$lte'):
+                if value is _MISSING or value is None:
+                    return False
+                if operator == '$gt' and not value > operand:
+                    return False
+                if operator == '$gte' and not value >= operand:
+                    return False
+                if operator == '$lt' and not value < operand:
+                    return False
+                if operator == '$lte' and not value <= operand:
+                    return False
+            else:
+                raise NotImplementedError(operator)
+        return True
+    if isinstance(value, list) and not isinstance(condition, list):
+        return condition in value
+    if value is _MISSING:
+        return condition is None
+    return value == condition
+
+
+def matches(document, query):
+    for key, condition in query.items():
+        if key == '$or':
+            if not any(matches(document, branch) for branch in condition):
+                return False
+        elif key == '$and':
+            if not all(matches(document, branch) for branch in condition):
+                return False
+        elif not _compare(_get_path(document, key), condition):
+            return False
+    return True
+
+
+def _project(document, projection):
+    if not isinstance(document, dict):
+        return document
+    document = copy.deepcopy(document)
+    if not projection:
+        return document
+    included = [key for key, flag in projection.items() if flag and key != '_id']
+    if included:
+        projected = {}
+        for key in included:
+            value = _get_path(document, key)
+            if value is not _MISSING:
+                _set_path(projected, key, value)
+        if projection.get('_id', 1) and '_id' in document:
+            projected['_id'] = document['_id']
+        return projected
+    for key, flag in projection.items():
+        if not flag:
+            document.pop(key, None)
+    return document
+
+
+class InMemoryCursor:
+    def __init__(self, documents, projection=None):
+        self._documents = documents
+        self._projection = projection
+        self._skip = 0
+        self._limit = 0
+
+    def sort(self, key, direction=1):
+        keys = key if isinstance(key, list) else [(key, direction)]
+        for field, order in reversed(keys):
+            self._documents.sort(key=lambda document: _get_path(document, field), reverse=order < 0)
+        return self
+
+    def skip(self, count):
+        self._skip = count
+        return self
+
+    def limit(self, count):
+        self._limit = count
+        return self
+
+    def _selected(self):
+        documents = self._documents[self._skip:]
+        if self._limit:
+            documents = documents[:self._limit]
+        return [_project(document, self._projection) for document in documents]
+
+    async def to_list(self, length=None):
+        documents = self._selected()
+        return documents[:length] if length else documents
+
+    def __aiter__(self):
+        async def iterate():
+            for document in self._selected():
+                yield document
+        return iterate()
+
+
+class InMemoryCollection:
+    """مجموعة MongoDB في الذاكرة تدعم الاستعلامات والتحديثات المستخدمة في الخادم"""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, documents=None):
+        self.documents = [dict(document) for document in documents or []]
+        self.indexes = {}
+        self.fail_updates = False
+
+    def _check_writable(self):
+        if self.fail_updates:
+            raise RuntimeError("database unavailable")
+
+    def _check_unique(self, candidate, ignore=None):
+        for name, (keys, options) in self.indexes.items():
+            if not options.get('unique'):
+                continue
+            fields = [field for field, _ in keys]
+            values = [_get_path(candidate, field) for field in fields]
+            for document in self.documents:
+                if document is not ignore and [_get_path(document, field) for field in fields] == values:
+                    raise DuplicateKeyError(f"E11000 duplicate key error index: {name}")
+
+    async def create_index(self, keys, **options):
+        name = options.get('name') or '_'.join(f"{field}_{order}" for field, order in keys)
+        self.indexes[name] = (list(keys), options)
+        return name
+
+    async def insert_one(self, document):
+        document.setdefault('_id', next(self._ids))
+        stored = copy.deepcopy(document)
+        self._check_unique(stored)
+        self.documents.append(stored)
+        return SimpleNamespace(inserted_id=document['_id'])
+
+    def find(self, query=None, projection=None, **options):
+        documents = [document for document in self.documents if matches(document, query or {})]
+        cursor = InMemoryCursor(documents, projection)
+        if options.get('sort'):
+            cursor.sort(options['sort'])
+        if options.get('limit'):
+            cursor.limit(options['limit'])
+        return cursor
+
+    async def find_one(self, query=None, projection=None, **options):
+        documents = await self.find(query, projection, **options).to_list(1)
+        return documents[0] if documents else None
+
+    async def count_documents(self, query):
+        return sum(matches(document, query) for document in self.documents)
+
+    def _apply(self, document, update, inserting=False):
+        for operator, fields in update.items():
+            for path, value in fields.items():
+                if operator == '$set' or (operator == '$setOnInsert' and inserting):
+                    _set_path(document, path, copy.deepcopy(value))
+                elif operator == '$unset':
+                    parent = _get_path(document, path.rpartition('.')[0]) if '.' in path else document
+                    if isinstance(parent, dict):
+                        parent.pop(path.rpartition('.')[2], None)
+                elif operator == '$inc':
+                    current = _get_path(document, path)
+                    _set_path(document, path, (0 if current is _MISSING else current) + value)
+                elif operator == '$addToSet':
+                    current = _get_path(document, path)
+                    items = [] if current is _MISSING else current
+                    if value not in items:
+                        items.append(value)
+                    _set_path(document, path, items)
+                elif operator != '$setOnInsert':
+                    raise NotImplementedError(operator)
+
+    def _upsert(self, query, update):
+        document = {key: value for key, value in query.items() if not key.startswith('$') and not isinstance(value, dict)}
+        document['_id'] = next(self._ids)
+        self._apply(document, update, inserting=True)
+        self._check_unique(document)
+        self.documents.append(document)
+        return document
+
+    async def update_one(self, query, update, upsert=False):
+        self._check_writable()
+        for document in self.documents:
+            if matches(document, query):
+                self._apply(document, update)
+                return SimpleNamespace(matched_count=1, modified_count=1, upserted_id=None)
+        if upsert:
+            return SimpleNamespace(matched_count=0, modified_count=0, upserted_id=self._upsert(query, update)['_id'])
+        return SimpleNamespace(matched_count=0, modified_count=0, upserted_id=None)
+
+    async def update_many(self, query, update):
+        self._check_writable()
+        matched = [document for document in self.documents if matches(document, query)]
+        for document in matched:
+            self._apply(document, update)
+        return SimpleNamespace(matched_count=len(matched), modified_count=len(matched))
+
+    async def find_one_and_update(self, query, update, projection=None, upsert=False, **options):
+        self._check_writable()
+        for document in self.documents:
+            if matches(document, query):
+                self._apply(document, update)
+                return _project(document, projection)
+        if upsert:
+            self._upsert(query, update)
+        return None
+
+    async def delete_many(self, query):
+        before = len(self.documents)
+        self.documents = [document for document in self.documents if not matches(document, query)]
+        return SimpleNamespace(deleted_count=before - len(self.documents))
+
+
+class InMemoryDatabase:
+    def __init__(self):
+        self.collections = {}
+
+    def __getitem__(self, name):
+        return self.collections.setdefault(name, InMemoryCollection())
+
+    __getattr__ = __getitem__
+
+
+class InMemoryGridOut:
+    def __init__(self, document, data):
+        self._id = document['_id']
+        self.filename = document['filename']
+        self.metadata = document.get('metadata')
+        self._data = data
+
+    async def read(self):
+        return self._data
+
+
+class InMemoryGridFSBucket:
+    """GridFS في الذاكرة: البيانات الوصفية في مجموعة files والمحتوى في قاموس"""
+
+    def __init__(self, files=None):
+        self.files = files if files is not None else InMemoryCollection()
+        self.contents = {}
+        self.uploads = 0
+
+    @staticmethod
+    def _new_id():
+        try:
+            from bson import ObjectId
+            return ObjectId()
+        except ImportError:
+            return f"{next(InMemoryCollection._ids):024x}"
+
+    async def upload_from_stream(self, filename, source, metadata=None):
+        self.uploads += 1
+        file_id = self._new_id()
+        data = bytes(source)
+        self.files.documents.append({"_id": file_id, "filename": filename, "length": len(data), "metadata": metadata})
+        self.contents[file_id] = data
+        return file_id
+
+    def find(self, query=None, limit=0, **options):
+        documents = [document for document in self.files.documents if matches(document, query or {})]
+        if limit:
+            documents = documents[:limit]
+        return InMemoryCursor([InMemoryGridOut(document, self.contents[document['_id']]) for document in documents])
+
+
+@pytest.fixture
+def collection():
+    return InMemoryCollection()
+
+
+@pytest.fixture
+def make_collection():
+    return InMemoryCollection
+
+
+@pytest.fixture
+def database():
+    return InMemoryDatabase()
+
+
+@pytest.fixture
+def grid_bucket():
+    return InMemoryGridFSBucket()
@@ -0,0 +1,17 @@
+"""مراحل اختبار لمجمع العمليات (وحدة مستقلة حتى تستوردها عمليات spawn)"""
+
+import signal
+import time
+
+
+def slow(seconds):
+    time.sleep(seconds)
+    return "done"
+
+
+def stuck(seconds):
+    # يحاكي استدعاء C لا يعود إلى بايثون: إشارة المهلة محجوبة
+    signal.pthread_sigmask(signal.SIG_BLOCK, [signal.SIGALRM])
+    time.sleep(seconds)
+    return "stuck-done"
+
@@ -0,0 +1,96 @@
+"""اختبارات تشغيل وكلاء الإثراء بالتوازي على بيانات الوضع غير المتصل"""
+
+import asyncio
+from types import SimpleNamespace
+
+import ai_agents
+from ai_agents import AGENT_OUTPUTS, ENRICHMENT_SCHEMA_VERSION, AIFinancialAgents
+from tests.conftest import StubClientSession
+
+
+def offline_agents(deadline=2.0, agent_timeout=1.5):
+    agents = AIFinancialAgents()
+    agents.offline = True
+    agents.enrichment_deadline = deadline
+    agents.agent_timeout = agent_timeout
+    agents.agent_retries = 0
+    return agents
+
+
+async def test_all_agents_complete_offline():
+    agents = offline_agents()
+    enriched = await agents.enrich_company_data("Teva", "Pharmaceuticals")
+
+    assert enriched["missing_agents"] == []
+    assert sorted(enriched["data_sources_used"]) == sorted(AGENT_OUTPUTS)
+    assert enriched["confidence_score"] == 100.0
+    assert enriched["data_mode"] == "offline"
+    assert enriched["schema_version"] == ENRICHMENT_SCHEMA_VERSION
+    assert all(report["status"] == "completed" for report in enriched["agents_report"].values())
+
+    # مفاتيح الإصدار 1 بشكلها القديم
+    assert isinstance(enriched["data_source"], str)
+    assert enriched["company_research"]["status"] == "success"
+    assert enriched["financial_news"]["status"] == "success"
+    assert enriched["financial_news"]["key_news"]
+    assert enriched["market_data"]["status"] == "success"
+
+
+async def test_slow_agent_is_cut_at_the_deadline():
+    agents = offline_agents(deadline=0.2, agent_timeout=5.0)
+
+    async def slow_benchmarks(sector, country, enriched_data):
+        await asyncio.sleep(5)
+
+    agents._benchmark_analysis_agent = slow_benchmarks
+    enriched = await agents.enrich_company_data("Teva", "Pharmaceuticals")
+
+    assert enriched["missing_agents"] == ["benchmark_analysis_agent"]
+    assert enriched["elapsed_seconds"] < 1.0
+    assert enriched["agents_report"]["benchmark_analysis_agent"]["status"] in ("timeout", "deadline_exceeded")
+    assert "industry_benchmarks" not in enriched
+    # وزن وكيل المعايير 15 من 100
+    assert enriched["confidence_score"] == 85.0
+
+
+async def test_confidence_covers_requested_agents_only():
+    agents = offline_agents()
+    enriched = await agents.enrich_company_data(
+        "Teva", "Pharmaceuticals", agents=["economic_indicators_agent", "company_research_agent"]
+    )
+
+    assert enriched["data_sources_used"] == ["economic_indicators_agent", "company_research_agent"]
+    assert enriched["missing_agents"] == []
+    assert enriched["confidence_score"] == 100.0
+    assert enriched["financial_news"]["status"] == "unavailable"
+
+
+async def test_empty_agent_list_runs_no_agents():
+    agents = offline_agents()
+    enriched = await agents.enrich_company_data("Teva", "Pharmaceuticals", agents=[])
+
+    assert enriched["data_sources_used"] == []
+    assert enriched["confidence_score"] == 0.0
+    assert enriched["financial_news"]["status"] == "unavailable"
+
+
+def test_offline_mode_is_the_default(monkeypatch):
+    monkeypatch.delenv("AI_AGENTS_OFFLINE", raising=False)
+    assert AIFinancialAgents().offline is True
+
+
+async def test_pooled_session_is_reused_and_closed(monkeypatch):
+    monkeypatch.setattr(ai_agents, "aiohttp", SimpleNamespace(
+        ClientSession=StubClientSession, TCPConnector=dict, ClientTimeout=dict
+    ))
+    monkeypatch.setattr(StubClientSession, "instances", [])
+    agents = AIFinancialAgents()
+
+    first, second = await asyncio.gather(agents.get_session(), agents.get_session())
+    assert first is second is await agents.get_session()
+    assert StubClientSession.instances == [first]
+    assert first.options["connector"]["limit"] == agents.http_limit
+
+    await agents.close_session()
+    assert first.closed and agents.session is None
+    assert await agents.get_session() is not first
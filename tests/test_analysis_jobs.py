@@ -0,0 +1,103 @@
+"""اختبارات قائمة مهام التحليل مع مجموعة MongoDB وهمية في الذاكرة (conftest)"""
+
+import asyncio
+import threading
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from analysis_jobs import JOB_COMPLETED, JOB_FAILED, JOB_QUEUED, JOB_RUNNING, AnalysisJobQueue, JobQueueFull
+
+
+def square(value):
+    return value * value
+
+
+async def test_finalize_runs_off_the_event_loop(collection):
+    queue = AnalysisJobQueue(max_workers=1)
+    queue.collection = collection
+    loop_thread = threading.get_ident()
+    finalize_threads = []
+
+    def finalize(result):
+        finalize_threads.append(threading.get_ident())
+        return {"value": result}
+
+    job_id = await queue.submit("user@example.com", "test", square, 4, finalize=finalize)
+    await asyncio.gather(*queue._tasks)
+
+    document = collection.documents[0]
+    assert document["id"] == job_id
+    assert document["status"] == JOB_COMPLETED
+    assert document["result"] == {"value": 16}
+    assert finalize_threads and finalize_threads[0] != loop_thread
+
+
+async def test_update_failure_is_logged_not_raised(collection, caplog):
+    queue = AnalysisJobQueue(max_workers=1)
+    queue.collection = collection
+    collection.fail_updates = True
+    await queue.submit("user@example.com", "test", square, 2)
+
+    assert await asyncio.gather(*queue._tasks, return_exceptions=True) == [None]
+    assert "database unavailable" in caplog.text
+
+
+async def test_only_jobs_with_expired_leases_are_failed(make_collection):
+    now = datetime.now(timezone.utc)
+    queue = AnalysisJobQueue(max_workers=1)
+    collection = make_collection([
+        {"id": "legacy", "status": JOB_QUEUED},
+        {"id": "expired", "status": JOB_RUNNING, "worker": "dead", "lease_expires_at": now - timedelta(seconds=5)},
+        {"id": "live", "status": JOB_RUNNING, "worker": "other", "lease_expires_at": now + timedelta(seconds=60)},
+        {"id": "own", "status": JOB_RUNNING, "worker": queue.instance_id, "lease_expires_at": now - timedelta(seconds=5)},
+        {"id": "done", "status": JOB_COMPLETED, "lease_expires_at": now - timedelta(seconds=5)}
+    ])
+    queue.collection = collection
+
+    assert await queue.fail_interrupted_jobs() == 2
+    assert {document["id"]: document["status"] for document in collection.documents} == {
+        "legacy": JOB_FAILED, "expired": JOB_FAILED, "live": JOB_RUNNING, "own": JOB_RUNNING, "done": JOB_COMPLETED
+    }
+
+
+async def test_renew_extends_only_this_instances_open_jobs(make_collection):
+    expired = datetime.now(timezone.utc) - timedelta(seconds=5)
+    queue = AnalysisJobQueue(max_workers=1)
+    collection = make_collection([
+        {"id": "own", "status": JOB_RUNNING, "worker": queue.instance_id, "lease_expires_at": expired},
+        {"id": "own-done", "status": JOB_COMPLETED, "worker": queue.instance_id, "lease_expires_at": expired},
+        {"id": "other", "status": JOB_RUNNING, "worker": "other", "lease_expires_at": expired}
+    ])
+    queue.collection = collection
+
+    await queue.renew_leases()
+
+    leases = {document["id"]: document["lease_expires_at"] for document in collection.documents}
+    assert leases["own"] > datetime.now(timezone.utc)
+    assert leases["own-done"] == leases["other"] == expired
+
+
+async def test_submit_reserves_slot_before_the_insert_completes(collection):
+    queue = AnalysisJobQueue(max_workers=1, max_pending=1)
+    queue.collection = collection
+    release = asyncio.Event()
+    insert_one = collection.insert_one
+
+    async def slow_insert(document):
+        await release.wait()
+        return await insert_one(document)
+
+    collection.insert_one = slow_insert
+    first = asyncio.ensure_future(queue.submit("a@example.com", "test", square, 2))
+    await asyncio.sleep(0)
+    assert queue.is_full()
+    with pytest.raises(JobQueueFull):
+        await queue.submit("b@example.com", "test", square, 3)
+
+    release.set()
+    job_id = await first
+    document = collection.documents[0]
+    assert document["id"] == job_id and document["worker"] == queue.instance_id
+    await asyncio.gather(*queue._tasks)
+    assert queue.pending_count == 0
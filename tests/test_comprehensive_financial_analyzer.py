@@ -0,0 +1,48 @@
+"""اختبارات تمرير analysis_types إلى محرك الـ170 تحليل"""
+
+import pytest
+
+from comprehensive_financial_analyzer import run_comprehensive_analysis_job
+from financial_analysis_engine_170 import FinancialAnalysisEngine
+
+FINANCIAL_DATA = {
+    "company_name": "شركة الاختبار",
+    "current_assets": 5200000,
+    "cash": 1200000,
+    "inventory": 1400000,
+    "total_assets": 13700000,
+    "current_liabilities": 2200000,
+    "total_liabilities": 5000000,
+    "shareholders_equity": 7500000,
+    "revenue": 12000000,
+    "net_income": 1650000
+}
+
+
+def test_selected_metrics_only():
+    results = run_comprehensive_analysis_job({**FINANCIAL_DATA, "analysis_types": ["current_ratio"]})
+
+    engine_results = results["financial_engine_analyses"]
+    assert engine_results["liquidity_ratios"] == {"current_ratio": pytest.approx(2.36, abs=0.01)}
+    assert "profitability_ratios" not in engine_results
+    # أقسام المستويات الثلاثة لا تُحسب عند طلب مقاييس محددة
+    assert results["detailed_analyses"] == {}
+    assert results["analysis_metadata"]["requested_metrics"] == ["current_ratio"]
+
+
+@pytest.mark.parametrize("analysis_types", [["comprehensive"], None])
+def test_comprehensive_skips_engine_and_keeps_level_sections(monkeypatch, analysis_types):
+    def fail(self, *args, **kwargs):
+        raise AssertionError("engine must not run for a comprehensive analysis")
+
+    monkeypatch.setattr(FinancialAnalysisEngine, "run_all_analyses", fail)
+    results = run_comprehensive_analysis_job({**FINANCIAL_DATA, "analysis_types": analysis_types})
+
+    assert "financial_engine_analyses" not in results
+    assert {"structural_analysis", "basic_financial_ratios", "portfolio_risk_analysis"} <= set(results["detailed_analyses"])
+    assert results["analysis_metadata"]["requested_metrics"] == "all"
+
+
+def test_unknown_analysis_type_rejected():
+    with pytest.raises(ValueError):
+        run_comprehensive_analysis_job({**FINANCIAL_DATA, "analysis_types": ["nonexistent"]})
@@ -0,0 +1,54 @@
+"""اختبارات مخزن مخرجات الملفات مع GridFS وهمي في الذاكرة (conftest)"""
+
+import pytest
+
+# معرّفات المخرجات تُقرأ كـ ObjectId
+pytest.importorskip("bson")
+
+from file_artifacts import FileArtifactStore
+
+
+def processing_results(content_hash):
+    return {
+        "company_name": "Test",
+        "files_processed": [{
+            "filename": "report.pdf",
+            "content_hash": content_hash,
+            "content_key": f"{content_hash}:1.6",
+            "extracted_data": {
+                "balance_sheet": {"total_assets": 100.0},
+                "raw_text": "إجمالي الأصول 100",
+                "tables": [["a", "b"], ["1", "2"]]
+            }
+        }]
+    }
+
+
+@pytest.fixture
+def store(grid_bucket):
+    store = FileArtifactStore()
+    store._bucket = grid_bucket
+    store._files = grid_bucket.files
+    return store
+
+
+async def test_identical_content_reuses_one_artifact_per_owner(store, grid_bucket):
+    first = await store.externalize("a@example.com", processing_results("abc"))
+    second = await store.externalize("b@example.com", processing_results("abc"))
+
+    artifact_id = first["files_processed"][0]["artifacts"]["artifact_id"]
+    assert second["files_processed"][0]["artifacts"]["artifact_id"] == artifact_id
+    assert grid_bucket.uploads == 1
+    assert "raw_text" not in first["files_processed"][0]["extracted_data"]
+
+    for email in ("a@example.com", "b@example.com"):
+        loaded = await store.load(artifact_id, email)
+        assert loaded == {"raw_text": "إجمالي الأصول 100", "tables": [["a", "b"], ["1", "2"]]}
+    assert await store.load(artifact_id, "c@example.com") is None
+
+
+async def test_different_content_is_stored_separately(store, grid_bucket):
+    await store.externalize("a@example.com", processing_results("abc"))
+    await store.externalize("a@example.com", processing_results("def"))
+
+    assert grid_bucket.uploads == 2
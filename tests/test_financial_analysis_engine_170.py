@@ -0,0 +1,55 @@
+"""اختبارات ذاكرة النسب في محرك التحليل المالي"""
+
+import pytest
+
+from financial_analysis_engine_170 import METRIC_REGISTRY, FinancialAnalysisEngine, FinancialData, select_metrics
+
+
+@pytest.fixture
+def engine():
+    data = FinancialData(
+        current_assets=500.0, cash=120.0, accounts_receivable=90.0, inventory=80.0,
+        current_liabilities=250.0, total_assets=1500.0, total_liabilities=700.0,
+        shareholders_equity=800.0, revenue=1200.0, cost_of_revenue=700.0,
+        gross_profit=500.0, operating_income=220.0, net_income=150.0,
+        interest_expense=20.0, operating_cash_flow=180.0
+    )
+    return FinancialAnalysisEngine(data)
+
+
+def test_each_metric_computed_once_per_run(engine):
+    engine.run_all_analyses()
+
+    assert set(engine.ratio_computations) == set(METRIC_REGISTRY)
+    assert all(count == 1 for count in engine.ratio_computations.values())
+
+
+def test_counter_uses_registry_names(engine):
+    engine.run_all_analyses(metrics=['dupont_analysis'])
+
+    assert engine.ratio_computations['dupont_analysis'] == 1
+    assert '_dupont_analysis' not in engine.ratio_computations
+    # الاعتماديات تُحسب مرة واحدة أيضاً
+    assert engine.ratio_computations['net_profit_margin'] == 1
+
+
+def test_counter_resets_between_runs(engine):
+    engine.run_all_analyses()
+    engine.run_all_analyses()
+
+    assert all(count == 1 for count in engine.ratio_computations.values())
+
+
+def test_select_metrics_levels_mean_all():
+    assert select_metrics(None) is None
+    assert select_metrics(['comprehensive']) is None
+    assert select_metrics(['basic', 'intermediate']) is None
+
+
+def test_select_metrics_passes_registry_names():
+    assert select_metrics(['current_ratio', 'leverage_ratios']) == ['current_ratio', 'leverage_ratios']
+
+
+def test_select_metrics_rejects_unknown_names():
+    with pytest.raises(ValueError, match='not_a_metric'):
+        select_metrics(['current_ratio', 'not_a_metric'])
@@ -0,0 +1,141 @@
+"""اختبارات المحرك الدفعي مقابل المحرك الفردي، تحليل اللوحة متعدد السنوات، والتخزين المضغوط"""
+
+import json
+import math
+
+import numpy as np
+import pytest
+
+import analysis_engine
+from financial_analysis_engine_170 import FinancialAnalysisEngine, FinancialData
+from financial_batch_engine import (
+    FINANCIAL_FIELDS, BatchFinancialAnalysisEngine, CompactFinancialData, FinancialDataMatrix,
+    FinancialPanelAnalysis
+)
+
+
+@pytest.fixture(scope="module")
+def records():
+    rng = np.random.default_rng(7)
+    values = rng.uniform(-500, 5000, (60, len(FINANCIAL_FIELDS)))
+    values[rng.random(values.shape) < 0.15] = 0.0
+    # صفوف حدية: كل المقامات صفرية، NaN، inf، ومزيج منها
+    values[5] = 0.0
+    values[6] = np.nan
+    values[7] = np.inf
+    values[8, ::2] = np.nan
+    values[8, 1::2] = -np.inf
+    return [
+        FinancialData(
+            **dict(zip(FINANCIAL_FIELDS, row.tolist())),
+            previous_year_data={"net_income": float(rng.uniform(-100, 100)), "dividends_paid": 0.0} if i % 3 else None
+        )
+        for i, row in enumerate(values)
+    ]
+
+
+def test_batch_ratios_match_single_engine(records):
+    batch = BatchFinancialAnalysisEngine.from_financial_data(records).run_all_ratios()
+
+    for i, record in enumerate(records):
+        engine = FinancialAnalysisEngine(record)
+        for category, ratios in batch.items():
+            for name, values in ratios.items():
+                expected = getattr(engine, name)()
+                assert values[i] == pytest.approx(expected, rel=1e-9, abs=1e-9, nan_ok=True), (i, category, name)
+
+
+def test_json_safe_records_match_single_engine_liquidity(records):
+    batch = BatchFinancialAnalysisEngine.from_financial_data(records).to_records()
+
+    for record, batch_record in zip(records, batch):
+        expected = FinancialAnalysisEngine(record).run_all_analyses()["liquidity_ratios"]
+        assert batch_record["liquidity_ratios"] == pytest.approx(expected)
+
+
+@pytest.fixture
+def panel():
+    # السنوات بترتيب غير مرتب عمداً؛ صافي الربح يبدأ بصفر والربح التشغيلي بقيمة سالبة
+    return FinancialPanelAnalysis.from_financial_data({
+        2023: FinancialData(revenue=150.0, net_income=20.0, operating_income=60.0, total_assets=300.0),
+        2021: FinancialData(revenue=100.0, net_income=0.0, operating_income=-50.0, total_assets=200.0,
+                            previous_year_data={"revenue": 80.0, "net_income": 10.0}),
+        2022: FinancialData(revenue=120.0, net_income=-10.0, operating_income=40.0, total_assets=250.0),
+    })
+
+
+GROWTH_FIELDS = ["revenue", "net_income", "operating_income"]
+
+
+def test_yoy_growth_uses_previous_year_data_then_previous_row(panel):
+    growth = panel.yoy_growth(GROWTH_FIELDS)
+
+    assert list(growth.index) == [2021, 2022, 2023]
+    assert growth["revenue"].tolist() == pytest.approx([25.0, 20.0, 25.0])
+    # 2021 من previous_year_data، 2022 أساسها صفر، 2023 أساسها سالب (-10)
+    assert growth["net_income"].tolist() == pytest.approx([-100.0, 0.0, -300.0])
+    # لا توجد قيمة سابقة للربح التشغيلي في السنة الأولى
+    assert growth["operating_income"].tolist() == pytest.approx([0.0, -180.0, 50.0])
+
+    earnings_growth = panel.ratios()[("profitability_ratios", "earnings_growth_rate")]
+    assert earnings_growth.tolist() == pytest.approx([-100.0, 0.0, -300.0])
+
+
+def test_cagr_is_zero_for_zero_or_negative_base(panel):
+    cagr = panel.cagr(GROWTH_FIELDS)
+
+    assert cagr["revenue"].tolist() == pytest.approx([0.0, 20.0, (math.sqrt(1.5) - 1) * 100])
+    assert cagr["net_income"].tolist() == [0.0, 0.0, 0.0]
+    assert cagr["operating_income"].tolist() == [0.0, 0.0, 0.0]
+
+
+def test_panel_summary_is_json_safe(panel):
+    summary = panel.run_panel_analysis(GROWTH_FIELDS)
+
+    assert summary["years"] == [2021, 2022, 2023]
+    assert summary["yoy_growth"]["net_income"] == [-100.0, 0.0, -300.0]
+    assert summary["cagr"]["revenue"] == [0.0, 20.0, 22.47]
+
+    encoded = json.dumps(summary, allow_nan=False)
+    values = [value for category in json.loads(encoded).values() if isinstance(category, dict)
+              for series in category.values() for value in series]
+    assert values and all(isinstance(value, float) and math.isfinite(value) for value in values)
+
+
+def test_compact_data_shares_memory_with_its_row():
+    row = np.zeros(len(FINANCIAL_FIELDS))
+    compact = CompactFinancialData.from_numpy(row)
+
+    assert np.shares_memory(compact.to_numpy(), row)
+    compact.revenue = 1200.0
+    assert row[FINANCIAL_FIELDS.index("revenue")] == 1200.0
+    assert not hasattr(compact, "__dict__")
+
+
+def test_matrix_rows_and_columns_are_views():
+    matrix = FinancialDataMatrix.empty(3)
+    company = matrix[1]
+
+    assert np.shares_memory(company.to_numpy(), matrix.values)
+    assert np.shares_memory(matrix.column("net_income"), matrix.values)
+    company.net_income = 75.0
+    assert matrix.column("net_income").tolist() == [0.0, 75.0, 0.0]
+    assert all(not hasattr(row, "__dict__") for row in matrix)
+
+
+@pytest.mark.parametrize("data_class", [FinancialData, analysis_engine.FinancialData])
+def test_round_trip_with_financial_data_classes(data_class):
+    original = data_class(
+        current_assets=500.0, current_liabilities=250.0, revenue=1200.0, net_income=150.0,
+        previous_year_data={"net_income": 120.0}, industry_averages={"current_ratio": 1.5}
+    )
+
+    compact = CompactFinancialData.from_financial_data(original)
+    assert compact.current_assets == 500.0 and compact.net_income == 150.0
+    assert compact.to_financial_data(data_class) == original
+
+    matrix = FinancialDataMatrix.from_records([original, compact])
+    assert matrix[0] == matrix[1]
+    assert np.array_equal(matrix[0].to_numpy(), compact.to_numpy())
+    assert matrix[0].previous_year_data == {"net_income": 120.0}
+    assert FinancialAnalysisEngine(compact).current_ratio() == FinancialAnalysisEngine(original).current_ratio()
@@ -0,0 +1,61 @@
+"""اختبارات ذاكرة بيانات السوق المؤقتة مع مجموعة MongoDB وهمية في الذاكرة (conftest)"""
+
+import asyncio
+
+from market_data_cache import MarketDataCache
+
+
+async def test_empty_result_is_kept_briefly_and_not_persisted(collection):
+    cache = MarketDataCache(negative_ttl=0.05)
+    cache.attach(collection)
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        return {}
+
+    assert await cache.get_or_fetch("fundamentals", "UNKNOWN", fetch) == {}
+    assert await cache.get_or_fetch("fundamentals", "UNKNOWN", fetch) == {}
+    assert len(calls) == 1
+    assert collection.documents == []
+
+    await asyncio.sleep(0.06)
+    await cache.get_or_fetch("fundamentals", "UNKNOWN", fetch)
+    assert len(calls) == 2
+
+
+async def test_batch_misses_are_negatively_cached_per_key(collection):
+    cache = MarketDataCache(negative_ttl=60)
+    cache.attach(collection)
+    requested = []
+
+    async def fetch_many(keys):
+        requested.append(list(keys))
+        return {key: {"current_price": 1.0} for key in keys if key != "5d|MISSING"}
+
+    first = await cache.get_or_fetch_many("quote", ["5d|TEVA.TA", "5d|MISSING"], fetch_many)
+    second = await cache.get_or_fetch_many("quote", ["5d|TEVA.TA", "5d|MISSING"], fetch_many)
+
+    assert first == second == {"5d|TEVA.TA": {"current_price": 1.0}}
+    assert requested == [["5d|TEVA.TA", "5d|MISSING"]]
+    assert [document["key"] for document in collection.documents] == ["quote:5d|TEVA.TA"]
+
+
+async def test_batch_load_is_kept_alive_after_its_caller_is_cancelled():
+    cache = MarketDataCache()
+    release = asyncio.Event()
+
+    async def fetch_many(keys):
+        await release.wait()
+        return {key: {"current_price": 2.0} for key in keys}
+
+    caller = asyncio.ensure_future(cache.get_or_fetch_many("quote", ["5d|TEVA.TA"], fetch_many))
+    await asyncio.sleep(0)
+    assert len(cache._tasks) == 1
+    caller.cancel()
+
+    release.set()
+    await asyncio.gather(*cache._tasks)
+    assert cache._tasks == set()
+    assert await cache.get_or_fetch_many("quote", ["5d|TEVA.TA"], fetch_many) == {"5d|TEVA.TA": {"current_price": 2.0}}
+    assert cache.stats["memory_hits"] == 1
@@ -0,0 +1,93 @@
+"""اختبارات مزود البيانات الثابتة ودفعات الأسعار عبر الوكلاء"""
+
+import os
+
+import pytest
+
+from ai_agents import MARKET_INDICES, AIFinancialAgents
+from market_data_providers import HISTORY_COLUMNS, FixtureMarketDataProvider, MarketDataProvider
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+@pytest.fixture
+def provider():
+    return FixtureMarketDataProvider.from_files(
+        os.path.join(FIXTURES, 'market_history.csv'),
+        os.path.join(FIXTURES, 'market_info.json')
+    )
+
+
+@pytest.fixture
+def agents(provider):
+    agents = AIFinancialAgents()
+    agents.offline = False
+    agents.market_data_provider = provider
+    agents.ticker_resolver = None
+    return agents
+
+
+class CountingProvider(FixtureMarketDataProvider):
+    def __init__(self, provider):
+        super().__init__(provider.history, provider.info)
+        self.history_calls = []
+
+    def fetch_history(self, symbols, period="1y"):
+        self.history_calls.append(sorted(symbols))
+        return super().fetch_history(symbols, period)
+
+
+def test_provider_interface_is_abstract():
+    with pytest.raises(TypeError):
+        MarketDataProvider()
+
+
+def test_fixture_history_is_tidy_and_limited_to_period(provider):
+    history = provider.fetch_history(["TEVA", "^GSPC", "UNKNOWN"], period="5d")
+
+    assert list(history.columns) == HISTORY_COLUMNS
+    assert sorted(history["symbol"].unique()) == ["TEVA", "^GSPC"]
+    # آخر تاريخ 2025-03-12 وبداية الفترة 2025-03-07
+    assert history.groupby("symbol")["date"].min().dt.strftime("%Y-%m-%d").to_dict() == {
+        "TEVA": "2025-03-07", "^GSPC": "2025-03-07"
+    }
+
+
+async def test_get_price_history_and_quotes(agents):
+    history = await agents.get_price_history(["TEVA"], period="max")
+    quotes = await agents.get_quotes(["TEVA", "^TA125.TA", "UNKNOWN"], period="1y")
+
+    assert len(history) == 8
+    assert sorted(quotes) == ["TEVA", "^TA125.TA"]
+    assert quotes["TEVA"]["current_price"] == 18.2
+    assert quotes["TEVA"]["volume"] == 9800000
+    assert quotes["TEVA"]["price_performance"]["1d_change"] == pytest.approx((18.2 - 17.8) / 17.8 * 100)
+    assert quotes["TEVA"]["price_performance"]["1y_change"] == pytest.approx((18.2 - 17.1) / 17.1 * 100)
+
+
+async def test_market_agent_batches_company_and_indices(agents):
+    counting = CountingProvider(agents.market_data_provider)
+    agents.market_data_provider = counting
+    scratch = {"data_sources_used": []}
+
+    await agents._market_data_agent("Teva", scratch)
+
+    market_data = scratch["market_data"]
+    assert counting.history_calls == [sorted(["TEVA"] + MARKET_INDICES)]
+    assert market_data["symbol"] == "TEVA"
+    assert market_data["current_price"] == 18.2
+    assert market_data["pe_ratio"] == 14.2
+    assert [index["symbol"] for index in market_data["indices"]] == ["^TA125.TA", "^GSPC"]
+    assert market_data["missing_symbols"] == ["^IXIC", "^DJI"]
+
+
+async def test_market_agent_reports_unknown_company_symbol(agents):
+    scratch = {"data_sources_used": []}
+
+    await agents._market_data_agent("Bank Leumi", scratch)
+
+    market_data = scratch["market_data"]
+    assert market_data["symbol"] == "LUMI.TA"
+    assert "current_price" not in market_data
+    assert market_data["missing_symbols"] == ["LUMI.TA", "^IXIC", "^DJI"]
+    assert len(market_data["indices"]) == 2
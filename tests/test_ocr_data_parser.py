@@ -0,0 +1,428 @@
+"""اختبارات محلل الملفات المالية: مجمع العمليات ومهلاته، جداول الصور وربط صفوف الجداول"""
+
+import asyncio
+import concurrent.futures
+import time
+from types import SimpleNamespace
+
+import cv2
+import numpy as np
+import openpyxl
+import pandas as pd
+import pytest
+from fpdf import FPDF
+from PIL import Image
+
+import ocr_data_parser
+from ocr_data_parser import FinancialDataParser, PoolWork, WorkerDeadlineExceeded, probe_pdf_layout, run_with_deadline
+from tests import pool_stages
+
+
+@pytest.fixture
+def parser():
+    parser = FinancialDataParser()
+    yield parser
+    parser.shutdown()
+
+
+def test_deadline_interrupts_stage_with_sigalrm():
+    started = time.time()
+    with pytest.raises(WorkerDeadlineExceeded):
+        run_with_deadline(time.time() + 0.1, time.sleep, 5)
+    assert time.time() - started < 1.0
+
+    with pytest.raises(WorkerDeadlineExceeded):
+        run_with_deadline(time.time() - 1, pool_stages.slow, 0)
+    assert run_with_deadline(None, pool_stages.slow, 0) == "done"
+    assert run_with_deadline(time.time() + 5, pool_stages.slow, 0) == "done"
+
+
+async def test_deadline_is_enforced_inside_pool_worker(parser):
+    parser.max_workers = 1
+    assert await parser._run_in_pool(pool_stages.slow, 0) == "done"
+
+    work = PoolWork(0.5)
+    work.start()
+    with pytest.raises(WorkerDeadlineExceeded):
+        await parser._run_in_pool(pool_stages.slow, 10, work=work)
+    assert await work.wait_idle(1)
+
+
+async def test_stuck_worker_is_reaped_and_other_files_are_retried(parser):
+    parser.max_workers = 2
+    parser.timeout_grace = 0.3
+    # تشغيل العاملين مسبقاً حتى تبدأ المراحل فوراً
+    await asyncio.gather(*(parser._run_in_pool(pool_stages.slow, 0.5) for _ in range(2)))
+    recycled = parser._executor
+    processes = list(recycled._processes.values())
+
+    other = PoolWork(60)
+    other.start()
+    other_stage = asyncio.ensure_future(parser._run_in_pool(pool_stages.slow, 1.5, work=other))
+
+    overrun = PoolWork(0.2)
+    overrun.start()
+    with pytest.raises(asyncio.TimeoutError):
+        await asyncio.wait_for(parser._run_in_pool(pool_stages.stuck, 30, work=overrun), 0.5)
+    parser._reap_overrun(overrun)
+
+    # مرحلة الملف الآخر تُعاد على المجمع الجديد بدلاً من فشلها بـ BrokenProcessPool
+    assert await other_stage == "done"
+    assert await overrun.wait_idle(5)
+    assert overrun.reaped and not other.reaped
+    assert parser._executor is not recycled and len(other.executors) == 2
+    for process in processes:
+        process.join(5)
+    assert not any(process.is_alive() for process in processes)
+
+
+def test_table_rows_with_thousands_separators_and_negative_parentheses(parser):
+    # كل خلايا الأعمدة الرقمية بفواصل الآلاف، ولا توجد قيمة قابلة للتحويل مباشرة
+    table = pd.DataFrame({
+        "item": ["Total Assets", "Revenue", "Net Income", "Notes"],
+        "2024": ["1,234,567", "890,000", "(12,500)", "-"],
+        "2023": ["1,100,000", "800,000", "45,000", ""],
+    })
+
+    assert parser._map_table_rows(table) == {
+        ("balance_sheet", "total_assets"): 1234567.0,
+        ("income_statement", "revenue"): 890000.0,
+        ("income_statement", "net_income"): -12500.0,
+    }
+
+
+def test_table_rows_skip_zero_and_text_cells(parser):
+    table = pd.DataFrame({
+        "البند": ["إجمالي الأصول", "الإيرادات", "ملاحظات"],
+        "القيمة": ["0", "n/a", "نص"],
+        "السابق": ["2,000", "3,500.50", ""],
+    })
+
+    assert parser._map_table_rows(table) == {
+        ("balance_sheet", "total_assets"): 2000.0,
+        ("income_statement", "revenue"): 3500.5,
+    }
+
+
+# جدول مرسوم بخطوط: 4 صفوف × 3 أعمدة يبدأ عند (20, 20)
+TABLE_ORIGIN = 20
+ROW_LINES = [20, 70, 120, 170, 220]
+COLUMN_LINES = [20, 260, 420, 580]
+TABLE_CELLS = [
+    ["Item", "2024", "2023"],
+    ["Total Assets", "1,234,567", "1,100,000"],
+    ["Revenue", "890,000", "800,000"],
+    ["Net Income", "(12,500)", "45,000"],
+]
+
+
+class WordsOnlyPool:
+    """بديل مجمع tesseract بدون محركات دائمة: كلمات الجدول بمواقعها داخل الصورة المقصوصة"""
+
+    persistent = False
+
+    def __init__(self):
+        self.calls = []
+
+    def words(self, image, psm=6):
+        self.calls.append(image.size)
+        words = []
+        for row, (top, bottom) in enumerate(zip(ROW_LINES, ROW_LINES[1:])):
+            for column, (left, right) in enumerate(zip(COLUMN_LINES, COLUMN_LINES[1:])):
+                for offset, word in enumerate(TABLE_CELLS[row][column].split()):
+                    words.append((left - TABLE_ORIGIN + 10 + 60 * offset, top - TABLE_ORIGIN + 15, 50, 20, word))
+        # حدود الجدول قد تُقرأ كأحرف
+        words.append((COLUMN_LINES[1] - TABLE_ORIGIN - 1, 40, 2, 20, "|"))
+        return words
+
+    def image_to_string(self, image, psm=6, whitelist=None):
+        raise AssertionError("cell-level OCR needs a persistent engine")
+
+
+def ruled_table_image():
+    gray = np.full((260, 620), 255, dtype=np.uint8)
+    for y in ROW_LINES:
+        cv2.line(gray, (COLUMN_LINES[0], y), (COLUMN_LINES[-1], y), 0, 2)
+    for x in COLUMN_LINES:
+        cv2.line(gray, (x, ROW_LINES[0]), (x, ROW_LINES[-1]), 0, 2)
+    for row, (top, bottom) in enumerate(zip(ROW_LINES, ROW_LINES[1:])):
+        for column, left in enumerate(COLUMN_LINES[:-1]):
+            cv2.putText(gray, TABLE_CELLS[row][column], (left + 8, bottom - 15), cv2.FONT_HERSHEY_SIMPLEX, 0.6, 0, 1)
+    return gray
+
+
+def test_ruled_table_image_is_read_in_one_call_and_mapped(parser):
+    gray = ruled_table_image()
+    grids = parser._find_table_grids(gray)
+
+    assert len(grids) == 1
+    _, row_lines, column_lines = grids[0]
+    assert len(row_lines) == len(ROW_LINES) and len(column_lines) == len(COLUMN_LINES)
+
+    parser.ocr_pool = WordsOnlyPool()
+    tables = parser._ocr_table_cells(gray, grids)
+
+    assert len(parser.ocr_pool.calls) == 1
+    assert tables[0][1] == ["Total Assets", "1234567", "1100000"]
+    assert tables[0][3] == ["Net Income", "-12500", "45000"]
+
+    extracted = {"balance_sheet": {}, "income_statement": {}, "cash_flow": {}}
+    parser._extract_financial_data_from_tables(tables, extracted)
+    assert extracted["balance_sheet"] == {"total_assets": 1234567.0}
+    assert extracted["income_statement"] == {"revenue": 890000.0, "net_income": -12500.0}
+
+
+def empty_result():
+    return {
+        "extracted_data": {"balance_sheet": {}, "income_statement": {}, "cash_flow": {}, "raw_text": "", "tables": []},
+        "processing_details": {"method_used": "", "confidence_score": 0.0, "processing_time": 0.0}
+    }
+
+
+# صفحات PDF مقسمة على ثلاثة مقاطع؛ "Total Assets" في آخر صفحة من المقطع الأول وقيمته في أول صفحة من الثاني
+PDF_PAGES = [
+    "Annual report", "Balance sheet\nTotal Assets",
+    "1,500\nRevenue 900", "Net Income 120",
+    "Notes", "Revenue 950",
+]
+
+
+def stub_pdf_pool(parser, completed):
+    """بديل _submit: فحص ثابت للمستند ومقاطع تنتهي بعكس ترتيبها"""
+
+    async def stage(func, *args):
+        if func.__name__ == "probe_pdf_layout":
+            return {"page_count": len(PDF_PAGES), "layout": "native"}
+        _, start, stop, _ = args
+        await asyncio.sleep(0.05 * (len(PDF_PAGES) - start))
+        completed.append(start)
+        pages = [
+            {"page_number": number, "text": PDF_PAGES[number], "tables": [], "table_data": {}}
+            for number in range(start, stop)
+        ]
+        chunk_text = " ".join(page["text"] for page in pages)
+        return {"pages": pages, "text_ranked": parser.keyword_matcher.find_ranked(chunk_text)}
+
+    parser._submit = lambda work, func, *args: asyncio.ensure_future(stage(func, *args))
+
+
+async def test_pdf_chunks_completing_out_of_order_merge_in_page_order(parser):
+    parser.pdf_pages_per_chunk = 2
+    completed = []
+    stub_pdf_pool(parser, completed)
+
+    result = await parser._process_pdf_file_parallel("report.pdf", empty_result())
+
+    assert completed == [4, 2, 0]
+    extracted = result["extracted_data"]
+    assert extracted["raw_text"] == "".join(text + "\n" for text in PDF_PAGES)
+    # نفس نتيجة مطابقة النص كاملاً، بما فيها البند المقسوم بين مقطعين
+    serial = parser.keyword_matcher.find_values(" ".join(PDF_PAGES))
+    assert extracted["balance_sheet"] == serial["balance_sheet"] == {"total_assets": 1500.0}
+    assert extracted["income_statement"] == serial["income_statement"] == {"revenue": 900.0, "net_income": 120.0}
+
+
+@pytest.fixture
+def workbook_path(tmp_path):
+    workbook = openpyxl.Workbook()
+    balance = workbook.active
+    balance.title = "Balance"
+    balance.append(["Item", "2024", "2023"])
+    for number in range(7):
+        balance.append([f"Note {number}", number + 1, number + 2])
+    balance.append(["Total Assets", 950, 900])
+    balance.append(["Current Assets", 420, 400])
+    income = workbook.create_sheet("Income")
+    income.append(["Item", "2024"])
+    income.append(["Revenue", 800])
+    income.append(["Net Income", 95])
+    path = tmp_path / "statements.xlsx"
+    workbook.save(path)
+    return str(path)
+
+
+STATEMENTS = ("balance_sheet", "income_statement", "cash_flow")
+
+
+def test_excel_chunks_merge_like_the_pandas_path(parser, workbook_path, monkeypatch):
+    parser.excel_chunk_rows = 2
+    chunked = parser._process_excel_file(workbook_path, empty_result())
+
+    assert chunked["processing_details"]["method_used"] == "Excel Streaming Processing"
+    assert [table[0] for table in chunked["extracted_data"]["tables"]] == [["Item", "2024", "2023"], ["Item", "2024"]]
+    assert len(chunked["extracted_data"]["tables"][0]) == 10
+
+    # تعذر القراءة المتدفقة يعود إلى pandas بنفس البيانات المستخرجة
+    def fail(file_path):
+        raise RuntimeError("corrupt stream")
+
+    monkeypatch.setattr(parser, "_iter_excel_row_chunks", fail)
+    full = parser._process_excel_file(workbook_path, empty_result())
+
+    assert full["processing_details"]["method_used"] == "Excel Processing"
+    for statement_type in STATEMENTS:
+        assert chunked["extracted_data"][statement_type] == full["extracted_data"][statement_type]
+    assert chunked["extracted_data"]["balance_sheet"] == {"total_assets": 950.0, "current_assets": 420.0}
+    assert chunked["extracted_data"]["income_statement"] == {"revenue": 800.0, "net_income": 95.0}
+
+
+def test_excel_raw_text_is_capped_but_all_rows_are_parsed(parser, workbook_path):
+    parser.excel_chunk_rows = 2
+    parser.excel_raw_text_limit = 40
+    parser.excel_table_preview_rows = 3
+    result = parser._process_excel_streaming(workbook_path, empty_result())
+
+    assert len(result["extracted_data"]["raw_text"]) == 40
+    assert result["processing_details"]["raw_text_truncated"] is True
+    assert [len(table) for table in result["extracted_data"]["tables"]] == [4, 3]
+    # البيانات من الصفوف بعد الحد ما زالت مستخرجة
+    assert result["extracted_data"]["income_statement"] == {"revenue": 800.0, "net_income": 95.0}
+
+
+def test_xls_files_skip_streaming_and_use_pandas(parser, tmp_path, monkeypatch):
+    path = tmp_path / "legacy.xls"
+    # ملفات xls الثنائية تبدأ بتوقيع OLE2 وليس بحاوية ZIP
+    path.write_bytes(bytes.fromhex("d0cf11e0a1b11ae1") + b"\0" * 64)
+    monkeypatch.setattr(parser, "_process_excel_streaming", lambda *args: pytest.fail("xls must not stream"))
+    monkeypatch.setattr(pd, "read_excel", lambda file_path, sheet_name=None: {
+        "Sheet1": pd.DataFrame({"Item": ["Revenue 700"], "Value": [700]})
+    })
+
+    result = parser._process_excel_file(str(path), empty_result())
+
+    assert result["processing_details"]["method_used"] == "Excel Processing"
+    assert result["extracted_data"]["income_statement"] == {"revenue": 700.0}
+
+
+def write_pdf(path, pages):
+    """PDF صفحاته نصية ("text") أو صورة فقط بلا طبقة نص ("image")"""
+    scan = path.parent / "scan.png"
+    Image.fromarray(ruled_table_image()).save(scan)
+    pdf = FPDF()
+    pdf.set_font("helvetica", size=12)
+    for kind in pages:
+        pdf.add_page()
+        if kind == "text":
+            pdf.multi_cell(0, 10, "Balance sheet\nTotal Assets 1,500\nRevenue 900\nNet Income 120")
+        else:
+            pdf.image(str(scan), x=10, y=10, w=180)
+    pdf.output(str(path))
+    return str(path)
+
+
+@pytest.mark.parametrize("pages, layout", [
+    (["text", "text", "image"], "native"),
+    (["image", "image", "text"], "scanned"),
+    (["text", "image", "text"], "mixed"),
+])
+def test_probe_classifies_by_first_pages(tmp_path, pages, layout):
+    assert probe_pdf_layout(write_pdf(tmp_path / "report.pdf", pages)) == {"page_count": 3, "layout": layout}
+
+
+def run_stages_in_threads(parser):
+    """بديل _submit: المراحل الحقيقية في خيوط بدلاً من عمليات المجمع"""
+    parser._submit = lambda work, func, *args: asyncio.ensure_future(asyncio.to_thread(func, *args))
+
+
+@pytest.mark.parametrize("pages, method, ocr_pages", [
+    (["text", "text"], "PDF Processing", []),
+    (["image", "image"], "PDF OCR Processing", [0, 1]),
+    (["text", "image", "text"], "PDF Mixed Processing", [1]),
+])
+async def test_layout_routes_pages_to_text_layer_or_ocr(parser, tmp_path, monkeypatch, pages, method, ocr_pages):
+    run_stages_in_threads(parser)
+    parser.pdf_pages_per_chunk = 1
+    ocr_calls = []
+
+    def fake_ocr(page, page_number):
+        ocr_calls.append(page_number)
+        return {"page_number": page_number, "text": "Total Assets 2,000", "tables": [], "ocr": True}
+
+    # مراحل المجمع تستخدم المحلل العام للوحدة
+    monkeypatch.setattr(ocr_data_parser.financial_parser, "_ocr_pdf_page", fake_ocr)
+    result = await parser._process_pdf_file_parallel(write_pdf(tmp_path / "report.pdf", pages), empty_result())
+
+    details = result["processing_details"]
+    assert details["method_used"] == method
+    assert sorted(ocr_calls) == ocr_pages
+    assert details["ocr_pages"] == len(ocr_pages) and details["pages_processed"] == len(pages)
+    expected_assets = 1500.0 if pages[0] == "text" else 2000.0
+    assert result["extracted_data"]["balance_sheet"] == {"total_assets": expected_assets}
+
+
+async def test_unreadable_by_pdfplumber_skips_it_in_fallback(parser, tmp_path, monkeypatch):
+    run_stages_in_threads(parser)
+    opened = []
+
+    def broken_open(*args, **kwargs):
+        opened.append(args[0])
+        raise ValueError("not a PDF pdfplumber can read")
+
+    monkeypatch.setattr(ocr_data_parser.pdfplumber, "open", broken_open)
+    result = await parser._process_pdf_file_parallel(write_pdf(tmp_path / "report.pdf", ["text"]), empty_result())
+
+    # pdfplumber يُجرب مرة واحدة فقط عند الفحص ثم PyPDF2 مباشرة
+    assert len(opened) == 1
+    assert result["processing_details"]["method_used"] == "PyPDF2 Processing"
+    assert "Total Assets 1,500" in result["extracted_data"]["raw_text"]
+
+
+def uploads(count):
+    return [SimpleNamespace(filename=f"report_{number}.xlsx") for number in range(count)]
+
+
+def file_result(file, revenue):
+    return {
+        "filename": file.filename, "status": "success",
+        "extracted_data": {"balance_sheet": {}, "income_statement": {"revenue": revenue}, "cash_flow": {}}
+    }
+
+
+async def test_results_follow_upload_order_within_concurrency_bound(parser):
+    parser.max_concurrent_files = 2
+    files = uploads(5)
+    running, peak, finished = set(), [0], []
+
+    async def process(file, work=None):
+        running.add(file.filename)
+        peak[0] = max(peak[0], len(running))
+        # الملفات الأولى تنتهي آخراً
+        await asyncio.sleep(0.02 * (len(files) - files.index(file)))
+        running.discard(file.filename)
+        finished.append(file.filename)
+        return file_result(file, float(files.index(file) + 1))
+
+    parser._process_single_file = process
+    results = await parser.process_uploaded_files(files, "Test")
+
+    assert finished != [file.filename for file in files]
+    assert [item["filename"] for item in results["files_processed"]] == [file.filename for file in files]
+    assert peak[0] == 2
+    assert results["processing_summary"]["successful"] == 5
+    # أول ملف ناجح يحدد القيمة المدمجة
+    assert results["extracted_data"]["income_statement"]["revenue"] == 1.0
+
+
+async def test_slot_is_held_until_the_files_pool_stages_stop(parser):
+    parser.max_concurrent_files = 1
+    files = uploads(2)
+    stage = concurrent.futures.Future()
+    started = []
+
+    async def process(file, work=None):
+        started.append(file.filename)
+        if file is files[0]:
+            # مرحلة ما زالت تعمل في المجمع بعد انتهاء مهلة الملف
+            work.track(None, stage)
+            return {**file_result(file, 1.0), "status": "error"}
+        return file_result(file, 2.0)
+
+    parser._process_single_file = process
+    processing = asyncio.ensure_future(parser.process_uploaded_files(files, "Test"))
+    await asyncio.sleep(0.1)
+    assert started == ["report_0.xlsx"]
+
+    stage.set_result(None)
+    results = await processing
+    assert started == ["report_0.xlsx", "report_1.xlsx"]
+    assert results["processing_summary"]["failed"] == 1 and results["processing_summary"]["successful"] == 1
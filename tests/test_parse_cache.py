@@ -0,0 +1,56 @@
+"""اختبارات ذاكرة نتائج تحليل الملفات في الذاكرة وفي GridFS وهمي (conftest)"""
+
+import os
+
+from parse_cache import ParseResultCache, encode_payload
+
+
+def payload(seed):
+    # نص عشوائي حتى لا يصغر حجمه كثيراً بعد الضغط
+    return {"raw_text": os.urandom(2048).hex(), "seed": seed}
+
+
+async def test_round_trip_returns_independent_copies():
+    cache = ParseResultCache(max_bytes=1024 * 1024)
+    await cache.put("a", {"extracted_data": {"balance_sheet": {"total_assets": 1.0}}})
+    first = await cache.get("a")
+    first["extracted_data"]["balance_sheet"]["total_assets"] = 2.0
+    second = await cache.get("a")
+
+    assert second["extracted_data"]["balance_sheet"]["total_assets"] == 1.0
+    assert cache.stats["memory_hits"] == 2
+
+
+async def test_evicts_least_recently_used_by_compressed_size():
+    entry_size = len(encode_payload(payload(0)))
+    cache = ParseResultCache(max_bytes=entry_size * 2 + entry_size // 2)
+    await cache.put("a", payload(1))
+    await cache.put("b", payload(2))
+    assert await cache.get("a") is not None
+    await cache.put("c", payload(3))
+
+    assert list(cache._entries) == ["a", "c"]
+    assert cache._size == sum(len(data) for data in cache._entries.values())
+    assert cache._size <= cache.max_bytes
+    assert await cache.get("b") is None
+
+
+async def test_entry_larger_than_limit_is_not_kept_in_memory():
+    cache = ParseResultCache(max_bytes=64)
+    await cache.put("big", payload(1))
+
+    assert await cache.get("big") is None
+    assert cache._size == 0
+
+
+async def test_persistent_layer_is_shared_and_written_once(grid_bucket):
+    writer = ParseResultCache()
+    writer._bucket = grid_bucket
+    await writer.put("key", {"seed": 1})
+    await writer.put("key", {"seed": 1})
+
+    reader = ParseResultCache()
+    reader._bucket = grid_bucket
+    assert await reader.get("key") == {"seed": 1}
+    assert reader.stats["persistent_hits"] == 1
+    assert grid_bucket.uploads == 1
@@ -0,0 +1,167 @@
+"""اختبارات نقاط نهاية الخادم على MongoDB وهمية (conftest)
+
+تتطلب fastapi وmotor وhttpx، وتُتخطى عند عدم تثبيتها.
+"""
+
+import asyncio
+import os
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("motor")
+httpx = pytest.importorskip("httpx")
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "finclick_test")
+os.environ.setdefault("JWT_SECRET", "finclick-test-secret-with-32-bytes!")
+
+import server  # noqa: E402
+
+ANALYSIS_REQUEST = {
+    "company_name": "شركة الاختبار",
+    "sector": "technology",
+    "activity": "software",
+    "legal_entity": "corporation",
+    "comparison_level": "saudi",
+    "analysis_years": 1,
+    "analysis_types": ["comprehensive"],
+}
+
+
+def auth_headers(email="owner@example.com"):
+    return {"Authorization": f"Bearer {server.create_jwt_token('u1', email, 'subscriber')}"}
+
+
+@pytest.fixture
+def api_db(database, monkeypatch):
+    monkeypatch.setattr(server, "db", database)
+    return database
+
+
+@pytest.fixture
+def jobs(api_db, monkeypatch):
+    monkeypatch.setattr(server.analysis_jobs, "collection", api_db["analysis_jobs"])
+    # التحليل الفعلي خارج نطاق هذه الاختبارات
+    monkeypatch.setattr(server, "run_comprehensive_analysis_job", lambda data: {"company": data.get("company_name")})
+    return api_db["analysis_jobs"]
+
+
+def api_client():
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app), base_url="http://test")
+
+
+async def test_submitted_job_completes_and_returns_its_result(jobs):
+    async with api_client() as client:
+        response = await client.post("/api/jobs/analyze", json=ANALYSIS_REQUEST, headers=auth_headers())
+        assert response.status_code == 200
+        job_id = response.json()["job_id"]
+        assert response.json()["status"] == "queued"
+        await asyncio.gather(*server.analysis_jobs._tasks)
+
+        status = await client.get(f"/api/jobs/{job_id}", headers=auth_headers())
+        result = await client.get(f"/api/jobs/{job_id}/result", headers=auth_headers())
+
+    assert status.json()["status"] == "completed"
+    assert "result" not in status.json() and "worker" not in status.json()
+    assert result.status_code == 200
+    assert result.json()["company"] == "شركة الاختبار"
+    assert result.json()["request_info"]["company_name"] == "شركة الاختبار"
+
+
+async def test_result_of_unfinished_job_is_conflict(jobs):
+    await jobs.insert_one({"id": "job-1", "owner": "owner@example.com", "status": "queued", "error": None})
+    async with api_client() as client:
+        response = await client.get("/api/jobs/job-1/result", headers=auth_headers())
+
+    assert response.status_code == 409
+    assert response.json()["detail"] == {"status": "queued", "error": None}
+
+
+async def test_jobs_of_other_users_are_not_found(jobs):
+    await jobs.insert_one({"id": "job-1", "owner": "owner@example.com", "status": "completed", "result": {}})
+    async with api_client() as client:
+        status = await client.get("/api/jobs/job-1", headers=auth_headers("other@example.com"))
+        result = await client.get("/api/jobs/job-1/result", headers=auth_headers("other@example.com"))
+
+    assert status.status_code == 404
+    assert result.status_code == 404
+
+
+async def test_full_queue_rejects_without_recording_a_job(jobs, monkeypatch):
+    monkeypatch.setattr(server.analysis_jobs, "max_pending", 0)
+    async with api_client() as client:
+        response = await client.post("/api/jobs/analyze", json=ANALYSIS_REQUEST, headers=auth_headers())
+
+    assert response.status_code == 503
+    assert jobs.documents == []
+
+
+async def test_ensure_indexes_creates_the_plan_and_survives_failures(api_db, monkeypatch):
+    async def rejected(keys, **options):
+        raise server.PyMongoError("duplicate emails")
+
+    monkeypatch.setattr(api_db["users"], "create_index", rejected)
+    await server.ensure_indexes()
+
+    assert api_db["users"].indexes == {}
+    assert api_db["analysis_jobs"].indexes["id_unique"] == ([("id", 1)], {"unique": True, "name": "id_unique"})
+    assert api_db["market_data_cache"].indexes["expires_at_ttl"][1]["expireAfterSeconds"] == 0
+    assert set(api_db["analysis_results"].indexes) == {"user_id_created_at", "id"}
+
+
+async def test_register_then_login_returns_the_public_user_fields(api_db):
+    credentials = {"email": "new@example.com", "password": "secret"}
+    async with api_client() as client:
+        registered = await client.post("/api/auth/register", json=credentials)
+        again = await client.post("/api/auth/register", json=credentials)
+        login = await client.post("/api/auth/login", json=credentials)
+        wrong = await client.post("/api/auth/login", json={**credentials, "password": "nope"})
+
+    assert registered.status_code == 200
+    assert again.status_code == 400
+    assert login.status_code == 200
+    assert login.json()["user"] == {
+        "id": registered.json()["user"]["id"],
+        "email": "new@example.com",
+        "user_type": "subscriber",
+        "subscription_status": "inactive",
+    }
+    assert wrong.status_code == 401
+    assert "last_login" in api_db["users"].documents[0]
+
+
+async def test_concurrent_register_duplicate_is_rejected(api_db, monkeypatch):
+    await server.ensure_indexes()
+    await api_db["users"].insert_one({"id": "u0", "email": "new@example.com"})
+
+    async def not_found_yet(query, projection=None):
+        # الطلب الآخر أدرج المستخدم بعد فحص الوجود
+        return None
+
+    monkeypatch.setattr(api_db["users"], "find_one", not_found_yet)
+    async with api_client() as client:
+        response = await client.post("/api/auth/register", json={"email": "new@example.com", "password": "secret"})
+
+    assert response.status_code == 400
+    assert len(api_db["users"].documents) == 1
+
+
+async def test_analysis_history_lists_only_the_users_summaries(api_db):
+    for index, user_id in enumerate(["u1", "u1", "u2"]):
+        await api_db["analysis_results"].insert_one({
+            "id": f"a{index}", "user_id": user_id, "company_name": f"c{index}",
+            "created_at": f"2025-01-0{index + 1}", "results": {"large": "payload"},
+        })
+    async with api_client() as client:
+        history = await client.get("/api/analysis-history", headers=auth_headers())
+        details = await client.get("/api/analysis-history/a0", headers=auth_headers())
+        foreign = await client.get("/api/analysis-history/a2", headers=auth_headers())
+
+    assert history.json() == [
+        {"id": "a1", "company_name": "c1", "created_at": "2025-01-02"},
+        {"id": "a0", "company_name": "c0", "created_at": "2025-01-01"},
+    ]
+    assert details.json()["results"] == {"large": "payload"}
+    assert "_id" not in details.json()
+    assert foreign.status_code == 404
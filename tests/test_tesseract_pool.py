@@ -0,0 +1,91 @@
+"""اختبارات مجمع محركات tesseract الدائمة مع وحدة tesserocr وهمية"""
+
+import threading
+import types
+
+import pytest
+
+import tesseract_pool
+from tesseract_pool import TESSERACT_OEM, TesseractWorkerPool
+
+
+class FakeTessBaseAPI:
+    """محرك وهمي يسجل الإنشاء والإنهاء والإعدادات"""
+
+    created = []
+
+    def __init__(self, lang, oem):
+        assert oem == TESSERACT_OEM
+        self.lang = lang
+        self.ended = False
+        self.settings = []
+        FakeTessBaseAPI.created.append(self)
+
+    def SetPageSegMode(self, psm):
+        self.settings.append(("psm", psm))
+
+    def SetVariable(self, name, value):
+        self.settings.append((name, value))
+
+    def SetImage(self, image):
+        self.image = image
+
+    def GetUTF8Text(self):
+        return f"engine-{FakeTessBaseAPI.created.index(self)}"
+
+    def End(self):
+        self.ended = True
+
+
+@pytest.fixture(autouse=True)
+def fake_tesserocr(monkeypatch):
+    FakeTessBaseAPI.created = []
+    monkeypatch.setattr(tesseract_pool, "tesserocr", types.SimpleNamespace(PyTessBaseAPI=FakeTessBaseAPI))
+
+
+def test_engines_are_created_lazily_and_reused():
+    pool = TesseractWorkerPool(size=2, lang="ara+eng")
+    assert pool.persistent and FakeTessBaseAPI.created == []
+
+    assert pool.image_to_string("image", psm=7, whitelist="0123456789") == "engine-0"
+    assert pool.image_to_string("image") == "engine-0"
+
+    engine = FakeTessBaseAPI.created[0]
+    assert len(FakeTessBaseAPI.created) == 1 and engine.lang == "ara+eng"
+    assert engine.settings == [
+        ("psm", 7), ("tessedit_char_whitelist", "0123456789"),
+        ("psm", 6), ("tessedit_char_whitelist", ""),
+    ]
+
+
+def test_concurrent_use_is_capped_at_pool_size():
+    pool = TesseractWorkerPool(size=2)
+    first, second = pool._acquire(), pool._acquire()
+    assert len(FakeTessBaseAPI.created) == 2
+
+    # الطالب الثالث ينتظر حتى يُعاد محرك إلى الطابور ولا يُنشئ محركاً جديداً
+    acquired = []
+    waiter = threading.Thread(target=lambda: acquired.append(pool._acquire()))
+    waiter.start()
+    waiter.join(0.1)
+    assert waiter.is_alive() and not acquired
+
+    pool._handles.put(first)
+    waiter.join(1.0)
+    assert acquired == [first]
+    assert len(FakeTessBaseAPI.created) == 2
+    pool._handles.put(second)
+
+
+def test_warm_and_close_release_engines():
+    pool = TesseractWorkerPool(size=3)
+    pool.warm(count=2)
+    assert len(FakeTessBaseAPI.created) == 2 and pool._handles.qsize() == 2
+
+    # لا يتجاوز التحميل المسبق الحد الأقصى
+    pool.warm(count=10)
+    assert len(FakeTessBaseAPI.created) == 3
+
+    pool.close()
+    assert all(engine.ended for engine in FakeTessBaseAPI.created)
+    assert pool._handles.empty() and pool._created == 0
@@ -0,0 +1,56 @@
+"""اختبارات فهرس الرموز على قائمة صغيرة بالعربية والعبرية والإنجليزية"""
+
+import os
+
+import pytest
+
+from ticker_resolver import TickerResolver, build_ticker_index, main
+
+LISTINGS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'ticker_listings.csv')
+
+
+@pytest.fixture(scope="module")
+def index_dir(tmp_path_factory):
+    index_dir = str(tmp_path_factory.mktemp("ticker_index"))
+    stats = build_ticker_index(LISTINGS, index_dir)
+    assert stats["issuers"] == 5 and stats["entries"] == 7
+    return index_dir
+
+
+@pytest.fixture
+def resolver(index_dir):
+    return TickerResolver(index_dir, default_exchange="TASE")
+
+
+@pytest.mark.parametrize("query, symbol", [
+    ("أرامكو السعودية", "2222.SR"),
+    ("مَصْرِف الراجحي", "1120.SR"),
+    ("בנק הפועלים", "POLI.TA"),
+    ('טבע תעשיות פרמצבטיות בע"מ', "TEVA.TA"),
+    ("Bank Hapoalim", "POLI.TA"),
+    ("POLI.TA", "POLI.TA"),
+])
+def test_names_and_suffixed_symbols(resolver, query, symbol):
+    assert resolver.best_match(query) == symbol
+
+
+def test_bare_symbol_tie_prefers_default_exchange(resolver):
+    candidates = resolver.resolve("TEVA", limit=2)
+    assert [candidate["score"] for candidate in candidates] == [1.0, 1.0]
+    assert [candidate["exchange"] for candidate in candidates] == ["TASE", "NYSE"]
+    assert resolver.best_match("TEVA") == "TEVA.TA"
+
+
+def test_requested_exchange_overrides_default(index_dir, resolver):
+    assert resolver.best_match("TEVA", exchange="NYSE") == "TEVA"
+    assert TickerResolver(index_dir, default_exchange="NYSE").best_match("TEVA") == "TEVA"
+
+
+def test_unknown_name_has_no_match(resolver):
+    assert resolver.best_match("Microsoft") is None
+
+
+def test_build_command(tmp_path, capsys):
+    main(["build", LISTINGS, str(tmp_path)])
+    assert '"issuers": 5' in capsys.readouterr().out
+    assert TickerResolver(str(tmp_path)).best_match("POLI") == "POLI.TA"